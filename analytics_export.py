@@ -0,0 +1,257 @@
+# analytics_export.py
+"""
+Incremental export of circulation data into partitioned Parquet files.
+
+Long-range analytics (utilisation, seasonality, cohorts) read these files
+through analytics_queries.py instead of scanning Loan/Fine on MySQL.
+
+Layout under EXPORT_DIR:
+    loan/checkout_month=YYYY-MM/part-<run>-<n>.parquet
+    fine/fine_month=YYYY-MM/part-<run>-<n>.parquet
+    book/part-<run>.parquet        (full snapshot, replaced every run)
+    patron/part-<run>.parquet      (full snapshot, replaced every run)
+    _watermark.json
+
+Loan and Fine have no "updated_at" column, so a row counts as new or
+changed when its id is above the last exported id, or its return_date /
+payment_date falls on or after the last export date. Re-exported rows are
+de-duplicated on read by keeping the most recent _exported_at.
+"""
+import json
+import math
+import os
+import shutil
+import sys
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import mysql.connector
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from db_connector import get_read_connection
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+EXPORT_DIR = "analytics_data"
+WATERMARK_FILE = "_watermark.json"
+
+# Rows fetched from MySQL and written per Parquet file
+EXPORT_CHUNK_ROWS = 50000
+
+# Both exports read the archive tables too (loan_archive.py), so a first or
+# fresh export still contains the history moved out of Loan/Fine. Kiosk scans
+# synced since the last run may carry an earlier return_date, so loans touched
+# by them are found through Kiosk_Applied.applied_at.
+LOAN_EXPORT_SQL = """
+SELECT loan_id, isbn, patron_id, checkout_date, due_date, return_date
+FROM V_LOAN_HISTORY_ALL
+WHERE loan_id > %s OR return_date >= %s
+   OR loan_id IN (SELECT loan_id FROM Kiosk_Applied WHERE applied_at >= %s)
+"""
+
+FINE_EXPORT_SQL = """
+SELECT fine_id, loan_id, fine_amount, fine_date, payment_date
+FROM Fine
+WHERE fine_id > %s OR payment_date >= %s
+UNION ALL
+SELECT fine_id, loan_id, fine_amount, fine_date, payment_date
+FROM Fine_Archive
+WHERE fine_id > %s OR payment_date >= %s
+"""
+
+BOOK_EXPORT_SQL = """
+SELECT isbn, title, publication_year, publisher, total_copies, available_copies
+FROM Book
+"""
+
+PATRON_EXPORT_SQL = """
+SELECT patron_id, first_name, last_name, email
+FROM Patron
+"""
+
+# Fixed Parquet schemas. Inferring per chunk gives an all-NULL return_date or
+# payment_date (recent, still-open loans) Arrow type null, and datasets mixing
+# such files with date32 ones cannot be read.
+_EXPORTED_AT = ("_exported_at", pa.timestamp("us"))
+
+LOAN_SCHEMA = pa.schema([
+    ("loan_id", pa.int64()), ("isbn", pa.string()), ("patron_id", pa.int64()),
+    ("checkout_date", pa.date32()), ("due_date", pa.date32()), ("return_date", pa.date32()),
+    ("checkout_month", pa.string()), _EXPORTED_AT,
+])
+
+FINE_SCHEMA = pa.schema([
+    ("fine_id", pa.int64()), ("loan_id", pa.int64()), ("fine_amount", pa.decimal128(5, 2)),
+    ("fine_date", pa.date32()), ("payment_date", pa.date32()),
+    ("fine_month", pa.string()), _EXPORTED_AT,
+])
+
+BOOK_SCHEMA = pa.schema([
+    ("isbn", pa.string()), ("title", pa.string()), ("publication_year", pa.int64()),
+    ("publisher", pa.string()), ("total_copies", pa.int64()), ("available_copies", pa.int64()),
+    _EXPORTED_AT,
+])
+
+PATRON_SCHEMA = pa.schema([
+    ("patron_id", pa.int64()), ("first_name", pa.string()), ("last_name", pa.string()),
+    ("email", pa.string()), _EXPORTED_AT,
+])
+
+
+def load_watermark(export_dir: str = EXPORT_DIR) -> dict:
+    """Returns the last export watermark, or a zero watermark on first run."""
+    path = os.path.join(export_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {'loan_id': 0, 'fine_id': 0, 'exported_on': '1970-01-01'}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermark(watermark: dict, export_dir: str = EXPORT_DIR):
+    """Writes the watermark atomically so a crash never leaves it half-written."""
+    path = os.path.join(export_dir, WATERMARK_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+
+
+def _stream_query(cursor, sql: str, params: tuple = ()):
+    """Executes a query and yields DataFrames of at most EXPORT_CHUNK_ROWS rows."""
+    cursor.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _to_decimal(value, scale: int):
+    """Exact Decimal for a DECIMAL column; the SQLite backend returns floats or strings."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, bytes):
+        value = value.decode()
+    return Decimal(str(value)).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+
+
+def _to_table(chunk, schema):
+    """Builds the Arrow table for a chunk, normalising DECIMAL columns first."""
+    for field in schema:
+        if pa.types.is_decimal(field.type) and field.name in chunk:
+            chunk[field.name] = chunk[field.name].astype(object).map(
+                lambda value, scale=field.type.scale: _to_decimal(value, scale))
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def _export_partitioned(cursor, sql, params, table_dir, schema, id_column, date_column,
+                        partition_column, run_id, exported_at):
+    """
+    Streams an incremental query into month-partitioned Parquet files.
+    Returns (rows_written, max_id_seen).
+    """
+    rows_written = 0
+    max_id = 0
+    for n, chunk in enumerate(_stream_query(cursor, sql, params)):
+        chunk[partition_column] = pd.to_datetime(chunk[date_column]).dt.strftime("%Y-%m")
+        chunk['_exported_at'] = exported_at
+        pq.write_to_dataset(
+            _to_table(chunk, schema),
+            root_path=table_dir,
+            partition_cols=[partition_column],
+            basename_template=f"part-{run_id}-{n}-{{i}}.parquet",
+        )
+        rows_written += len(chunk)
+        max_id = max(max_id, int(chunk[id_column].max()))
+    return rows_written, max_id
+
+
+def _export_snapshot(cursor, sql, table_dir, schema, run_id, exported_at):
+    """Replaces a small dimension table with a fresh single-file snapshot."""
+    tmp_dir = table_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    writer = None
+    rows_written = 0
+    try:
+        for chunk in _stream_query(cursor, sql):
+            chunk['_exported_at'] = exported_at
+            table = _to_table(chunk, schema)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(tmp_dir, f"part-{run_id}.parquet"), schema)
+            writer.write_table(table)
+            rows_written += len(chunk)
+    finally:
+        if writer:
+            writer.close()
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+    return rows_written
+
+
+def export_circulation_data(export_dir: str = EXPORT_DIR) -> bool:
+    """
+    Exports new and changed Loan/Fine rows since the last watermark and
+    refreshes the Book/Patron snapshots. Reads come from a replica when
+    one is configured.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    watermark = load_watermark(export_dir)
+
+    conn = get_read_connection()
+    if not conn:
+        return False
+
+    cursor = conn.cursor()
+    started = datetime.now()
+    run_id = started.strftime("%Y%m%d%H%M%S")
+    exported_at = pd.Timestamp(started)
+
+    try:
+        loans, max_loan_id = _export_partitioned(
+            cursor, LOAN_EXPORT_SQL, (watermark['loan_id'], watermark['exported_on'], watermark['exported_on']),
+            os.path.join(export_dir, "loan"), LOAN_SCHEMA, 'loan_id', 'checkout_date',
+            'checkout_month', run_id, exported_at)
+
+        fines, max_fine_id = _export_partitioned(
+            cursor, FINE_EXPORT_SQL, (watermark['fine_id'], watermark['exported_on']) * 2,
+            os.path.join(export_dir, "fine"), FINE_SCHEMA, 'fine_id', 'fine_date',
+            'fine_month', run_id, exported_at)
+
+        books = _export_snapshot(cursor, BOOK_EXPORT_SQL, os.path.join(export_dir, "book"), BOOK_SCHEMA, run_id, exported_at)
+        patrons = _export_snapshot(cursor, PATRON_EXPORT_SQL, os.path.join(export_dir, "patron"), PATRON_SCHEMA, run_id, exported_at)
+
+        # The date is taken from when the run started, so rows returned or
+        # paid while the export was running are picked up again next time.
+        save_watermark({
+            'loan_id': max(max_loan_id, watermark['loan_id']),
+            'fine_id': max(max_fine_id, watermark['fine_id']),
+            'exported_on': started.date().isoformat(),
+        }, export_dir)
+
+        log.info(f"Exported {loans} loans, {fines} fines, {books} books, {patrons} patrons to {export_dir}")
+        return True
+
+    except mysql.connector.Error as err:
+        log.error("Database error during analytics export", extra={'error': err})
+        return False
+
+    except (pa.ArrowException, InvalidOperation, ValueError) as err:
+        # A value that does not fit the export schema; the watermark is not advanced
+        log.error("Could not convert exported rows to Parquet", extra={'error': err})
+        return False
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else EXPORT_DIR
+    sys.exit(0 if export_circulation_data(target_dir) else 1)
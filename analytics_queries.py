@@ -0,0 +1,97 @@
+# analytics_queries.py
+"""
+Vectorized report equivalents computed from the Parquet export written by
+analytics_export.py. These mirror the SQL views without touching MySQL:
+
+    popular_books()      ~ V_POPULAR_BOOKS
+    overdue_books()      ~ V_OVERDUE_BOOKS
+    patron_history(id)   ~ V_PATRON_HISTORY
+"""
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+from analytics_export import EXPORT_DIR
+
+
+def _read_table(name: str, export_dir: str = EXPORT_DIR, columns=None, filter=None) -> pd.DataFrame:
+    """
+    Reads one exported table. Partitioned tables may contain the same row
+    from several export runs; only the latest copy of each id is kept.
+    """
+    path = os.path.join(export_dir, name)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns or [])
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(columns + [f"{name}_id", "_exported_at"]))
+        read_columns = [c for c in read_columns if c in dataset.schema.names]
+    df = dataset.to_table(columns=read_columns, filter=filter).to_pandas()
+
+    id_column = f"{name}_id"
+    if name in ("loan", "fine") and not df.empty:
+        df = (df.sort_values("_exported_at")
+                .drop_duplicates(subset=id_column, keep="last"))
+    return df
+
+
+def load_loans(export_dir: str = EXPORT_DIR, filter=None) -> pd.DataFrame:
+    """Returns the de-duplicated Loan rows with date columns as datetime64."""
+    columns = ["loan_id", "isbn", "patron_id", "checkout_date", "due_date", "return_date"]
+    loans = _read_table("loan", export_dir, columns=columns, filter=filter)
+    for col in ("checkout_date", "due_date", "return_date"):
+        if col in loans:
+            loans[col] = pd.to_datetime(loans[col])
+    return loans
+
+
+def popular_books(limit: int = 10, export_dir: str = EXPORT_DIR) -> pd.DataFrame:
+    """Books ordered by how many times they were borrowed."""
+    loans = _read_table("loan", export_dir, columns=["isbn"])
+    books = _read_table("book", export_dir, columns=["isbn", "title"])
+
+    counts = loans.groupby("isbn", sort=False).size().rename("borrow_count").reset_index()
+    report = counts.merge(books[["isbn", "title"]], on="isbn", how="left")
+    return (report.sort_values("borrow_count", ascending=False)
+                  .head(limit)[["isbn", "title", "borrow_count"]]
+                  .reset_index(drop=True))
+
+
+def overdue_books(as_of: date = None, export_dir: str = EXPORT_DIR) -> pd.DataFrame:
+    """Open loans past their due date, with the number of days overdue."""
+    as_of = pd.Timestamp(as_of or date.today())
+    loans = load_loans(export_dir)
+    books = _read_table("book", export_dir, columns=["isbn", "title"])
+    patrons = _read_table("patron", export_dir, columns=["patron_id", "first_name", "last_name"])
+
+    overdue = loans[loans["return_date"].isna() & (loans["due_date"] < as_of)].copy()
+    overdue["days_overdue"] = (as_of - overdue["due_date"]).dt.days
+
+    report = (overdue.merge(books[["isbn", "title"]], on="isbn", how="left")
+                     .merge(patrons[["patron_id", "first_name", "last_name"]], on="patron_id", how="left"))
+    columns = ["loan_id", "isbn", "title", "patron_id", "first_name", "last_name", "due_date", "days_overdue"]
+    return report.sort_values("days_overdue", ascending=False)[columns].reset_index(drop=True)
+
+
+def patron_history(patron_id: int = None, export_dir: str = EXPORT_DIR) -> pd.DataFrame:
+    """Complete borrowing history, optionally for a single patron."""
+    filter = (ds.field("patron_id") == patron_id) if patron_id is not None else None
+    loans = load_loans(export_dir, filter=filter)
+    books = _read_table("book", export_dir, columns=["isbn", "title"])
+
+    report = loans.merge(books[["isbn", "title"]], on="isbn", how="left")
+    columns = ["loan_id", "patron_id", "isbn", "title", "checkout_date", "due_date", "return_date"]
+    return report.sort_values(["patron_id", "checkout_date"])[columns].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else EXPORT_DIR
+    print("--- POPULAR BOOKS ---")
+    print(popular_books(export_dir=source_dir).to_string(index=False))
+    print("\n--- OVERDUE BOOKS ---")
+    print(overdue_books(export_dir=source_dir).to_string(index=False))
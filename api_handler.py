@@ -28,30 +28,49 @@ def parse_google_books_data(raw_api_data):
 
         # Basic validation
         if not book_details['title'] or not book_details['authors']:
-            print("ERROR: Missing critical data (Title or Author) in API response.")
+            log.warning("Missing critical data (Title or Author) in API response")
             return None
         
         return book_details
         
     except Exception as e:
-        print(f"Error parsing API data: {e}")
+        log.error("Error parsing API data", extra={'error': e})
         return None
 
-import requests
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from circuit_breaker import CircuitBreaker
+from app_logging import get_logger
 
-def get_book_data_from_api(isbn: str) -> Optional[Dict[str, Any]]:
+log = get_logger(__name__)
+
+# Upper bound for one Google Books request (connect + read)
+API_TIMEOUT_SECONDS = 5
+
+# Outcomes of fetch_book_data
+FOUND = "found"
+NOT_FOUND = "not_found"
+API_ERROR = "error"
+API_UNAVAILABLE = "unavailable"  # circuit open, request not attempted
+
+# Opens after repeated errors/timeouts so clerks are not kept waiting on a degraded API
+api_breaker = CircuitBreaker("google-books", failure_threshold=3, cool_off_seconds=60)
+
+def fetch_book_data(isbn: str, timeout: float = API_TIMEOUT_SECONDS) -> Tuple[str, Optional[Dict[str, Any]]]:
     """
     Fetches raw book data from the Google Books API using ISBN.
 
     Args:
         isbn: The 10 or 13 digit ISBN string of the book to look up.
+        timeout: Seconds to wait for the API before giving up.
 
     Returns:
-        A dictionary containing the raw JSON data item from the API, 
-        or None if the request fails or the book is not found.
+        A (status, data) tuple. status is FOUND, NOT_FOUND, API_ERROR or
+        API_UNAVAILABLE; data is the raw JSON item when status is FOUND.
     """
+    if not api_breaker.allow_request():
+        log.warning(f"Google Books circuit is open (retry in {api_breaker.retry_in():.0f}s)", extra={'isbn': isbn})
+        return API_UNAVAILABLE, None
     
     # The base URL for the Google Books API volumes endpoint
     base_url = "https://www.googleapis.com/books/v1/volumes"
@@ -59,40 +78,68 @@ def get_book_data_from_api(isbn: str) -> Optional[Dict[str, Any]]:
     # Parameters for the API call: We query using the ISBN
     params = {'q': f'isbn:{isbn}'}
     
-    print(f"DEBUG: Calling API for ISBN: {isbn}")
+    log.debug("Calling Google Books API", extra={'isbn': isbn})
     
+    # Imported here: requests costs ~40 ms at startup and only the ISBN sync needs it
+    import requests
+
     try:
         # 1. Make the HTTP GET request
-        response = requests.get(base_url, params=params)
+        response = requests.get(base_url, params=params, timeout=timeout)
         
         # 2. Check for HTTP errors (4xx or 5xx status codes)
         response.raise_for_status() 
         
         # 3. Convert the response text into a Python dictionary
         data = response.json()
+        api_breaker.record_success()
 
         # 4. Check if the API returned any results
         # totalItems > 0 indicates success
         if data.get('totalItems', 0) > 0 and 'items' in data:
             # The API returns a list of items. We only need the first one.
-            print(f"DEBUG: Book data found successfully.")
-            return data['items'][0] 
+            log.debug("Book data found", extra={'isbn': isbn})
+            return FOUND, data['items'][0] 
         else:
-            print(f"INFO: No book found on Google Books API for ISBN: {isbn}. Total items: 0")
-            return None
+            log.info("No book found on Google Books API", extra={'isbn': isbn})
+            return NOT_FOUND, None
 #--------except conditions---------------
+    # Only server errors, timeouts and lost connections count against the breaker;
+    # a 4xx or a malformed answer is about this request, not the API's health
     except requests.exceptions.HTTPError as http_err:
-        print(f"API Request Error (HTTP): {http_err} for ISBN {isbn}")
-        return None
+        log.warning("API request error (HTTP)", extra={'isbn': isbn, 'error': http_err})
+        if http_err.response is not None and http_err.response.status_code < 500:
+            api_breaker.record_success()
+        else:
+            api_breaker.record_failure(http_err)
+        return API_ERROR, None
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as req_err:
+        log.warning("API request error (connection/timeout)", extra={'isbn': isbn, 'error': req_err})
+        api_breaker.record_failure(req_err)
+        return API_ERROR, None
     except requests.RequestException as req_err:
-        print(f"API Request Error (Connection/Timeout): {req_err} for ISBN {isbn}")
-        return None
+        log.warning("API request error", extra={'isbn': isbn, 'error': req_err})
+        api_breaker.release_trial()
+        return API_ERROR, None
     except json.JSONDecodeError as json_err:
-        print(f"API Response Error: Could not parse JSON response for ISBN {isbn}. Error: {json_err}")
-        return None
+        log.warning("Could not parse API JSON response", extra={'isbn': isbn, 'error': json_err})
+        api_breaker.release_trial()
+        return API_ERROR, None
     except Exception as e:
-        print(f"An unexpected error occurred during API call: {e}")
-        return None
+        log.exception("Unexpected error during API call", extra={'isbn': isbn})
+        api_breaker.release_trial()
+        return API_ERROR, None
+
+def get_book_data_from_api(isbn: str, timeout: float = API_TIMEOUT_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Fetches raw book data from the Google Books API using ISBN.
+
+    Returns:
+        A dictionary containing the raw JSON data item from the API, 
+        or None if the request fails or the book is not found.
+    """
+    status, data = fetch_book_data(isbn, timeout)
+    return data
 
 # --- Example Usage (Place in your main testing file) ---
 if __name__ == '__main__':
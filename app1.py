@@ -4,16 +4,47 @@ import pandas as pd
 import mysql.connector
 
 # --- Import ALL necessary functions ---
-from sync_logic import search_and_sync_book_by_isbn,search_available_books
+from sync_logic import search_and_sync_book_by_isbn,search_available_books, add_book_copies
 from loan_logic import checkout_book, return_book,get_patron_active_loans
 from patron_logic import register_patron, find_patron_by_email # Assuming both are here
-from db_connector import get_db_connection
+from co_borrowing import get_co_borrowed_books
+from db_connector import get_read_connection, get_db_health, is_sharded, current_branch
+from branches import fetch_report_all_branches
+from parallel_reads import fetch_concurrently, scalar, frame
+from unit_of_work import UnitOfWork
+from profiler import (
+    PROFILING_ENABLED, profiled, profile_section, begin_section, end_section,
+    start_run, end_run, slowest_sections
+)
+
+# Logic calls show up as their own sections when OPENSHELF_PROFILE=1
+search_and_sync_book_by_isbn = profiled(search_and_sync_book_by_isbn)
+search_available_books = profiled(search_available_books)
+checkout_book = profiled(checkout_book)
+return_book = profiled(return_book)
+get_patron_active_loans = profiled(get_patron_active_loans)
+register_patron = profiled(register_patron)
+find_patron_by_email = profiled(find_patron_by_email)
+add_book_copies = profiled(add_book_copies)
+get_co_borrowed_books = profiled(get_co_borrowed_books)
 
 # --- Utility Functions ---
 
+def render_report(view_name: str, df):
+    """Displays a fetched report; df is None when the query failed or timed out."""
+    if df is None:
+        st.error(f"Could not load {view_name}. Please retry.")
+    elif df.empty:
+        st.info(f"The {view_name.replace('V_', '').replace('_', ' ').title()} report is currently empty.")
+    else:
+        with profile_section("st.dataframe"):
+            st.dataframe(df, use_container_width=True)
+
+
+@profiled
 def display_report_results(view_name: str, query_filter: str = ""):
     """Queries a SQL View or table and displays the result in a Streamlit dataframe."""
-    conn = get_db_connection()
+    conn = get_read_connection()
     if not conn:
         st.error("Database connection failed. Cannot fetch report.")
         return
@@ -23,12 +54,10 @@ def display_report_results(view_name: str, query_filter: str = ""):
         query = f"SELECT * FROM {view_name} {query_filter}"
         
         # Use pd.read_sql for clean data retrieval
-        df = pd.read_sql(query, conn)
+        with profile_section("pd.read_sql"):
+            df = pd.read_sql(query, conn)
         
-        if df.empty:
-            st.info(f"The {view_name.replace('V_', '').replace('_', ' ').title()} report is currently empty.")
-        else:
-            st.dataframe(df, use_container_width=True)
+        render_report(view_name, df)
 
     except mysql.connector.Error as err:
         st.error(f"Error querying view {view_name}: {err}")
@@ -36,33 +65,33 @@ def display_report_results(view_name: str, query_filter: str = ""):
         if conn:
             conn.close()
 
-def get_db_metrics():
-    """Fetches key metrics for the Dashboard and Sidebar."""
-    conn = get_db_connection()
-    if not conn: return {'TotalBooks': 0, 'Issued': 0, 'Overdue': 0, 'Patrons': 0}
-    
-    metrics = {}
-    try:
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT IFNULL(SUM(total_copies), 0) FROM Book")
-        metrics['TotalBooks'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(loan_id) FROM Loan WHERE return_date IS NULL")
-        metrics['Issued'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(DISTINCT patron_id) FROM Patron")
-        metrics['Patrons'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM V_OVERDUE_BOOKS")
-        metrics['Overdue'] = cursor.fetchone()[0]
-        
-    except Exception as e:
-        print(f"Error fetching metrics: {e}")
-    finally:
-        if conn: conn.close()
-    
-    return metrics
+METRIC_QUERIES = {
+    'TotalBooks': "SELECT IFNULL(SUM(total_copies), 0) FROM Book",
+    'Issued': "SELECT COUNT(loan_id) FROM Loan WHERE return_date IS NULL",
+    'Patrons': "SELECT COUNT(DISTINCT patron_id) FROM Patron",
+    'Overdue': "SELECT COUNT(*) FROM V_OVERDUE_BOOKS",
+}
+
+# Reports shown on the Dashboard, fetched together with the metrics
+DASHBOARD_REPORTS = {
+    'V_OVERDUE_BOOKS': "SELECT * FROM V_OVERDUE_BOOKS LIMIT 5",
+    'V_CURRENT_LOANS': "SELECT * FROM V_CURRENT_LOANS ORDER BY checkout_date DESC LIMIT 5",
+}
+
+@profiled
+def get_db_metrics(report_queries: dict = None):
+    """
+    Fetches key metrics for the Dashboard and Sidebar, plus any reports the
+    page needs, all concurrently. Returns (metrics, {view_name: DataFrame or None}).
+    """
+    tasks = {name: scalar(sql) for name, sql in METRIC_QUERIES.items()}
+    for view_name, sql in (report_queries or {}).items():
+        tasks[view_name] = frame(sql)
+
+    results = fetch_concurrently(tasks)
+    metrics = {name: results[name] or 0 for name in METRIC_QUERIES}
+    reports = {view_name: results[view_name] for view_name in (report_queries or {})}
+    return metrics, reports
 
 # --- Streamlit Setup & Sidebar ---
 
@@ -72,7 +101,7 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-metrics = get_db_metrics()
+start_run("app1")
 
 st.sidebar.title("📚 Library System")
 
@@ -81,7 +110,19 @@ page = st.sidebar.radio(
     ["🏠 Dashboard", "📘 Books", "👤 Patrons", "🔄 Loans", "📊 Reports"]
 )
 
+metrics, dashboard_reports = get_db_metrics(DASHBOARD_REPORTS if page == "🏠 Dashboard" else None)
+
 st.sidebar.markdown("---")
+
+db_health = get_db_health()
+if db_health['primary']['state'] != "closed":
+    st.sidebar.error(f"⚠️ Database unavailable. Retrying in {db_health['primary']['retry_in']:.0f}s.")
+if is_sharded():
+    st.sidebar.caption(f"Branch: {current_branch()}")
+    branch_health = db_health['branches'].get(current_branch())
+    if branch_health and branch_health['state'] != "closed":
+        st.sidebar.error(f"⚠️ Branch database unavailable. Retrying in {branch_health['retry_in']:.0f}s.")
+
 st.sidebar.markdown("### 📊 Quick Stats")
 st.sidebar.metric("Total Inventory", metrics['TotalBooks'])
 st.sidebar.metric("Books Issued", metrics['Issued'])
@@ -95,6 +136,8 @@ st.sidebar.markdown("---")
 # 🏠 1. DASHBOARD PAGE
 # -----------------------------------------------------------------------------
 
+begin_section(page)
+
 if page == "🏠 Dashboard":
     st.title("Dashboard: Library Overview")
 
@@ -108,12 +151,12 @@ if page == "🏠 Dashboard":
     st.markdown("---")
 
     st.subheader("Critical Alert: Overdue Books (Top 5)")
-    display_report_results("V_OVERDUE_BOOKS", "LIMIT 5")
+    render_report("V_OVERDUE_BOOKS", dashboard_reports['V_OVERDUE_BOOKS'])
     
     st.markdown("---")
     
     st.subheader("Recent Checkout Activity")
-    display_report_results("V_CURRENT_LOANS", "ORDER BY checkout_date DESC LIMIT 5")
+    render_report("V_CURRENT_LOANS", dashboard_reports['V_CURRENT_LOANS'])
 
 
 # -----------------------------------------------------------------------------
@@ -135,31 +178,40 @@ elif page == "📘 Books":
     
     if submitted and isbn_input:
         with st.spinner(f"Syncing book metadata for {isbn_input}..."):
-            if search_and_sync_book_by_isbn(isbn_input):
-                conn = get_db_connection()
-                if conn:
-                    try:
-                        cursor = conn.cursor()
-                        # Update inventory directly after successful sync
-                        update_sql = """
-                        UPDATE Book
-                        SET total_copies = total_copies + %s, available_copies = available_copies + %s
-                        WHERE isbn = %s
-                        """
-                        cursor.execute(update_sql, (copies_input, copies_input, isbn_input))
-                        conn.commit()
-                        st.success(f"✅ Successfully synced '{isbn_input}' and added {copies_input} copies to inventory!")
-                    except Exception as e:
-                        st.error(f"Failed to update inventory: {e}")
-                    finally:
-                        conn.close()
+            if is_sharded():
+                # Catalog and branch inventory are different databases, so the
+                # sync publishes the book to every branch before copies are added
+                synced = search_and_sync_book_by_isbn(isbn_input)
+                added = synced and add_book_copies(isbn_input, copies_input)
             else:
+                # Metadata sync and inventory update commit together or not at all
+                with UnitOfWork(atomic=True) as uow:
+                    synced = search_and_sync_book_by_isbn(isbn_input, uow=uow)
+                    added = synced and add_book_copies(isbn_input, copies_input, uow=uow)
+                    if not added:
+                        uow.rollback()
+
+            if not synced:
                 st.error("❌ Failed to sync book metadata.")
+            elif not added:
+                st.error("❌ Failed to update inventory.")
+            else:
+                st.success(f"✅ Successfully synced '{isbn_input}' and added {copies_input} copies to inventory!")
 
     st.markdown("---")
     st.subheader("Current Book Inventory")
     display_report_results("Book", "ORDER BY title ASC")
 
+    st.markdown("---")
+    st.subheader("Patrons Who Borrowed This Also Borrowed")
+    similar_isbn = st.text_input("ISBN", key="similar_isbn").strip()
+    if similar_isbn:
+        similar_books = get_co_borrowed_books(similar_isbn)
+        if similar_books:
+            st.dataframe(pd.DataFrame(similar_books), use_container_width=True, hide_index=True)
+        else:
+            st.info("No suggestions yet for this ISBN.")
+
 
 # -----------------------------------------------------------------------------
 # 👤 3. PATRONS PAGE
@@ -223,23 +275,21 @@ elif page == "🔄 Loans":
             if lookup_button and lookup_email:
                 info = find_patron_by_email(lookup_email)
                 st.session_state['patron_info'] = info
-                if info:
-                    # Store email for updates if found
-                    info['email'] = lookup_email
-                    st.session_state['patron_info'] = info
+                # Store email for updates if found
+                st.session_state['patron_email'] = lookup_email
                 
         # --- CHECKOUT ACTION (OUTSIDE the lookup form) ---
         
         if st.session_state['patron_info']:
             info = st.session_state['patron_info']
             
-            st.success(f"Patron Found: {info['first_name']} {info['last_name']}")
+            st.success(f"Patron Found: {info.first_name} {info.last_name}")
             
             col1_m, col2_m = st.columns(2)
             with col1_m:
-                st.metric(label="Patron ID", value=info['patron_id'])
+                st.metric(label="Patron ID", value=info.patron_id)
             with col2_m:
-                st.metric(label="Active Loans", value=info['active_loans'])
+                st.metric(label="Active Loans", value=info.active_loans)
             
             st.markdown("---")
             st.subheader("2. Complete Checkout Transaction")
@@ -256,38 +306,33 @@ elif page == "🔄 Loans":
 
             # --- Checkout Form (Uses search results) ---
             with st.form("checkout_transaction_form"): 
-                st.write(f"Issuing book to Patron ID: **{info['patron_id']}**")
+                st.write(f"Issuing book to Patron ID: **{info.patron_id}**")
 
-                if not available_books:
-                    book_options = ["(No available books found matching search)"]
-                    book_map = {}
-                else:
-                    # Map the display string to the actual ISBN
-                    book_options = [
-                        f"{book['title']} (ISBN: {book['isbn']}) | Copies: {book['available_copies']}"
-                        for book in available_books
-                    ]
-                    book_map = {
-                        option: book['isbn'] 
-                        for option, book in zip(book_options, available_books)
-                    }
-
-                # Select box for the user to pick from the results
-                selected_book_display = st.selectbox(
+                # Select box for the user to pick from the results; the option is the row itself
+                selected_book = st.selectbox(
                     "Choose Book to Issue",
-                    book_options,
+                    available_books,
+                    format_func=lambda book: book.label,
+                    placeholder="(No available books found matching search)",
                     key="selected_book_to_issue"
                 )
                 
                 checkout_button = st.form_submit_button("CHECK OUT BOOK (Transaction)") 
                 
-                if checkout_button and selected_book_display != "(No available books found matching search)":
-                    co_isbn = book_map.get(selected_book_display)
+                if checkout_button and selected_book:
+                    co_isbn = selected_book.isbn
                     
-                    if co_isbn and checkout_book(co_isbn, info['patron_id']):
+                    # Checkout and the refreshed lookup share one primary connection
+                    checked_out = False
+                    if co_isbn:
+                        with UnitOfWork() as uow:
+                            checked_out = checkout_book(co_isbn, info.patron_id, uow=uow)
+                            if checked_out:
+                                st.session_state['patron_info'] = find_patron_by_email(
+                                    st.session_state['patron_email'], uow=uow)
+
+                    if checked_out:
                         st.success(f"🎉 Success! Book checked out: {co_isbn}.")
-                        # Update metrics and rerun using the stored email
-                        st.session_state['patron_info'] = find_patron_by_email(info['email']) 
                         st.rerun() 
                     else:
                         st.warning("Checkout failed. Check inventory or patron status.")
@@ -331,21 +376,14 @@ elif page == "🔄 Loans":
             st.markdown("---")
             st.subheader("2. Select Book to Return")
 
-            # Create a list of display strings (Title - ISBN) for the dropdown
-            loan_options = [
-                f"{loan['title']} (ISBN: {loan['isbn']})"
-                for loan in st.session_state['active_loans']
-            ]
-            
-            selected_loan_display = st.selectbox(
+            # Options are the loan rows, shown as "Title (ISBN: ...)"
+            selected_loan = st.selectbox(
                 "Choose the Book to Return",
-                loan_options,
+                st.session_state['active_loans'],
+                format_func=lambda loan: loan.label,
                 key="selected_loan_key"
             )
-            
-            # The chosen ISBN is extracted from the display string
-            # Finds the ISBN portion: (ISBN: XXXXXXXXXXXXX) and extracts the number
-            selected_isbn = selected_loan_display.split(' (ISBN: ')[1].rstrip(')')
+            selected_isbn = selected_loan.isbn
 
             return_button = st.button("CONFIRM RETURN TRANSACTION", key="final_return_button")
             
@@ -353,7 +391,7 @@ elif page == "🔄 Loans":
                 patron_id_to_return = st.session_state['return_patron_id']
 
                 if return_book(selected_isbn, int(patron_id_to_return)):
-                    st.success(f"📘 Success! Book '{selected_loan_display}' returned by Patron {patron_id_to_return}.")
+                    st.success(f"📘 Success! Book '{selected_loan.label}' returned by Patron {patron_id_to_return}.")
                     # Clear session state and rerun to update the list immediately
                     del st.session_state['active_loans'] 
                     st.rerun() 
@@ -385,15 +423,38 @@ elif page == "📊 Reports":
             "V_OVERDUE_BOOKS", 
             "V_OUTSTANDING_FINES",
             "V_POPULAR_BOOKS", 
-            "V_PATRON_HISTORY"
+            "V_PATRON_HISTORY",
+            "V_PATRON_HISTORY_ALL"
         ]
     )
     
     report_filter = ""
-    if report_option == "V_PATRON_HISTORY":
+    if report_option in ("V_PATRON_HISTORY", "V_PATRON_HISTORY_ALL"):
         patron_id = st.number_input("Enter Patron ID for History (Optional)", min_value=1, step=1, key="report_patron_id")
         if patron_id:
             report_filter = f"WHERE patron_id = {patron_id}"
 
+    all_branches = is_sharded() and st.checkbox("All branches", key="report_all_branches")
+
     if st.button(f"Generate Report: {report_option}", use_container_width=True):
-        display_report_results(report_option, report_filter)
\ No newline at end of file
+        if all_branches:
+            rows, failed_branches = fetch_report_all_branches(report_option, report_filter)
+            if failed_branches:
+                st.warning(f"Unavailable branches left out: {', '.join(failed_branches)}")
+            if rows:
+                st.dataframe(pd.DataFrame(rows), use_container_width=True)
+            else:
+                st.info("The report is currently empty in every branch.")
+        else:
+            display_report_results(report_option, report_filter)
+
+end_section()
+profile_sections = end_run()
+
+if PROFILING_ENABLED:
+    with st.sidebar.expander("⏱️ Profiler: slowest sections"):
+        st.caption("Trace files are written to the profiles/ directory.")
+        st.dataframe(
+            pd.DataFrame(slowest_sections(10, profile_sections), columns=["path", "wall_ms", "cpu_ms", "peak_kb"]),
+            use_container_width=True
+        )
@@ -0,0 +1,145 @@
+# app_logging.py
+"""
+Structured, non-blocking logging for the library modules.
+
+Records are put on an in-memory queue by the calling thread and written to
+stderr by a background QueueListener, so a checkout never waits on terminal
+or disk I/O. Context goes in `extra` and is rendered as fields:
+
+    log = get_logger(__name__)
+    log.info("Book checked out", extra={'isbn': isbn, 'patron_id': 7, 'duration_ms': 4.2})
+
+Environment:
+    OPENSHELF_LOG_LEVEL    DEBUG / INFO / WARNING / ERROR   (default INFO)
+    OPENSHELF_LOG_FORMAT   text / json                       (default text)
+    OPENSHELF_LOG_SAMPLE   0.0-1.0, fraction of INFO/DEBUG records kept (default 1.0);
+                           WARNING and above are never sampled out
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "openshelf"
+
+# Structured fields rendered when present on a record
+LOG_FIELDS = ("isbn", "patron_id", "loan_id", "email", "view", "duration_ms", "count", "error")
+
+_configure_lock = threading.Lock()
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING; applied before enqueueing, so dropped records cost little."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record as-is. The stock prepare() formats
+    the message and copies the record on the caller's thread; the listener
+    lives in the same process, so that work can be left to it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders a record as 'time LEVEL logger: message key=value ...' or as one JSON object."""
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {name: getattr(record, name) for name in LOG_FIELDS if hasattr(record, name)}
+        if self.as_json:
+            payload = {
+                'time': self.formatTime(record),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                payload['exc_info'] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        text = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+def configure_logging(level: str = None, log_format: str = None, sample_rate: float = None, stream=None):
+    """
+    Installs the queue handler on the 'openshelf' logger and starts the
+    background writer. Called automatically by get_logger(); call it again
+    explicitly to change settings (e.g. in a benchmark).
+    """
+    global _listener
+    with _configure_lock:
+        level = level or os.environ.get("OPENSHELF_LOG_LEVEL", "INFO")
+        log_format = log_format or os.environ.get("OPENSHELF_LOG_FORMAT", "text")
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("OPENSHELF_LOG_SAMPLE", "1.0"))
+
+        if _listener:
+            _listener.stop()
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers.clear()
+        root.setLevel(level.upper())
+        root.propagate = False
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(StructuredFormatter(as_json=log_format == "json"))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _InProcessQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the background writer."""
+    global _listener
+    with _configure_lock:
+        if _listener:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns a child of the 'openshelf' logger, configuring logging on first use."""
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def elapsed_ms(started: float) -> float:
+    """Milliseconds since a time.perf_counter() reading, for the duration_ms field."""
+    return round((time.perf_counter() - started) * 1000, 2)
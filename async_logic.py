@@ -0,0 +1,491 @@
+# async_logic.py
+"""
+Async versions of the circulation functions on aiomysql connection pools.
+
+They drive the same steps as loan_logic and sync_logic (the *_steps
+generators, see loan_logic._run_steps) and the same stored procedures when
+OPENSHELF_ENGINE=procedure, so statements, fines and refusal reasons cannot
+drift apart. While waiting on MySQL they hand the event loop back, so one
+process can serve many concurrent kiosks or web requests without a thread
+per request.
+
+Connections go to the current branch (see db_connector.use_branch) and
+share db_connector's circuit breakers: while a server's circuit is open
+the functions fail immediately, and an unreachable server makes them
+return False / None / [] like the sync versions.
+
+Pools belong to the event loop that created them, so every asyncio.run()
+gets its own. Usage:
+    await init_pools()
+    ok = await checkout_book("9780804139024", 12)
+    await close_pools()
+"""
+import asyncio
+import json
+import math
+import time
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import aiomysql
+
+import procedures
+from db_connector import (
+    DB_CONFIG, REPLICA_CONFIGS, is_sharded, current_branch,
+    _config_for, _endpoint, _breaker_for, _start_probe,
+)
+from branches import publish_catalog_entry
+from api_handler import parse_google_books_data, fetch_book_data, API_TIMEOUT_SECONDS, FOUND, NOT_FOUND
+from deadline import Deadline, DeadlineExceeded
+from procedures import procedures_enabled
+from row_types import PatronInfo, ActiveLoan, AvailableBook, make_rows
+from app_logging import get_logger, elapsed_ms
+from loan_logic import (
+    LOAN_PERIOD_DAYS, FINE_RATE_PER_DAY, PROCEDURE_REASONS, ACTIVE_LOANS_SQL,
+    _checkout_steps, _return_steps,
+)
+from patron_logic import FIND_PATRON_SQL, COUNT_ACTIVE_LOANS_SQL
+from sync_logic import (
+    SYNC_DEADLINE_SECONDS, NOT_FOUND_MARKER, BOOK_EXISTS_SQL, CACHE_LOOKUP_SQL, CACHE_UPSERT_SQL,
+    LOCK_WAIT_TIMEOUT_SQL, SET_LOCK_WAIT_TIMEOUT_SQL, SEARCH_AVAILABLE_SQL, SEARCH_RESULT_LIMIT,
+    _classify_cached, _sync_steps,
+)
+
+log = get_logger(__name__)
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 20
+
+
+class _LoopPools:
+    """The pools of one event loop, keyed by server endpoint."""
+
+    def __init__(self):
+        self.pools = {}
+        self.lock = asyncio.Lock()
+        self.min_size = POOL_MIN_SIZE
+        self.max_size = POOL_MAX_SIZE
+
+
+# Event loop -> _LoopPools. A pool (and its lock) only works on the loop it was created on.
+_loop_pools = weakref.WeakKeyDictionary()
+
+
+def _pools_here() -> _LoopPools:
+    loop = asyncio.get_running_loop()
+    state = _loop_pools.get(loop)
+    if state is None:
+        state = _loop_pools[loop] = _LoopPools()
+    return state
+
+
+def _pool_kwargs(config: dict) -> dict:
+    """Translates a mysql.connector style config into aiomysql arguments."""
+    kwargs = dict(config)
+    kwargs["db"] = kwargs.pop("database")
+    return kwargs
+
+
+async def _pool_for(config: dict):
+    state = _pools_here()
+    key = _endpoint(config)
+    pool = state.pools.get(key)
+    if pool is not None:
+        return pool
+    # Serialises pool creation so concurrent first calls do not each create (and leak) a pool
+    async with state.lock:
+        if key not in state.pools:
+            state.pools[key] = await aiomysql.create_pool(
+                minsize=state.min_size, maxsize=state.max_size, autocommit=False, **_pool_kwargs(config))
+        return state.pools[key]
+
+
+async def _rollback(conn):
+    try:
+        await conn.rollback()
+    except aiomysql.Error as err:
+        log.debug("Rollback failed", extra={'error': err})
+
+
+@asynccontextmanager
+async def _connection(config: dict):
+    """
+    Yields a pooled connection to config's server, or None when config is
+    None, the server's circuit is open or it cannot be reached.
+    """
+    if config is None:
+        yield None
+        return
+
+    breaker = _breaker_for(config)
+    if not breaker.allow_request():
+        log.warning(f"Database unavailable, circuit open for {breaker.name} (retry in {breaker.retry_in():.0f}s)")
+        yield None
+        return
+
+    try:
+        pool = await _pool_for(config)
+        conn = await pool.acquire()
+    except (aiomysql.Error, OSError, asyncio.TimeoutError) as err:
+        if breaker.record_failure(err):
+            _start_probe(config, breaker)
+        log.error("Database connection error", extra={'error': err})
+        conn = None
+    else:
+        breaker.record_success()
+
+    if conn is None:
+        yield None
+        return
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def _read_config(read_your_writes: bool = False):
+    """The replica for reads, the current branch when sharded, else the primary."""
+    if is_sharded():
+        return _config_for()
+    if REPLICA_CONFIGS and not read_your_writes:
+        return REPLICA_CONFIGS[0]
+    return DB_CONFIG
+
+
+async def _run_steps(cursor, steps):
+    """Async loan_logic._run_steps."""
+    row = None
+    try:
+        while True:
+            sql, params = steps.send(row)
+            await cursor.execute(sql, params)
+            row = await cursor.fetchone() if cursor.description else cursor.lastrowid
+    except StopIteration as done:
+        return done.value
+
+
+async def _call_procedure(cursor, name: str, args: tuple):
+    """Async procedures.call_procedure."""
+    await cursor.callproc(name, args)
+    row = await cursor.fetchone()
+    # The CALL's own status result follows; drain it so the connection can be reused
+    while await cursor.nextset():
+        pass
+    return row
+
+
+async def init_pools(min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE) -> bool:
+    """
+    Creates this event loop's pools for the current branch (the primary when
+    not sharded) and, if REPLICA_CONFIGS is set, the first replica. Safe to
+    call more than once. Returns False if a server could not be reached;
+    the functions then retry on their next call.
+    """
+    state = _pools_here()
+    state.min_size, state.max_size = min_size, max_size
+    ready = True
+    for config in {id(c): c for c in (_config_for(), _read_config()) if c is not None}.values():
+        async with _connection(config) as conn:
+            ready = ready and conn is not None
+    return ready
+
+
+async def close_pools():
+    """Closes this event loop's pools and waits for their connections to be released."""
+    state = _pools_here()
+    async with state.lock:
+        for pool in state.pools.values():
+            pool.close()
+            await pool.wait_closed()
+        state.pools.clear()
+
+
+async def _checkout_by_procedure(isbn: str, patron_id: int, started: float) -> bool:
+    async with _connection(_config_for()) as conn:
+        if conn is None:
+            return False
+        try:
+            async with conn.cursor() as cursor:
+                status, due_date = await _call_procedure(
+                    cursor, "sp_checkout_book", (isbn, patron_id, datetime.now().date(), LOAN_PERIOD_DAYS))
+            if status != procedures.OK:
+                log.info(f"Checkout failed: {PROCEDURE_REASONS[status]}", extra={'isbn': isbn, 'patron_id': patron_id})
+                return False
+            log.info(f"Book checked out, due {due_date}",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'duration_ms': elapsed_ms(started)})
+            return True
+
+        except aiomysql.Error as err:
+            log.error("Database error during checkout",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            await _rollback(conn)
+            return False
+
+
+async def _return_by_procedure(isbn: str, patron_id: int, return_date, started: float) -> bool:
+    async with _connection(_config_for()) as conn:
+        if conn is None:
+            return False
+        try:
+            async with conn.cursor() as cursor:
+                status, loan_id, fine_amount = await _call_procedure(
+                    cursor, "sp_return_book", (isbn, patron_id, return_date, FINE_RATE_PER_DAY))
+            if status != procedures.OK:
+                log.info(f"Return failed: {PROCEDURE_REASONS[status]}", extra={'isbn': isbn, 'patron_id': patron_id})
+                return False
+            if fine_amount:
+                log.info(f"Book is overdue. Fine of ${fine_amount:.2f} recorded.",
+                         extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id})
+            log.info("Book returned",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id, 'duration_ms': elapsed_ms(started)})
+            return True
+
+        except aiomysql.Error as err:
+            log.error("Database error during return process",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            await _rollback(conn)
+            return False
+
+
+async def checkout_book(isbn: str, patron_id: int) -> bool:
+    """Async checkout_book: locks the Book row, decrements copies and inserts the Loan."""
+    started = time.perf_counter()
+    if procedures_enabled():
+        return await _checkout_by_procedure(isbn, patron_id, started)
+
+    async with _connection(_config_for()) as conn:
+        if conn is None:
+            return False
+        try:
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                due_date, reason = await _run_steps(cursor, _checkout_steps(isbn, patron_id, datetime.now().date()))
+            if reason:
+                log.info(f"Checkout failed: {reason}", extra={'isbn': isbn, 'patron_id': patron_id})
+                await _rollback(conn)
+                return False
+
+            await conn.commit()
+            log.info(f"Book checked out, due {due_date}",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'duration_ms': elapsed_ms(started)})
+            return True
+
+        except aiomysql.Error as err:
+            log.error("Database error during checkout",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            await _rollback(conn)
+            return False
+
+
+async def return_book(isbn: str, patron_id: int) -> bool:
+    """Async return_book: closes the open loan, records any fine and restores the copy."""
+    started = time.perf_counter()
+    return_date = datetime.now().date()
+    if procedures_enabled():
+        return await _return_by_procedure(isbn, patron_id, return_date, started)
+
+    async with _connection(_config_for()) as conn:
+        if conn is None:
+            return False
+        try:
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                loan_id, fine_amount, reason = await _run_steps(cursor, _return_steps(isbn, patron_id, return_date))
+            if reason:
+                log.info(f"Return failed: {reason}", extra={'isbn': isbn, 'patron_id': patron_id})
+                await _rollback(conn)
+                return False
+
+            if fine_amount:
+                log.info(f"Book is overdue. Fine of ${fine_amount:.2f} recorded.",
+                         extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id})
+            await conn.commit()
+            log.info("Book returned",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id, 'duration_ms': elapsed_ms(started)})
+            return True
+
+        except aiomysql.Error as err:
+            log.error("Database error during return process",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            await _rollback(conn)
+            return False
+
+
+async def find_patron_by_email(email: str, read_your_writes: bool = False, as_dict: bool = False):
+    """Async find_patron_by_email. Returns a PatronInfo (a dict when as_dict is True) or None."""
+    async with _connection(_read_config(read_your_writes)) as conn:
+        if conn is None:
+            return None
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(FIND_PATRON_SQL, (email,))
+                patron_info = await cursor.fetchone()
+                if not patron_info:
+                    return None
+
+                patron_id, first_name, last_name = patron_info
+                await cursor.execute(COUNT_ACTIVE_LOANS_SQL, (patron_id,))
+                loan_count = (await cursor.fetchone())[0]
+
+            patron_data = PatronInfo(patron_id, first_name, last_name, loan_count)
+            return patron_data._asdict() if as_dict else patron_data
+
+        except aiomysql.Error as err:
+            log.error("Database error during patron lookup", extra={'email': email, 'error': err})
+            return None
+        finally:
+            # End the implicit read transaction so the pooled connection sees fresh data
+            await _rollback(conn)
+
+
+async def get_patron_active_loans(patron_id: int, read_your_writes: bool = False, as_dict: bool = False):
+    """Async get_patron_active_loans. Returns a list of ActiveLoan rows (dicts when as_dict is True)."""
+    async with _connection(_read_config(read_your_writes)) as conn:
+        if conn is None:
+            return []
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(ACTIVE_LOANS_SQL, (patron_id,))
+                return make_rows(ActiveLoan, await cursor.fetchall(), as_dict)
+
+        except aiomysql.Error as err:
+            log.error("Database error fetching active loans", extra={'patron_id': patron_id, 'error': err})
+            return []
+        finally:
+            await _rollback(conn)
+
+
+async def search_available_books(search_term: str, limit: int = SEARCH_RESULT_LIMIT, as_dict: bool = False):
+    """Async search_available_books. Returns a list of AvailableBook rows (dicts when as_dict is True)."""
+    search_pattern = f"%{search_term}%"
+    async with _connection(_read_config()) as conn:
+        if conn is None:
+            return []
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(SEARCH_AVAILABLE_SQL, (search_pattern, search_pattern, limit))
+                return make_rows(AvailableBook, await cursor.fetchall(), as_dict)
+
+        except aiomysql.Error as err:
+            log.error("Database error fetching available books", extra={'error': err})
+            return []
+        finally:
+            await _rollback(conn)
+
+
+async def _publish(isbn: str, branches=None) -> bool:
+    """Copies a synced book to the branches (all of them by default); a no-op when not sharded."""
+    if not is_sharded():
+        return True
+    return await asyncio.to_thread(publish_catalog_entry, isbn, branches=branches)
+
+
+async def search_and_sync_book_by_isbn(isbn: str, deadline_seconds: float = SYNC_DEADLINE_SECONDS) -> bool:
+    """
+    Async search_and_sync_book_by_isbn with the same deadline budget, cache
+    fallback, API-before-transaction ordering, concurrent-insert rescue and
+    branch publishing as the sync version. The blocking HTTP and branch
+    calls run in worker threads so they do not stall the event loop.
+    """
+    started = time.perf_counter()
+    budget = Deadline(deadline_seconds)
+    branch = current_branch()
+    async with _connection(DB_CONFIG) as conn:
+        if conn is None:
+            return False
+
+        previous_lock_wait = None
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(BOOK_EXISTS_SQL, (isbn,))
+                if await cursor.fetchone():
+                    log.info("Book already exists in the local DB", extra={'isbn': isbn})
+                    await _rollback(conn)
+                    # The current branch may have joined after the book was synced
+                    return await _publish(isbn, branches=[branch])
+
+                await cursor.execute(CACHE_LOOKUP_SQL, (isbn,))
+                cache_data = await cursor.fetchone()
+                # End the read snapshot so nothing is held open during the HTTP call
+                await _rollback(conn)
+
+                raw_api_response, stale_api_response, known_missing = _classify_cached(isbn, cache_data)
+                if known_missing:
+                    return False
+
+                fetched_from_api = False
+                if not raw_api_response:
+                    budget.check("API call")
+                    log.debug("Cache miss, calling Google Books API", extra={'isbn': isbn})
+                    status, raw_data_item = await asyncio.to_thread(
+                        fetch_book_data, isbn, min(API_TIMEOUT_SECONDS, budget.remaining()))
+                    if status == FOUND:
+                        raw_api_response = raw_data_item
+                        fetched_from_api = True
+                    elif status == NOT_FOUND:
+                        # Remember the miss so repeated scans do not hit the API again
+                        await cursor.execute(CACHE_UPSERT_SQL, (isbn, json.dumps({NOT_FOUND_MARKER: True})))
+                        await conn.commit()
+                        log.info("Book not found on API", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+                        return False
+                    elif stale_api_response:
+                        log.warning("API degraded: falling back to stale cached response", extra={'isbn': isbn})
+                        raw_api_response = stale_api_response
+                    else:
+                        log.warning("Could not retrieve book data from API", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+                        return False
+
+                book_info = parse_google_books_data(raw_api_response)
+                if not book_info:
+                    return False
+
+                budget.check("DB write")
+                await cursor.execute(LOCK_WAIT_TIMEOUT_SQL)
+                row = await cursor.fetchone()
+                previous_lock_wait = row[0] if row else None
+                await cursor.execute(SET_LOCK_WAIT_TIMEOUT_SQL, (max(1, math.ceil(budget.remaining())),))
+                await conn.begin()
+
+                log.debug(f"Syncing book: {book_info['title']}", extra={'isbn': isbn})
+                await _run_steps(cursor, _sync_steps(isbn, book_info, raw_api_response if fetched_from_api else None))
+
+            await conn.commit()
+            log.info("Book and all authors synced to DB", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+            return await _publish(isbn)
+
+        except DeadlineExceeded as err:
+            log.warning("Sync aborted", extra={'isbn': isbn, 'error': err, 'duration_ms': elapsed_ms(started)})
+            await _rollback(conn)
+            return False
+
+        except aiomysql.IntegrityError as err:
+            await _rollback(conn)
+            # Another desk synced the same ISBN while we were calling the API
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(BOOK_EXISTS_SQL, (isbn,))
+                    synced = await cursor.fetchone()
+                await _rollback(conn)
+            except aiomysql.Error as check_err:
+                log.error("Database error during sync process", extra={'isbn': isbn, 'error': check_err})
+                return False
+            if synced:
+                log.info("Book was synced concurrently", extra={'isbn': isbn})
+                return await _publish(isbn, branches=[branch])
+            log.error("Database error during sync process", extra={'isbn': isbn, 'error': err})
+            return False
+
+        except aiomysql.Error as err:
+            log.error("Database error during sync process", extra={'isbn': isbn, 'error': err})
+            await _rollback(conn)
+            return False
+
+        finally:
+            # Pooled connections keep session variables
+            if previous_lock_wait is not None:
+                try:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(SET_LOCK_WAIT_TIMEOUT_SQL, (previous_lock_wait,))
+                except aiomysql.Error as err:
+                    log.warning("Could not restore innodb_lock_wait_timeout", extra={'isbn': isbn, 'error': err})
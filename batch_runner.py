@@ -0,0 +1,233 @@
+# batch_runner.py
+"""
+Batch mode: pushes a stream of operations through the logic functions.
+
+One operation per JSONL line (or CSV row with a header; empty cells are
+ignored):
+
+    {"op": "sync", "isbn": "9780441013593"}
+    {"op": "checkout", "isbn": "9780441013593", "patron_id": 7}
+    {"op": "return", "isbn": "9780441013593", "patron_id": 7}
+    {"op": "register", "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+    {"op": "report", "view": "V_OVERDUE_BOOKS", "output": "overdue.csv"}
+    {"op": "report", "view": "V_PATRON_HISTORY", "patron_id": 7, "output": "p7.csv"}
+
+Operations run on `workers` threads with pooled connections. Each
+operation goes to a worker chosen by its key (ISBN, email or view), so
+operations on the same book run in file order. Operations on different
+books run concurrently in any order. Input is read as the workers keep
+up, so the stream can be larger than memory.
+
+One JSON result per operation is written as it completes:
+
+    {"line": 3, "op": "checkout", "ok": true, "ms": 4.1}
+    {"line": 4, "op": "return", "ok": false, "ms": 2.7}
+    {"line": 5, "op": "rename", "ok": false, "error": "unknown op 'rename'"}
+
+Run it through main.py:
+
+    python main.py batch ops.jsonl --workers 16 --output results.jsonl
+    python main.py batch - --format csv < scans.csv
+"""
+import csv
+import json
+import queue
+import threading
+import time
+from array import array
+from zlib import crc32
+
+import mysql.connector
+import db_connector
+from db_connector import get_read_connection, use_pooled_connections
+from loan_logic import checkout_book, return_book
+from patron_logic import register_patron
+from sync_logic import search_and_sync_book_by_isbn
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+BATCH_WORKERS = 8
+
+# Operations queued per worker before reading the input pauses
+BATCH_QUEUE_DEPTH = 100
+
+# mysql.connector refuses larger pools
+MAX_POOL_SIZE = 32
+
+# Views report ops may export; the history views need a patron_id
+REPORT_VIEWS = ("V_CURRENT_LOANS", "V_OVERDUE_BOOKS", "V_POPULAR_BOOKS", "V_OUTSTANDING_FINES",
+                "V_PATRON_HISTORY", "V_PATRON_HISTORY_ALL")
+PATRON_VIEWS = ("V_PATRON_HISTORY", "V_PATRON_HISTORY_ALL")
+
+# Rows held in memory at a time while exporting a report
+REPORT_FETCH_SIZE = 1000
+
+
+def export_report(view: str, output: str, patron_id: int = None) -> bool:
+    """Writes a report view (filtered by patron for the history views) to a CSV file."""
+    if view not in REPORT_VIEWS:
+        raise ValueError(f"unknown view {view!r}")
+    if view in PATRON_VIEWS and patron_id is None:
+        raise ValueError(f"{view} needs a patron_id")
+
+    conn = get_read_connection()
+    if not conn:
+        return False
+
+    cursor = conn.cursor()
+    success = False
+
+    try:
+        if view in PATRON_VIEWS:
+            cursor.execute(f"SELECT * FROM {view} WHERE patron_id = %s", (patron_id,))
+        else:
+            cursor.execute(f"SELECT * FROM {view}")
+        with open(output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([col[0] for col in cursor.description])
+            rows = cursor.fetchmany(REPORT_FETCH_SIZE)
+            while rows:
+                writer.writerows(rows)
+                rows = cursor.fetchmany(REPORT_FETCH_SIZE)
+        success = True
+
+    except mysql.connector.Error as err:
+        log.error(f"Database error exporting {view}", extra={'view': view, 'error': err})
+        success = False
+
+    finally:
+        cursor.close()
+        conn.close()
+        return success
+
+
+# op name -> (handler, field the operation is routed by)
+OPERATIONS = {
+    "sync": (lambda op: search_and_sync_book_by_isbn(op["isbn"]), "isbn"),
+    "checkout": (lambda op: checkout_book(op["isbn"], int(op["patron_id"])), "isbn"),
+    "return": (lambda op: return_book(op["isbn"], int(op["patron_id"])), "isbn"),
+    "register": (lambda op: register_patron(op["first_name"], op["last_name"], op["email"]), "email"),
+    "report": (lambda op: export_report(op["view"], op["output"],
+                                        int(op["patron_id"]) if "patron_id" in op else None), "view"),
+}
+
+
+def read_operations(stream, fmt: str = "jsonl"):
+    """
+    Yields (line number, operation dict) from a JSONL or CSV stream. A line
+    that cannot be parsed yields the error message instead of a dict.
+    """
+    if fmt == "csv":
+        # Line 1 is the header
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, {key: value for key, value in row.items() if value not in (None, "")}
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            op = json.loads(line)
+        except json.JSONDecodeError as err:
+            yield line_no, f"invalid JSON: {err}"
+            continue
+        yield line_no, op if isinstance(op, dict) else "expected a JSON object"
+
+
+def _execute(line_no: int, op) -> dict:
+    if isinstance(op, str):
+        return {'line': line_no, 'op': None, 'ok': False, 'error': op}
+
+    name = op.get("op")
+    if not isinstance(name, str) or name not in OPERATIONS:
+        return {'line': line_no, 'op': name if isinstance(name, str) else None, 'ok': False,
+                'error': f"unknown op {name!r}"}
+
+    handler, _ = OPERATIONS[name]
+    started = time.perf_counter()
+    try:
+        ok = bool(handler(op))
+    except KeyError as err:
+        return {'line': line_no, 'op': name, 'ok': False, 'error': f"missing field {err.args[0]!r}"}
+    except Exception as err:
+        # Bad field values (int(None), int("abc")) and anything the logic layer raises
+        return {'line': line_no, 'op': name, 'ok': False, 'error': f"{type(err).__name__}: {err}"}
+    return {'line': line_no, 'op': name, 'ok': ok, 'ms': round((time.perf_counter() - started) * 1000, 2)}
+
+
+def _worker_for(op, workers: int) -> int:
+    if isinstance(op, dict) and isinstance(op.get("op"), str) and op["op"] in OPERATIONS:
+        key = op.get(OPERATIONS[op["op"]][1], "")
+    else:
+        key = ""
+    return crc32(str(key).encode()) % workers
+
+
+def run_batch(operations, output, workers: int = BATCH_WORKERS) -> dict:
+    """
+    Runs (line number, operation) pairs on `workers` threads and writes one
+    JSON result line per operation to output.
+
+    Returns:
+        {'total': n, 'ok': n, 'failed': n, 'seconds': s, 'by_op': {op: {'ok': n, 'failed': n, 'ms': array}}}
+    """
+    db_connector.READ_POOL_SIZE = max(db_connector.READ_POOL_SIZE, min(workers, MAX_POOL_SIZE))
+    queues = [queue.Queue(BATCH_QUEUE_DEPTH) for _ in range(workers)]
+    output_lock = threading.Lock()
+    by_op = {}
+
+    def record(result: dict):
+        with output_lock:
+            output.write(json.dumps(result, default=str) + "\n")
+            counts = by_op.setdefault(result['op'], {'ok': 0, 'failed': 0, 'ms': array('d')})
+            counts['ok' if result['ok'] else 'failed'] += 1
+            if 'ms' in result:
+                counts['ms'].append(result['ms'])
+
+    def worker(jobs):
+        with use_pooled_connections():
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                # A worker must keep draining its queue, or run_batch blocks on put()
+                try:
+                    record(_execute(*job))
+                except Exception as err:
+                    log.error(f"Batch line {job[0]} could not be recorded", extra={'error': err})
+
+    threads = [threading.Thread(target=worker, args=(jobs,), name=f"batch-{i}", daemon=True)
+               for i, jobs in enumerate(queues)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    for line_no, op in operations:
+        queues[_worker_for(op, workers)].put((line_no, op))
+    for jobs in queues:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+    output.flush()
+    ok = sum(counts['ok'] for counts in by_op.values())
+    failed = sum(counts['failed'] for counts in by_op.values())
+    return {'total': ok + failed, 'ok': ok, 'failed': failed,
+            'seconds': time.perf_counter() - started, 'by_op': by_op}
+
+
+def format_batch_summary(stats: dict) -> str:
+    """Throughput and per-operation latency table for a run_batch() result."""
+    seconds = max(stats['seconds'], 1e-9)
+    lines = [
+        f"{stats['total']} operations in {stats['seconds']:.2f}s "
+        f"({stats['total'] / seconds:.1f} ops/s): {stats['ok']} ok, {stats['failed']} failed",
+        f"{'op':<10} | {'ok':>7} | {'failed':>7} | {'p50 ms':>8} | {'p95 ms':>8}",
+    ]
+    for name, counts in sorted(stats['by_op'].items(), key=lambda item: item[0] or ""):
+        samples = sorted(counts['ms'])
+        p50 = f"{samples[len(samples) // 2]:.2f}" if samples else "-"
+        p95 = f"{samples[min(int(len(samples) * 0.95), len(samples) - 1)]:.2f}" if samples else "-"
+        lines.append(f"{name or '(invalid)':<10} | {counts['ok']:>7} | {counts['failed']:>7} | {p50:>8} | {p95:>8}")
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+# bench_archive.py
+"""
+Before/after measurement for loan archival on the plan-check database.
+
+    python bench_archive.py --seed [loans]   # seed a multi-million-row Loan table first
+    python bench_archive.py                  # measure, archive, measure again
+
+Times the open-loan queries that filter on return_date IS NULL, runs
+loan_archive.archive_closed_loans against the same database, and prints
+median latencies for both runs plus the Loan table size.
+"""
+import statistics
+import sys
+import time
+
+import db_connector
+import loan_archive
+import query_plan_check
+from loan_logic import ACTIVE_LOANS_SQL
+from patron_logic import COUNT_ACTIVE_LOANS_SQL
+
+REPEATS = 50
+
+# FIND_ACTIVE_LOAN_SQL without FOR UPDATE, so the benchmark takes no locks
+FIND_OPEN_LOAN_SQL = """
+SELECT loan_id, due_date FROM Loan
+WHERE isbn = %s AND patron_id = %s AND return_date IS NULL LIMIT 1
+"""
+
+QUERIES = [
+    ("find_patron_by_email COUNT", COUNT_ACTIVE_LOANS_SQL, (query_plan_check.SAMPLE_PATRON_ID,)),
+    ("get_patron_active_loans", ACTIVE_LOANS_SQL, (query_plan_check.SAMPLE_PATRON_ID,)),
+    ("return_book lookup", FIND_OPEN_LOAN_SQL, (query_plan_check.SAMPLE_ISBN, query_plan_check.SAMPLE_PATRON_ID)),
+    ("dashboard issued count", "SELECT COUNT(loan_id) FROM Loan WHERE return_date IS NULL", ()),
+    ("V_CURRENT_LOANS", "SELECT * FROM V_CURRENT_LOANS ORDER BY checkout_date DESC LIMIT 5", ()),
+    ("V_OVERDUE_BOOKS", "SELECT * FROM V_OVERDUE_BOOKS", ()),
+]
+
+
+def measure(conn) -> dict:
+    """Returns {label: median milliseconds} and prints the Loan size."""
+    # End any open snapshot so the second run sees the archived state
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM Loan")
+    print(f"Loan rows: {cursor.fetchone()[0]}")
+
+    results = {}
+    for label, sql, params in QUERIES:
+        timings = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = statistics.median(timings)
+    cursor.close()
+    return results
+
+
+if __name__ == "__main__":
+    bench_conn = query_plan_check._connect()
+    if not bench_conn:
+        sys.exit(1)
+
+    if "--seed" in sys.argv:
+        extra = [a for a in sys.argv[1:] if a != "--seed"]
+        query_plan_check.SEED_LOANS = int(extra[0]) if extra else 3000000
+        if not query_plan_check.seed_plan_check_data(bench_conn):
+            sys.exit(1)
+
+    query_plan_check.apply_migrations(bench_conn)
+    before = measure(bench_conn)
+
+    # Archive against the plan-check database, not DB_CONFIG
+    db_connector.DB_CONFIG = query_plan_check.PLAN_CHECK_DB_CONFIG
+    loan_archive.archive_closed_loans()
+
+    after = measure(bench_conn)
+    bench_conn.close()
+
+    print(f"\n{'query':<28} | {'before ms':>9} | {'after ms':>9}")
+    print("-" * 52)
+    for label in before:
+        print(f"{label:<28} | {before[label]:>9.2f} | {after[label]:>9.2f}")
@@ -0,0 +1,67 @@
+# bench_async.py
+"""
+Concurrency scaling benchmark: blocking patron lookups on a thread pool vs.
+the async versions on one event loop, both pinned to a single CPU core.
+
+    python bench_async.py [email] [requests]
+
+Uses find_patron_by_email (read-only), so it is safe on a live database.
+The thread baseline opens a connection per call, as the blocking API does.
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import async_logic
+from patron_logic import find_patron_by_email
+
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+
+
+def pin_to_one_core():
+    """Restricts this process to a single CPU so scaling reflects I/O overlap, not parallelism."""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {sorted(os.sched_getaffinity(0))[0]})
+    else:
+        print("NOTICE: CPU pinning not supported on this platform; results use all cores.")
+
+
+def bench_threads(email: str, total: int, concurrency: int) -> float:
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: find_patron_by_email(email), range(total)))
+        return time.perf_counter() - start
+
+
+async def bench_async(email: str, total: int, concurrency: int) -> float:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            await async_logic.find_patron_by_email(email)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(email: str, total: int):
+    await async_logic.init_pools(max_size=max(CONCURRENCY_LEVELS))
+    try:
+        print(f"{'concurrency':>11} | {'threads req/s':>13} | {'async req/s':>11}")
+        print("-" * 42)
+        for concurrency in CONCURRENCY_LEVELS:
+            sync_elapsed = bench_threads(email, total, concurrency)
+            async_elapsed = await bench_async(email, total, concurrency)
+            print(f"{concurrency:>11} | {total / sync_elapsed:>13.1f} | {total / async_elapsed:>11.1f}")
+    finally:
+        await async_logic.close_pools()
+
+
+if __name__ == "__main__":
+    bench_email = sys.argv[1] if len(sys.argv) > 1 else "test@example.com"
+    bench_total = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    pin_to_one_core()
+    asyncio.run(main(bench_email, bench_total))
@@ -0,0 +1,99 @@
+# bench_backends.py
+"""
+Per-call latency of the logic functions on MySQL vs. the embedded SQLite
+backend, for a single desk (one caller, no concurrency).
+
+    python bench_backends.py [iterations]
+
+MySQL runs against the plan-check database (python query_plan_check.py --seed
+first); it is skipped when that server is unreachable. SQLite runs against a
+fresh temporary file holding the same sample book and patron.
+Checkout/return cycles leave closed loans behind in both databases.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import db_connector
+import query_plan_check
+from query_plan_check import SAMPLE_EMAIL, SAMPLE_ISBN, SAMPLE_PATRON_ID
+from loan_logic import checkout_book, return_book, get_patron_active_loans
+from patron_logic import find_patron_by_email
+from sync_logic import search_available_books, add_book_copies
+
+OPERATIONS = [
+    ("find_patron_by_email", lambda: find_patron_by_email(SAMPLE_EMAIL)),
+    ("search_available_books", lambda: search_available_books("Seed Title 1")),
+    ("get_patron_active_loans", lambda: get_patron_active_loans(SAMPLE_PATRON_ID)),
+    ("checkout + return", lambda: checkout_book(SAMPLE_ISBN, SAMPLE_PATRON_ID) and return_book(SAMPLE_ISBN, SAMPLE_PATRON_ID)),
+    ("report V_CURRENT_LOANS", lambda: _report("SELECT * FROM V_CURRENT_LOANS ORDER BY checkout_date DESC LIMIT 5")),
+]
+
+
+def _report(query: str):
+    conn = db_connector.get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(query)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+def seed_sqlite():
+    """Inserts the plan-check sample book and patron into the SQLite database."""
+    conn = db_connector.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO Book (isbn, title, publication_year, publisher, total_copies, available_copies)
+        VALUES (%s, %s, %s, %s, 0, 0)""", (SAMPLE_ISBN, "Seed Title 1", 2001, "Seed Press"))
+    cursor.execute("INSERT INTO Patron (first_name, last_name, email) VALUES (%s, %s, %s)",
+                   ("Seed", "Patron1", SAMPLE_EMAIL))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    add_book_copies(SAMPLE_ISBN, 3)
+
+
+def measure(iterations: int) -> dict:
+    """Returns {operation: (median ms, p95 ms)}."""
+    results = {}
+    for label, operation in OPERATIONS:
+        operation()  # warm-up: first connection, schema creation, statement caches
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[label] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+    return results
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    columns = {}
+
+    db_connector.DB_BACKEND = "mysql"
+    db_connector.DB_CONFIG = query_plan_check.PLAN_CHECK_DB_CONFIG
+    probe = db_connector.get_db_connection()
+    if probe:
+        probe.close()
+        columns["mysql"] = measure(iterations)
+    else:
+        print("NOTICE: plan-check MySQL database unreachable; showing SQLite only.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_connector.DB_BACKEND = "sqlite"
+        db_connector.SQLITE_PATH = os.path.join(tmp_dir, "bench.db")
+        seed_sqlite()
+        columns["sqlite"] = measure(iterations)
+
+    header = f"{'operation':<26}" + "".join(f" | {name + ' p50/p95 ms':>22}" for name in columns)
+    print(f"\n{header}")
+    print("-" * len(header))
+    for label, _ in OPERATIONS:
+        cells = "".join(f" | {columns[name][label][0]:>10.3f} / {columns[name][label][1]:<9.3f}" for name in columns)
+        print(f"{label:<26}{cells}")
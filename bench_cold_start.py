@@ -0,0 +1,123 @@
+# bench_cold_start.py
+"""
+Cold-start benchmark: what a fresh interpreter pays before it is useful.
+
+    python bench_cold_start.py [runs]
+
+For each entry module it reports the median cumulative import time from
+python -X importtime and the slowest imports underneath it. It also times
+main.py from process start to the first menu prompt, and app1.py to its
+first complete script run (streamlit.testing AppTest; skipped when
+Streamlit is not installed). Exits 1 when a median exceeds its entry in
+COLD_START_BUDGET_MS, so a new eager import of a heavy package is noticed.
+No database is needed; connection errors during the app run are expected.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose import is on a user-facing start path
+ENTRY_MODULES = ["main", "loan_logic", "patron_logic", "sync_logic", "co_borrowing", "parallel_reads"]
+
+# Median budgets in milliseconds; generous so only real regressions trip them
+COLD_START_BUDGET_MS = {
+    "import main": 150,
+    "import co_borrowing": 150,
+    "main.py first menu": 300,
+}
+
+SLOWEST_IMPORTS_SHOWN = 5
+
+
+def _python(*args, **kwargs):
+    return subprocess.run([sys.executable, *args], cwd=HERE, capture_output=True, text=True, **kwargs)
+
+
+def import_profile(module: str):
+    """Returns (cumulative ms for module, [(cumulative ms, package)] of its top-level imports)."""
+    result = _python("-X", "importtime", "-c", f"import {module}")
+    nested, total = [], None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Children are printed before their parent; keep those of the last top-level import only
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total = int(cumulative) / 1000
+                break
+            nested = []
+        elif depth == 1:
+            nested.append((int(cumulative) / 1000, name.strip()))
+    return total, sorted(nested, reverse=True)[:SLOWEST_IMPORTS_SHOWN]
+
+
+def time_to_first_menu() -> float:
+    """Milliseconds from spawning main.py until it prompts for a menu choice."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=HERE, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = ""
+    while "Enter your choice" not in output:
+        char = proc.stdout.read(1)
+        if not char:
+            break
+        output += char
+    elapsed = (time.perf_counter() - start) * 1000
+    proc.communicate("5\n")
+    return elapsed
+
+
+def time_to_first_paint() -> float:
+    """Milliseconds for a fresh interpreter to import Streamlit and run app1.py once, or None."""
+    script = (
+        "import time; start = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "AppTest.from_file('app1.py', default_timeout=60).run()\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    result = _python("-c", script)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _median(samples):
+    samples = [s for s in samples if s is not None]
+    return statistics.median(samples) if samples else None
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    medians = {}
+
+    print(f"{'import':<16} | {'median ms':>9} | slowest imports (ms)")
+    print("-" * 78)
+    for module in ENTRY_MODULES:
+        profiles = [import_profile(module) for _ in range(runs)]
+        medians[f"import {module}"] = _median([total for total, _ in profiles])
+        slowest = ", ".join(f"{name} {ms:.0f}" for ms, name in profiles[-1][1])
+        print(f"{module:<16} | {medians[f'import {module}']:>9.1f} | {slowest}")
+
+    medians["main.py first menu"] = _median([time_to_first_menu() for _ in range(runs)])
+    medians["app1.py first paint"] = _median([time_to_first_paint() for _ in range(runs)])
+
+    print()
+    for label in ("main.py first menu", "app1.py first paint"):
+        if medians[label] is None:
+            print(f"{label:<20} | skipped (Streamlit not installed)")
+        else:
+            print(f"{label:<20} | {medians[label]:>9.1f} ms")
+
+    over = [label for label, budget in COLD_START_BUDGET_MS.items()
+            if medians.get(label) is not None and medians[label] > budget]
+    for label in over:
+        print(f"OVER BUDGET: {label} {medians[label]:.1f} ms > {COLD_START_BUDGET_MS[label]} ms")
+    sys.exit(1 if over else 0)
@@ -0,0 +1,97 @@
+# bench_group_commit.py
+"""
+Circulation throughput with one commit per scan (loan_logic) vs. the
+group-commit writer, with many stations scanning at once.
+
+    python bench_group_commit.py [stations] [cycles per station]
+
+Each station is a thread running checkout + return cycles for its own
+patron over a few shared books. MySQL runs against the plan-check database
+(python query_plan_check.py --seed first) and is skipped when unreachable;
+SQLite runs against a fresh temporary file. The MySQL run adds copies to
+the bench books and leaves closed loans behind.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db_connector
+import query_plan_check
+from loan_logic import checkout_book, return_book
+from sync_logic import add_book_copies
+from group_commit import CirculationWriter
+
+BENCH_BOOKS = [str(9990000000000 + i) for i in range(1, 5)]
+
+
+def seed_sqlite(stations: int):
+    """Inserts the bench books and one patron per station into the SQLite database."""
+    conn = db_connector.get_db_connection()
+    cursor = conn.cursor()
+    for isbn in BENCH_BOOKS:
+        cursor.execute("""
+            INSERT INTO Book (isbn, title, publication_year, publisher, total_copies, available_copies)
+            VALUES (%s, %s, %s, %s, 0, 0)""", (isbn, f"Bench Title {isbn}", 2001, "Seed Press"))
+    for i in range(1, stations + 1):
+        cursor.execute("INSERT INTO Patron (first_name, last_name, email) VALUES (%s, %s, %s)",
+                       ("Seed", f"Patron{i}", f"seed{i}@example.invalid"))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def run(stations: int, cycles: int, checkout, return_) -> tuple:
+    """Returns (scans per second, failed scans)."""
+    def station(patron_id):
+        isbn = BENCH_BOOKS[patron_id % len(BENCH_BOOKS)]
+        failed = 0
+        for _ in range(cycles):
+            failed += not checkout(isbn, patron_id)
+            failed += not return_(isbn, patron_id)
+        return failed
+
+    with ThreadPoolExecutor(max_workers=stations) as pool:
+        start = time.perf_counter()
+        failed = sum(pool.map(station, range(1, stations + 1)))
+        elapsed = time.perf_counter() - start
+    return stations * cycles * 2 / elapsed, failed
+
+
+def measure(stations: int, cycles: int) -> dict:
+    for isbn in BENCH_BOOKS:
+        add_book_copies(isbn, stations)
+
+    results = {"per-scan commit": run(stations, cycles, checkout_book, return_book)}
+    with CirculationWriter() as writer:
+        results["group commit"] = run(stations, cycles, writer.checkout, writer.return_book)
+    return results
+
+
+if __name__ == "__main__":
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    backends = {}
+
+    db_connector.DB_BACKEND = "mysql"
+    db_connector.DB_CONFIG = query_plan_check.PLAN_CHECK_DB_CONFIG
+    probe = db_connector.get_db_connection()
+    if probe:
+        probe.close()
+        backends["mysql"] = measure(stations, cycles)
+    else:
+        print("NOTICE: plan-check MySQL database unreachable; showing SQLite only.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_connector.DB_BACKEND = "sqlite"
+        db_connector.SQLITE_PATH = os.path.join(tmp_dir, "bench.db")
+        seed_sqlite(stations)
+        backends["sqlite"] = measure(stations, cycles)
+
+    print(f"\n{stations} stations x {cycles} checkout/return cycles")
+    print(f"{'backend':<8} | {'mode':<16} | {'scans/s':>9} | {'failed':>6}")
+    print("-" * 48)
+    for backend, results in backends.items():
+        for mode, (rate, failed) in results.items():
+            print(f"{backend:<8} | {mode:<16} | {rate:>9.1f} | {failed:>6}")
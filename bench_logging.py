@@ -0,0 +1,85 @@
+# bench_logging.py
+"""
+Caller-side cost of one log line: synchronous print() vs. the queue-based
+structured logger (full, sampled, and filtered out by level).
+
+    python bench_logging.py [calls]
+
+Output goes to a temporary file in every case, flushed per line for
+print() as a terminal would be. Two measurements are printed:
+
+    - tight loop: caller-side cost per line with nothing else running
+      (worst case for the queue logger, whose writer thread competes for the GIL)
+    - simulated checkout: three DB round trips (sleeps) with one line each,
+      where the writer thread does its work while the caller waits on I/O
+"""
+import sys
+import tempfile
+import time
+
+import app_logging
+
+# Stand-in for one MySQL round trip in the simulated checkout
+ROUND_TRIP_SECONDS = 0.0002
+
+
+def per_call_us(func, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def simulated_checkout_us(emit, ops: int) -> float:
+    """Mean microseconds per checkout made of three round trips, each followed by one log line."""
+    start = time.perf_counter()
+    for i in range(ops):
+        for _ in range(3):
+            time.sleep(ROUND_TRIP_SECONDS)
+            if emit:
+                emit(i)
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def main(calls: int):
+    results = []
+    checkout = []
+    ops = max(1, calls // 100)
+    with tempfile.TemporaryFile("w") as sink:
+        checkout.append(("no logging", simulated_checkout_us(None, ops)))
+
+        def print_line(i):
+            print(f"SUCCESS: Book 9780804139024 checked out by Patron {i}.", file=sink, flush=True)
+        results.append(("print() + flush", per_call_us(print_line, calls)))
+        checkout.append(("print() + flush", simulated_checkout_us(print_line, ops)))
+
+        log = app_logging.get_logger("bench")
+        fields = {'isbn': "9780804139024", 'duration_ms': 3.1}
+
+        def log_line(i):
+            log.info("Book checked out", extra={**fields, 'patron_id': i})
+
+        for label, level, rate in [
+            ("queue logger, INFO", "INFO", 1.0),
+            ("queue logger, INFO sampled 10%", "INFO", 0.1),
+            ("queue logger, below level", "WARNING", 1.0),
+        ]:
+            app_logging.configure_logging(level=level, sample_rate=rate, stream=sink)
+            results.append((label, per_call_us(log_line, calls)))
+            checkout.append((label, simulated_checkout_us(log_line, ops)))
+            # Drain the queue so the next case starts clean
+            app_logging.shutdown_logging()
+
+    print(f"{'tight loop':<32} | {'us/line':>10}")
+    print("-" * 45)
+    for label, us in results:
+        print(f"{label:<32} | {us:>10.2f}")
+
+    print(f"\n{'simulated checkout':<32} | {'us/checkout':>10}")
+    print("-" * 45)
+    for label, us in checkout:
+        print(f"{label:<32} | {us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,86 @@
+# bench_procedures.py
+"""
+Client-side transactions vs. the stored-procedure engine: statements sent
+per operation and per-call latency.
+
+    python bench_procedures.py [iterations]
+
+Runs against the plan-check database (python query_plan_check.py --seed
+first) and applies pending migrations there, including the procedures
+(version 12). Statements are counted from the server's global Questions
+counter, which does not count statements run inside a procedure, so keep
+other clients off that server while measuring. Checkout/return cycles
+leave closed loans behind; registrations leave bench patrons behind.
+"""
+import statistics
+import sys
+import time
+import uuid
+
+import mysql.connector
+
+import db_connector
+import procedures
+import query_plan_check
+from query_plan_check import SAMPLE_ISBN, SAMPLE_PATRON_ID
+from loan_logic import checkout_book, return_book
+from patron_logic import register_patron
+from schema_migrations import apply_migrations
+
+OPERATIONS = [
+    ("checkout + return", lambda: checkout_book(SAMPLE_ISBN, SAMPLE_PATRON_ID) and return_book(SAMPLE_ISBN, SAMPLE_PATRON_ID)),
+    ("register_patron", lambda: register_patron("Bench", "Patron", f"bench-{uuid.uuid4().hex}@example.invalid")),
+]
+
+
+def _questions(cursor) -> int:
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cursor.fetchone()[1])
+
+
+def measure(monitor, iterations: int) -> dict:
+    """Returns {operation: (statements per call, median ms, p95 ms)}."""
+    cursor = monitor.cursor()
+    results = {}
+    for label, operation in OPERATIONS:
+        operation()  # warm-up
+        samples = []
+        before = _questions(cursor)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            samples.append((time.perf_counter() - start) * 1000)
+        # Minus the SHOW STATUS issued by the monitor itself
+        statements = (_questions(cursor) - before - 1) / iterations
+        samples.sort()
+        results[label] = (statements, statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+    cursor.close()
+    return results
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    db_connector.DB_CONFIG = query_plan_check.PLAN_CHECK_DB_CONFIG
+    try:
+        monitor = mysql.connector.connect(**query_plan_check.PLAN_CHECK_DB_CONFIG)
+    except mysql.connector.Error as err:
+        print(f"ERROR: plan-check MySQL database unreachable ({err}); stored procedures need MySQL.")
+        sys.exit(1)
+
+    try:
+        if not apply_migrations(monitor):
+            sys.exit(1)
+        engines = {}
+        for engine in ("client", "procedure"):
+            procedures.ENGINE = engine
+            engines[engine] = measure(monitor, iterations)
+    finally:
+        monitor.close()
+
+    print(f"\n{'operation':<20} | {'engine':<9} | {'statements':>10} | {'p50 ms':>7} | {'p95 ms':>7}")
+    print("-" * 66)
+    for label, _ in OPERATIONS:
+        for engine, results in engines.items():
+            statements, p50, p95 = results[label]
+            print(f"{label:<20} | {engine:<9} | {statements:>10.1f} | {p50:>7.3f} | {p95:>7.3f}")
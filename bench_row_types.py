@@ -0,0 +1,133 @@
+# bench_row_types.py
+"""
+Row types vs. dicts on large results: per-call time, memory blocks held by
+the result, and peak memory during the call.
+
+    python bench_row_types.py [rows] [iterations]
+
+Modes per query:
+  dict cursor   cursor(dictionary=True), what the logic layer used before
+  as_dict=True  the compatibility option (tuple cursor, dicts built after)
+  row types     the default namedtuple rows
+
+MySQL runs against the plan-check database (python query_plan_check.py
+--seed first) and is skipped when unreachable. SQLite runs against a fresh
+temporary file holding `rows` books on loan to one patron.
+"""
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import db_connector
+import query_plan_check
+from loan_logic import ACTIVE_LOANS_SQL, get_patron_active_loans
+from sync_logic import SEARCH_AVAILABLE_SQL, search_available_books
+
+BENCH_PATRON_EMAIL = "bench@example.invalid"
+SEARCH_TERM = "Title"
+
+
+def seed_sqlite(rows: int) -> int:
+    """Inserts `rows` books, each with two copies and one on loan to a single patron. Returns the patron id."""
+    conn = db_connector.get_db_connection()
+    cursor = conn.cursor()
+    books = [(str(9990000000000 + i), f"Bench Title {i}", 2001, "Seed Press", 2, 1) for i in range(1, rows + 1)]
+    cursor.executemany("""
+        INSERT INTO Book (isbn, title, publication_year, publisher, total_copies, available_copies)
+        VALUES (%s, %s, %s, %s, %s, %s)""", books)
+    cursor.execute("INSERT INTO Patron (first_name, last_name, email) VALUES (%s, %s, %s)",
+                   ("Bench", "Patron", BENCH_PATRON_EMAIL))
+    patron_id = cursor.lastrowid
+    cursor.executemany("""
+        INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+        VALUES (%s, %s, DATE('now'), DATE('now', '+14 days'), NULL)""", [(isbn, patron_id) for isbn, *_ in books])
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return patron_id
+
+
+def _dict_cursor(sql: str, params: tuple):
+    conn = db_connector.get_read_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    result = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return result
+
+
+def operations(rows: int, patron_id: int) -> list:
+    pattern = f"%{SEARCH_TERM}%"
+    return [
+        ("search_available_books", {
+            "dict cursor": lambda: _dict_cursor(SEARCH_AVAILABLE_SQL, (pattern, pattern, rows)),
+            "as_dict=True": lambda: search_available_books(SEARCH_TERM, limit=rows, as_dict=True),
+            "row types": lambda: search_available_books(SEARCH_TERM, limit=rows),
+        }),
+        ("get_patron_active_loans", {
+            "dict cursor": lambda: _dict_cursor(ACTIVE_LOANS_SQL, (patron_id,)),
+            "as_dict=True": lambda: get_patron_active_loans(patron_id, as_dict=True),
+            "row types": lambda: get_patron_active_loans(patron_id),
+        }),
+    ]
+
+
+def measure(operation, iterations: int) -> tuple:
+    """Returns (result rows, median ms, blocks held by the result, peak KB during one call)."""
+    operation()  # warm-up: connection, statement caches
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    result = operation()
+    gc.collect()
+    held_blocks = sys.getallocatedblocks() - blocks_before
+
+    del result
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return len(operation()), statistics.median(samples), held_blocks, peak_kb
+
+
+def run(rows: int, iterations: int, patron_id: int):
+    print(f"{'query':<24} | {'mode':<12} | {'rows':>6} | {'median ms':>9} | {'held blocks':>11} | {'peak KB':>8}")
+    print("-" * 86)
+    for label, modes in operations(rows, patron_id):
+        for mode, operation in modes.items():
+            count, median_ms, held_blocks, peak_kb = measure(operation, iterations)
+            print(f"{label:<24} | {mode:<12} | {count:>6} | {median_ms:>9.2f} | {held_blocks:>11} | {peak_kb:>8.0f}")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    db_connector.DB_BACKEND = "mysql"
+    db_connector.DB_CONFIG = query_plan_check.PLAN_CHECK_DB_CONFIG
+    probe = db_connector.get_db_connection()
+    if probe:
+        probe.close()
+        print("\nmysql (plan-check database)")
+        run(rows, iterations, query_plan_check.SAMPLE_PATRON_ID)
+    else:
+        print("NOTICE: plan-check MySQL database unreachable; showing SQLite only.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_connector.DB_BACKEND = "sqlite"
+        db_connector.SQLITE_PATH = os.path.join(tmp_dir, "bench.db")
+        patron_id = seed_sqlite(rows)
+        print("\nsqlite")
+        run(rows, iterations, patron_id)
@@ -0,0 +1,208 @@
+# branches.py
+"""
+Multi-branch helpers on top of the routing in db_connector.py.
+
+Each branch in BRANCH_CONFIGS has the full schema. Patron, Loan and Fine
+rows, and the copy counts in Book, belong to the branch. Catalog rows
+(Book metadata, Author, Book_Author) are synced once into the shared
+catalog (DB_CONFIG) and copied into every branch by publish_catalog_entry(),
+so each branch can check out books without a cross-database join.
+
+Cross-branch reports run the same query on every branch in parallel and
+merge the rows, tagged with the branch id.
+
+    python branches.py --publish-catalog   # copy the whole catalog to every branch (new branch, repair)
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+from db_connector import BRANCH_CONFIGS, get_catalog_connection, get_db_connection, use_branch
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Upper bound on concurrent branch connections for one fan-out
+MAX_FAN_OUT_WORKERS = 8
+
+CATALOG_BOOKS_SQL = "SELECT isbn, title, publisher, publication_year FROM Book"
+
+CATALOG_AUTHORS_SQL = """
+SELECT BA.isbn, A.author_name
+FROM Book_Author BA
+JOIN Author A ON A.author_id = BA.author_id
+"""
+
+# Copies arrive with zero inventory; each branch adds its own copies
+BRANCH_INSERT_BOOK_SQL = """
+INSERT IGNORE INTO Book (isbn, title, publisher, publication_year, total_copies, available_copies)
+VALUES (%s, %s, %s, %s, 0, 0)
+"""
+
+BRANCH_FIND_AUTHOR_SQL = "SELECT author_id FROM Author WHERE author_name = %s"
+
+BRANCH_INSERT_AUTHOR_SQL = "INSERT INTO Author (author_name) VALUES (%s)"
+
+BRANCH_LINK_AUTHOR_SQL = "INSERT IGNORE INTO Book_Author (isbn, author_id) VALUES (%s, %s)"
+
+
+def branch_ids(branches=None) -> list:
+    """The given branches, or every configured branch."""
+    return list(branches) if branches else list(BRANCH_CONFIGS)
+
+
+def fan_out(func, *args, branches=None) -> dict:
+    """
+    Calls func(*args) once per branch, in parallel, with connections routed
+    to that branch. Returns {branch_id: result}.
+    """
+    targets = branch_ids(branches)
+    if not targets:
+        return {}
+
+    def run(branch_id):
+        with use_branch(branch_id):
+            return func(*args)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_FAN_OUT_WORKERS, len(targets))) as pool:
+        return dict(zip(targets, pool.map(run, targets)))
+
+
+def _read_catalog(isbn: str = None):
+    """Returns ({isbn: (isbn, title, publisher, year)}, {isbn: [author_name, ...]}) from the shared catalog."""
+    conn = get_catalog_connection()
+    if not conn:
+        return None, None
+
+    cursor = conn.cursor()
+    books, authors = None, None
+
+    try:
+        if isbn:
+            cursor.execute(CATALOG_BOOKS_SQL + " WHERE isbn = %s", (isbn,))
+        else:
+            cursor.execute(CATALOG_BOOKS_SQL)
+        books = {row[0]: row for row in cursor.fetchall()}
+        if isbn:
+            cursor.execute(CATALOG_AUTHORS_SQL + " WHERE BA.isbn = %s", (isbn,))
+        else:
+            cursor.execute(CATALOG_AUTHORS_SQL)
+        authors = {}
+        for book_isbn, author_name in cursor.fetchall():
+            authors.setdefault(book_isbn, []).append(author_name)
+
+    except mysql.connector.Error as err:
+        log.error("Database error reading the shared catalog", extra={'isbn': isbn, 'error': err})
+        books, authors = None, None
+
+    finally:
+        cursor.close()
+        conn.close()
+        return books, authors
+
+
+def _copy_to_branch(books: dict, authors: dict) -> bool:
+    """Inserts catalog rows the current branch does not have yet, in one transaction."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    cursor = conn.cursor()
+    author_ids = {}
+    success = False
+
+    try:
+        conn.start_transaction()
+        cursor.executemany(BRANCH_INSERT_BOOK_SQL, list(books.values()))
+        for book_isbn, names in authors.items():
+            for author_name in names:
+                if author_name not in author_ids:
+                    cursor.execute(BRANCH_FIND_AUTHOR_SQL, (author_name,))
+                    result = cursor.fetchone()
+                    if result:
+                        author_ids[author_name] = result[0]
+                    else:
+                        cursor.execute(BRANCH_INSERT_AUTHOR_SQL, (author_name,))
+                        author_ids[author_name] = cursor.lastrowid
+                cursor.execute(BRANCH_LINK_AUTHOR_SQL, (book_isbn, author_ids[author_name]))
+        conn.commit()
+        success = True
+
+    except mysql.connector.Error as err:
+        log.error("Database error copying catalog to branch", extra={'count': len(books), 'error': err})
+        conn.rollback()
+        success = False
+
+    finally:
+        cursor.close()
+        conn.close()
+        return success
+
+
+def publish_catalog_entry(isbn: str = None, branches=None) -> bool:
+    """
+    Copies one catalog book (or the whole catalog when isbn is None) into
+    the given branches, or every branch. Safe to repeat: rows a branch
+    already has are left alone. Returns True if every branch succeeded.
+    """
+    books, authors = _read_catalog(isbn)
+    if books is None:
+        return False
+    if not books:
+        log.info("Nothing to publish: book not in the shared catalog", extra={'isbn': isbn})
+        return False
+
+    results = fan_out(_copy_to_branch, books, authors, branches=branches)
+    failed = [branch_id for branch_id, ok in results.items() if not ok]
+    if failed:
+        log.warning(f"Catalog publish failed for branches {failed}", extra={'isbn': isbn})
+    else:
+        log.info(f"Catalog published to {len(results)} branches", extra={'isbn': isbn, 'count': len(books)})
+    return not failed
+
+
+def _fetch_rows(query: str):
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cursor = conn.cursor(dictionary=True)
+    rows = None
+
+    try:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+
+    except mysql.connector.Error as err:
+        log.error("Database error in branch report", extra={'error': err})
+        rows = None
+
+    finally:
+        cursor.close()
+        conn.close()
+        return rows
+
+
+def fetch_report_all_branches(view_name: str, query_filter: str = "", branches=None):
+    """
+    Runs SELECT * FROM view_name on every branch in parallel and merges the
+    rows, each tagged with its 'branch'. Branches that fail are skipped and
+    returned separately.
+
+    Returns:
+        (rows, failed_branches)
+    """
+    query = f"SELECT * FROM {view_name} {query_filter}"
+    rows, failed = [], []
+    for branch_id, branch_rows in fan_out(_fetch_rows, query, branches=branches).items():
+        if branch_rows is None:
+            failed.append(branch_id)
+            continue
+        rows.extend({'branch': branch_id, **row} for row in branch_rows)
+    return rows, failed
+
+
+if __name__ == "__main__":
+    if "--publish-catalog" in sys.argv:
+        sys.exit(0 if publish_catalog_entry() else 1)
+    print(__doc__)
@@ -0,0 +1,91 @@
+# circuit_breaker.py
+"""
+A small thread-safe circuit breaker.
+
+closed    -> calls go through; consecutive failures are counted
+open      -> calls fail immediately until cool_off_seconds have passed
+half_open -> one trial call is let through; success closes, failure re-opens
+"""
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, cool_off_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_off_seconds = cool_off_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at < self.cool_off_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """True if a call may be attempted now."""
+        with self._lock:
+            state = self._state_locked()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+            self.last_error = None
+
+    def release_trial(self):
+        """Ends a call whose outcome says nothing about the server's health; counts nothing."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error=None) -> bool:
+        """Counts a failure. Returns True if this call opened the circuit."""
+        with self._lock:
+            self._failures += 1
+            self.last_error = str(error) if error else None
+            was_open = self._opened_at is not None
+            if was_open or self._failures >= self.failure_threshold:
+                # A failed half-open trial restarts the cool-off period
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                return not was_open
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until the next trial call is allowed (0 when closed)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.cool_off_seconds - (time.monotonic() - self._opened_at))
+
+    def snapshot(self) -> dict:
+        """State for display in the UI or logs."""
+        return {
+            'name': self.name,
+            'state': self.state,
+            'failures': self._failures,
+            'retry_in': round(self.retry_in(), 1),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,362 @@
+# co_borrowing.py
+"""
+"Patrons who borrowed this also borrowed" suggestions.
+
+A batch job streams loan history (V_LOAN_HISTORY_ALL, so archived loans
+count too) into a sparse patron x book matrix B, where B[p, b] = 1 if
+patron p ever borrowed book b. The item-item co-occurrence matrix is
+C = B.T @ B: C[i, j] is the number of patrons who borrowed both i and j,
+and C[i, i] is the number of distinct borrowers of i. Neighbours are ranked
+by cosine similarity C[i, j] / sqrt(C[i, i] * C[j, j]) so very popular
+titles do not appear next to everything.
+
+The top TOP_K_NEIGHBOURS per ISBN are stored in Book_Neighbour (created by
+schema_migrations.py, version 9) and read at the desk with
+get_co_borrowed_books(). B, C and the loan_id watermark are kept under
+STATE_DIR, so later runs only read new loans (plus a margin of recent ids,
+see LOAN_ID_SAFETY_MARGIN):
+
+    C' = C + B.T @ D + D.T @ B + D.T @ D
+
+where D holds the (patron, book) pairs that are new since the last run.
+Only ISBNs whose neighbour scores could have changed are rewritten.
+
+    python co_borrowing.py           # incremental update (full build on first run)
+    python co_borrowing.py --full    # rebuild from all loan history
+
+numpy and scipy are imported inside the batch functions only, so the desk
+lookup (get_co_borrowed_books) does not load them.
+"""
+import json
+import os
+import sys
+import time
+
+import mysql.connector
+
+from db_connector import get_db_connection, get_read_connection
+from app_logging import get_logger, elapsed_ms
+
+log = get_logger(__name__)
+
+STATE_DIR = "co_borrowing_state"
+STATE_FILE = "_state.json"
+
+# Neighbours stored per ISBN
+TOP_K_NEIGHBOURS = 10
+
+# Pairs borrowed together by fewer patrons than this are treated as noise
+MIN_CO_BORROWERS = 2
+
+# Loan rows fetched from MySQL per chunk
+LOAN_CHUNK_ROWS = 50000
+
+# Loan ids re-read below the watermark on each incremental run. AUTO_INCREMENT
+# ids are taken at INSERT but become visible at COMMIT, so a loan can appear
+# after a higher id was already read (concurrent desks, group commit, kiosk
+# batches). Pairs already in B are de-duplicated by update_co_occurrence.
+LOAN_ID_SAFETY_MARGIN = 10000
+
+# ISBNs whose neighbour lists are replaced per write transaction
+WRITE_BATCH_ISBNS = 500
+
+LOAN_PAIRS_SQL = """
+SELECT loan_id, patron_id, isbn
+FROM V_LOAN_HISTORY_ALL
+WHERE loan_id > %s
+"""
+
+INSERT_NEIGHBOUR_SQL = """
+INSERT INTO Book_Neighbour (isbn, neighbour_rank, neighbour_isbn, co_borrowers, score)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+CO_BORROWED_SQL = """
+SELECT N.neighbour_isbn AS isbn, B.title, N.co_borrowers, N.score
+FROM Book_Neighbour N
+JOIN Book B ON B.isbn = N.neighbour_isbn
+WHERE N.isbn = %s
+ORDER BY N.neighbour_rank
+LIMIT %s
+"""
+
+
+def _empty_state() -> dict:
+    import numpy as np
+    import scipy.sparse as sp
+    return {
+        'last_loan_id': 0,
+        'patrons': [],
+        'isbns': [],
+        'borrowed': sp.csr_matrix((0, 0), dtype=np.int32),
+        'co_counts': sp.csr_matrix((0, 0), dtype=np.int32),
+    }
+
+
+def load_state(state_dir: str = STATE_DIR) -> dict:
+    """Returns the saved matrices and watermark, or an empty state on first run."""
+    import scipy.sparse as sp
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return _empty_state()
+    with open(path) as f:
+        meta = json.load(f)
+    return {
+        'last_loan_id': meta['last_loan_id'],
+        'patrons': meta['patrons'],
+        'isbns': meta['isbns'],
+        'borrowed': sp.load_npz(os.path.join(state_dir, meta['borrowed_file'])).tocsr(),
+        'co_counts': sp.load_npz(os.path.join(state_dir, meta['co_counts_file'])).tocsr(),
+    }
+
+
+def save_state(state: dict, state_dir: str = STATE_DIR):
+    """
+    Writes the matrices under new file names, then swaps the metadata file
+    atomically, so a crash leaves the previous state readable.
+    """
+    import scipy.sparse as sp
+    os.makedirs(state_dir, exist_ok=True)
+    run_id = time.strftime("%Y%m%d%H%M%S")
+    borrowed_file = f"borrowed-{run_id}.npz"
+    co_counts_file = f"co_counts-{run_id}.npz"
+    sp.save_npz(os.path.join(state_dir, borrowed_file), state['borrowed'])
+    sp.save_npz(os.path.join(state_dir, co_counts_file), state['co_counts'])
+
+    path = os.path.join(state_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({
+            'last_loan_id': state['last_loan_id'],
+            'patrons': state['patrons'],
+            'isbns': state['isbns'],
+            'borrowed_file': borrowed_file,
+            'co_counts_file': co_counts_file,
+        }, f)
+    os.replace(path + ".tmp", path)
+
+    for name in os.listdir(state_dir):
+        if name.endswith(".npz") and name not in (borrowed_file, co_counts_file):
+            os.remove(os.path.join(state_dir, name))
+
+
+def _read_new_pairs(cursor, last_loan_id, patron_index, isbn_index, patrons, isbns):
+    """
+    Streams loans above the watermark (less LOAN_ID_SAFETY_MARGIN) in chunks
+    and maps them to matrix coordinates, growing the patron/ISBN lists as
+    new ones appear. Returns (rows, cols, max_loan_id).
+    """
+    import numpy as np
+    cursor.execute(LOAN_PAIRS_SQL, (max(last_loan_id - LOAN_ID_SAFETY_MARGIN, 0),))
+    rows, cols = [], []
+    max_loan_id = last_loan_id
+    while True:
+        chunk = cursor.fetchmany(LOAN_CHUNK_ROWS)
+        if not chunk:
+            break
+        chunk_rows = np.empty(len(chunk), dtype=np.int32)
+        chunk_cols = np.empty(len(chunk), dtype=np.int32)
+        for n, (loan_id, patron_id, isbn) in enumerate(chunk):
+            row = patron_index.get(patron_id)
+            if row is None:
+                row = patron_index[patron_id] = len(patrons)
+                patrons.append(patron_id)
+            col = isbn_index.get(isbn)
+            if col is None:
+                col = isbn_index[isbn] = len(isbns)
+                isbns.append(isbn)
+            chunk_rows[n] = row
+            chunk_cols[n] = col
+            if loan_id > max_loan_id:
+                max_loan_id = loan_id
+        rows.append(chunk_rows)
+        cols.append(chunk_cols)
+
+    if not rows:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), max_loan_id
+    return np.concatenate(rows), np.concatenate(cols), max_loan_id
+
+
+def _resize(matrix, shape):
+    """Pads a sparse matrix with empty rows/columns up to shape."""
+    matrix = matrix.tocsr()
+    matrix.resize(shape)
+    return matrix
+
+
+def update_co_occurrence(state: dict, rows, cols):
+    """
+    Folds new (patron, book) pairs into the state in place.
+    Returns the indices of books whose neighbour lists must be recomputed.
+    """
+    import numpy as np
+    import scipy.sparse as sp
+    shape = (len(state['patrons']), len(state['isbns']))
+    borrowed = _resize(state['borrowed'], shape)
+    co_counts = _resize(state['co_counts'], (shape[1], shape[1]))
+
+    seen = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=shape)
+    seen.data[:] = 1  # duplicates were summed; a patron counts once per book
+
+    # D: pairs that are new, i.e. not already in B
+    delta = seen - seen.multiply(borrowed)
+    delta.eliminate_zeros()
+    if delta.nnz == 0:
+        state['borrowed'], state['co_counts'] = borrowed, co_counts
+        return np.empty(0, dtype=np.int64)
+
+    cross = borrowed.T @ delta
+    co_delta = (cross + cross.T + delta.T @ delta).tocsr()
+
+    state['borrowed'] = (borrowed + delta).tocsr()
+    state['co_counts'] = (co_counts + co_delta).tocsr()
+
+    # Scores change where a co-count changed, or where a neighbour gained borrowers
+    changed_rows = np.flatnonzero(co_delta.getnnz(axis=1))
+    new_borrowers = np.flatnonzero(co_delta.diagonal())
+    touches_changed = np.flatnonzero(state['co_counts'][:, new_borrowers].getnnz(axis=1))
+    return np.union1d(changed_rows, touches_changed)
+
+
+def top_neighbours(co_counts, books, k: int = TOP_K_NEIGHBOURS, min_co_borrowers: int = MIN_CO_BORROWERS):
+    """
+    Ranks neighbours for the given book indices, vectorised over all of them.
+    Returns a dict {book_index: [(neighbour_index, co_borrowers, score), ...]}.
+    """
+    import numpy as np
+    result = {int(b): [] for b in books}
+    if len(books) == 0:
+        return result
+
+    borrowers = co_counts.diagonal().astype(np.float64)
+    block = co_counts[books].tocoo()
+    book_idx = np.asarray(books)[block.row]
+    keep = (block.col != book_idx) & (block.data >= min_co_borrowers)
+    row, col, count = book_idx[keep], block.col[keep], block.data[keep]
+    score = count / np.sqrt(borrowers[row] * borrowers[col])
+
+    # Sort by book, then score descending; the first k of each group are the top k
+    order = np.lexsort((col, -score, row))
+    row, col, count, score = row[order], col[order], count[order], score[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(row)) + 1]
+    rank = np.arange(len(row)) - np.repeat(group_start, np.diff(np.r_[group_start, len(row)]))
+    top = rank < k
+
+    for b, n, c, s in zip(row[top], col[top], count[top], score[top]):
+        result[int(b)].append((int(n), int(c), float(s)))
+    return result
+
+
+def _write_neighbours(state: dict, neighbours: dict) -> bool:
+    """Replaces the Book_Neighbour rows of the given books, one transaction per batch."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    cursor = conn.cursor()
+    isbns = state['isbns']
+    books = list(neighbours)
+    success = False
+
+    try:
+        for start in range(0, len(books), WRITE_BATCH_ISBNS):
+            batch = books[start:start + WRITE_BATCH_ISBNS]
+            batch_isbns = [isbns[b] for b in batch]
+            placeholders = ", ".join(["%s"] * len(batch_isbns))
+
+            conn.start_transaction()
+            cursor.execute(f"DELETE FROM Book_Neighbour WHERE isbn IN ({placeholders})", batch_isbns)
+            values = [
+                (isbns[b], rank, isbns[n], count, round(score, 6))
+                for b in batch
+                for rank, (n, count, score) in enumerate(neighbours[b], start=1)
+            ]
+            if values:
+                cursor.executemany(INSERT_NEIGHBOUR_SQL, values)
+            conn.commit()
+        success = True
+
+    except mysql.connector.Error as err:
+        log.error("Database error writing book neighbours", extra={'error': err})
+        conn.rollback()
+        success = False
+
+    finally:
+        cursor.close()
+        conn.close()
+        return success
+
+
+def refresh_co_borrowing(full: bool = False, state_dir: str = STATE_DIR) -> int:
+    """
+    Reads loans since the last run (all loans when full is True), updates the
+    co-occurrence matrix and rewrites the neighbour lists that changed.
+    The state is saved only after Book_Neighbour is written, so a failed
+    run is simply repeated next time. Returns the number of ISBNs rewritten,
+    or -1 on failure.
+    """
+    import numpy as np
+    started = time.perf_counter()
+    state = _empty_state() if full else load_state(state_dir)
+    patron_index = {p: i for i, p in enumerate(state['patrons'])}
+    isbn_index = {b: i for i, b in enumerate(state['isbns'])}
+
+    conn = get_read_connection()
+    if not conn:
+        return -1
+
+    cursor = conn.cursor()
+    try:
+        rows, cols, max_loan_id = _read_new_pairs(
+            cursor, state['last_loan_id'], patron_index, isbn_index, state['patrons'], state['isbns'])
+    except mysql.connector.Error as err:
+        log.error("Database error reading loan history", extra={'error': err})
+        return -1
+    finally:
+        cursor.close()
+        conn.close()
+
+    changed = update_co_occurrence(state, rows, cols)
+    if full:
+        # Drop lists of books that no longer have any qualifying neighbour too
+        changed = np.arange(len(state['isbns']))
+    neighbours = top_neighbours(state['co_counts'], changed)
+
+    if not _write_neighbours(state, neighbours):
+        return -1
+
+    state['last_loan_id'] = max_loan_id
+    save_state(state, state_dir)
+    log.info(f"Co-borrowing updated from {len(rows)} loans read, watermark loan_id {max_loan_id}",
+             extra={'count': len(neighbours), 'duration_ms': elapsed_ms(started)})
+    return len(neighbours)
+
+
+def get_co_borrowed_books(isbn: str, limit: int = 5):
+    """
+    Returns books most often borrowed by patrons who also borrowed isbn.
+
+    Returns:
+        A list of dictionaries [{'isbn', 'title', 'co_borrowers', 'score'}] or an empty list.
+    """
+    conn = get_read_connection()
+    if not conn:
+        return []
+
+    cursor = conn.cursor(dictionary=True)
+    books = []
+
+    try:
+        cursor.execute(CO_BORROWED_SQL, (isbn, limit))
+        books = cursor.fetchall()
+
+    except mysql.connector.Error as err:
+        log.error("Database error fetching co-borrowed books", extra={'isbn': isbn, 'error': err})
+
+    finally:
+        cursor.close()
+        conn.close()
+        return books
+
+
+if __name__ == "__main__":
+    sys.exit(0 if refresh_co_borrowing(full="--full" in sys.argv) >= 0 else 1)
@@ -1,4 +1,13 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
 import mysql.connector
+from circuit_breaker import CircuitBreaker, CLOSED
+from sqlite_backend import connect_sqlite
+from app_logging import get_logger
+
+log = get_logger(__name__)
 
 # --- 1. Configuration Dictionary ---
 DB_CONFIG = {
@@ -8,36 +17,348 @@ DB_CONFIG = {
     "database": "library_management_db"
 }
 
-def get_db_connection():
+# "mysql" (default) or "sqlite" for an embedded single-desk database at
+# SQLITE_PATH (see sqlite_backend.py). Replicas, branches and the circuit
+# breaker only apply to MySQL.
+DB_BACKEND = os.environ.get("OPENSHELF_DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("OPENSHELF_SQLITE_PATH", "openshelf.db")
+
+# --- 2. Read Replicas ---
+# Read-only traffic (reports, metrics, search, patron lookup) is routed here.
+# Leave the list empty to send everything to the primary. For local testing,
+# run a second MySQL instance replicating from the first, e.g.:
+# REPLICA_CONFIGS = [{**DB_CONFIG, "port": 3307}]
+REPLICA_CONFIGS = []
+
+# Replicas lagging more than this many seconds are skipped (primary fallback)
+MAX_REPLICA_LAG_SECONDS = 5
+
+# How long a lag measurement is trusted before the replica is checked again
+REPLICA_LAG_CHECK_INTERVAL = 10
+
+# After a write, reads from the same thread stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = 2
+
+# --- 3. Outage Handling ---
+# Short connect timeout so a down server costs seconds, not the driver default
+CONNECT_TIMEOUT_SECONDS = 3
+
+# Consecutive connect failures before the circuit opens
+CIRCUIT_FAILURE_THRESHOLD = 3
+
+# While open, connection attempts fail immediately for this long
+CIRCUIT_COOL_OFF_SECONDS = 30
+
+# How often the background probe retries a server whose circuit is open
+PROBE_INTERVAL_SECONDS = 5
+
+# --- 4. Branches ---
+# Each branch keeps its own Patron, Loan and Fine rows, and its own copy
+# counts in Book, in a separate database or instance. DB_CONFIG then holds
+# the shared catalog (Book metadata, Author, Book_Author, Api_Cache), which
+# branches.py copies into every branch. Leave empty for a single database.
+# Several schemas on one local server are enough for testing, e.g.:
+# BRANCH_CONFIGS = {
+#     "north": {**DB_CONFIG, "database": "library_north_db"},
+#     "south": {**DB_CONFIG, "database": "library_south_db"},
+# }
+BRANCH_CONFIGS = {}
+
+# Branch used by threads that have not selected one with use_branch()
+DEFAULT_BRANCH = os.environ.get("OPENSHELF_BRANCH")
+
+# --- 5. Connection Pools ---
+# Connections kept open for pages that issue several reads at once
+# (see parallel_reads.py) and for batch workers (use_pooled_connections()).
+# Only those callers use them; batch mode raises the size to its worker count.
+READ_POOL_SIZE = 8
+
+_breakers = {}  # (host, port, database) -> CircuitBreaker
+_breakers_lock = threading.Lock()
+_probes = set()
+
+_replica_lock = threading.Lock()
+_replica_cursor = 0
+_replica_lag_cache = {}  # replica index -> (checked_at, healthy)
+_last_write = threading.local()
+_branch = threading.local()
+_pooling = threading.local()
+
+
+def _endpoint(config: dict) -> tuple:
+    return (config.get("host"), config.get("port", 3306), config.get("database"))
+
+
+def _breaker_for(config: dict) -> CircuitBreaker:
+    key = _endpoint(config)
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(
+                f"{key[0]}:{key[1]}/{key[2]}",
+                CIRCUIT_FAILURE_THRESHOLD,
+                CIRCUIT_COOL_OFF_SECONDS
+            )
+        return _breakers[key]
+
+
+def _probe_until_healthy(config: dict, breaker: CircuitBreaker):
+    """Background loop that closes the circuit as soon as the server answers again."""
+    try:
+        while breaker.state != CLOSED:
+            time.sleep(PROBE_INTERVAL_SECONDS)
+            try:
+                probe = mysql.connector.connect(**{"connection_timeout": CONNECT_TIMEOUT_SECONDS, **config})
+                probe.close()
+                breaker.record_success()
+                log.info(f"Database connection recovered ({breaker.name})")
+            except mysql.connector.Error as e:
+                # Keeps the circuit open for another cool-off period
+                breaker.record_failure(e)
+    finally:
+        with _breakers_lock:
+            _probes.discard(breaker.name)
+
+
+def _start_probe(config: dict, breaker: CircuitBreaker):
+    with _breakers_lock:
+        if breaker.name in _probes:
+            return
+        _probes.add(breaker.name)
+    threading.Thread(
+        target=_probe_until_healthy, args=(config, breaker),
+        name=f"db-probe-{breaker.name}", daemon=True
+    ).start()
+
+
+def _pool_options(config: dict) -> dict:
+    host, port, database = _endpoint(config)
+    return {"pool_name": f"openshelf:{host}:{port}:{database}"[:64], "pool_size": READ_POOL_SIZE}
+
+
+def _connect(config: dict, pooled: bool = False):
     """
-    Attempts to establish a connection to the MySQL database 
-    and returns the connection object.
+    Opens a connection using the given config and reports the outcome.
+    Returns the connection object or None. Fails immediately while the
+    server's circuit breaker is open. With pooled=True the connection comes
+    from a per-server pool and close() hands it back.
     """
+    breaker = _breaker_for(config)
+    if not breaker.allow_request():
+        log.warning(f"Database unavailable, circuit open for {breaker.name} (retry in {breaker.retry_in():.0f}s)")
+        return None
+
     try:
-        # **kwargs unpacks the DB_CONFIG dictionary into keyword arguments**
-        conn = mysql.connector.connect(**DB_CONFIG)
+        # **kwargs unpacks the config dictionary into keyword arguments**
+        options = {"connection_timeout": CONNECT_TIMEOUT_SECONDS, **config}
+        if pooled:
+            options.update(_pool_options(config))
+        conn = mysql.connector.connect(**options)
         
         if conn.is_connected():
-            print("Database Connection Status: SUCCESS")
+            breaker.record_success()
+            log.debug("Database connection established")
             # You can also get cursor here if you want to reuse it:
             # cursor = conn.cursor()
             return conn
         else:
-            print("Database Connection Status: FAILED (Unknown Error)")
+            breaker.record_failure("not connected")
+            log.error("Database connection failed (unknown error)")
             return None
 
+    except mysql.connector.PoolError:
+        # Every pooled connection is in use; that is load, not an outage
+        log.debug("Connection pool exhausted, opening a direct connection")
+        return _connect(config)
+
     except mysql.connector.Error as e:
+        if breaker.record_failure(e):
+            _start_probe(config, breaker)
         # This block catches specific MySQL errors (e.g., wrong password, DB not running)
-        print("\n--- DATABASE CONNECTION ERROR ---")
         if e.errno == mysql.connector.errorcode.ER_ACCESS_DENIED_ERROR:
-            print("ERROR: Access denied. Check your 'user' or 'password' in DB_CONFIG.")
+            log.error("Database access denied. Check your 'user' or 'password' in DB_CONFIG.")
         elif e.errno == mysql.connector.errorcode.ER_BAD_DB_ERROR:
-            print("ERROR: Database does not exist. Check 'database' name.")
+            log.error("Database does not exist. Check 'database' name.")
         else:
-            print(f"ERROR: {e}")
-        print("---------------------------------")
+            log.error("Database connection error", extra={'error': e})
+        return None
+
+
+def is_sharded() -> bool:
+    """True when circulation data is split across BRANCH_CONFIGS."""
+    return DB_BACKEND != "sqlite" and bool(BRANCH_CONFIGS)
+
+
+def current_branch():
+    """The branch selected on this thread, or DEFAULT_BRANCH."""
+    return getattr(_branch, "id", None) or DEFAULT_BRANCH
+
+
+@contextmanager
+def use_branch(branch_id):
+    """
+    Routes this thread's connections to one branch for the duration of the
+    block, so logic functions need no extra argument:
+
+        with use_branch("north"):
+            checkout_book(isbn, patron_id)
+    """
+    previous = getattr(_branch, "id", None)
+    _branch.id = branch_id
+    try:
+        yield
+    finally:
+        _branch.id = previous
+
+
+@contextmanager
+def use_pooled_connections():
+    """
+    Makes every connection opened on this thread come from the per-server
+    pools for the duration of the block, so logic functions called in a
+    loop reuse connections instead of opening one per call:
+
+        with use_pooled_connections():
+            for isbn, patron_id in scans:
+                checkout_book(isbn, patron_id)
+    """
+    previous = getattr(_pooling, "enabled", False)
+    _pooling.enabled = True
+    try:
+        yield
+    finally:
+        _pooling.enabled = previous
+
+
+def _pooled_here(pooled: bool) -> bool:
+    return pooled or getattr(_pooling, "enabled", False)
+
+
+def _config_for(branch_id=None):
+    """Connection config for a branch, or DB_CONFIG when not sharded. None if the branch is unknown."""
+    if not BRANCH_CONFIGS:
+        return DB_CONFIG
+    branch_id = branch_id or current_branch()
+    config = BRANCH_CONFIGS.get(branch_id)
+    if config is None:
+        log.error(f"No database configured for branch {branch_id!r}. Set OPENSHELF_BRANCH or use use_branch().")
+    return config
+
+
+def get_db_connection(branch_id=None, pooled: bool = False):
+    """
+    Attempts to establish a connection to the MySQL database 
+    and returns the connection object.
+    With BRANCH_CONFIGS set, connects to branch_id or the current branch.
+    """
+    if DB_BACKEND == "sqlite":
+        return connect_sqlite(SQLITE_PATH)
+    config = _config_for(branch_id)
+    if config is None:
         return None
+    return _connect(config, _pooled_here(pooled))
+
 
+def get_catalog_connection():
+    """Connection to the shared catalog. Same as get_db_connection() when not sharded."""
+    if DB_BACKEND == "sqlite":
+        return connect_sqlite(SQLITE_PATH)
+    return _connect(DB_CONFIG, _pooled_here(False))
+
+
+def get_db_health() -> dict:
+    """
+    Returns circuit breaker state for the primary, every replica and every
+    branch, e.g. {'primary': {'state': 'open', 'retry_in': 12.0, ...}, 'replicas': [...]}.
+    """
+    return {
+        'primary': _breaker_for(DB_CONFIG).snapshot(),
+        'replicas': [_breaker_for(config).snapshot() for config in REPLICA_CONFIGS],
+        'branches': {branch_id: _breaker_for(config).snapshot() for branch_id, config in BRANCH_CONFIGS.items()},
+    }
+
+
+def mark_write():
+    """
+    Records that the current thread just committed to the primary, so its
+    reads within READ_YOUR_WRITES_SECONDS are served from the primary.
+    """
+    _last_write.at = time.monotonic()
+
+
+def recently_wrote() -> bool:
+    """True if the current thread committed within READ_YOUR_WRITES_SECONDS."""
+    last = getattr(_last_write, "at", None)
+    return last is not None and time.monotonic() - last < READ_YOUR_WRITES_SECONDS
+
+
+def _replica_is_fresh(index: int, conn) -> bool:
+    """
+    Checks replication lag on an open replica connection. The result is
+    cached for REPLICA_LAG_CHECK_INTERVAL seconds to avoid an extra round
+    trip on every read.
+    """
+    now = time.monotonic()
+    cached = _replica_lag_cache.get(index)
+    if cached and now - cached[0] < REPLICA_LAG_CHECK_INTERVAL:
+        return cached[1]
+
+    healthy = True
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            # MySQL < 8.0.22 only knows the old statement name
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+        if status:
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            # NULL lag means the replication threads are stopped
+            healthy = lag is not None and lag <= MAX_REPLICA_LAG_SECONDS
+    except mysql.connector.Error as err:
+        # Missing REPLICATION CLIENT privilege: trust the replica
+        log.warning("Could not read replica status", extra={'error': err})
+    finally:
+        cursor.close()
+
+    _replica_lag_cache[index] = (now, healthy)
+    return healthy
+
+
+def get_read_connection(read_your_writes: bool = False, branch_id=None, pooled: bool = False):
+    """
+    Returns a connection for read-only queries.
+
+    Replicas are tried round-robin; a replica that is unreachable or lagging
+    more than MAX_REPLICA_LAG_SECONDS is skipped. Falls back to the primary
+    when no replica is usable, when read_your_writes is True, or when the
+    current thread committed within READ_YOUR_WRITES_SECONDS.
+    REPLICA_CONFIGS replicate DB_CONFIG, so branch reads go to the branch.
+    """
+    global _replica_cursor
+    pooled = _pooled_here(pooled)
+
+    if DB_BACKEND == "sqlite" or is_sharded():
+        return get_db_connection(branch_id, pooled)
+
+    if not REPLICA_CONFIGS or read_your_writes or recently_wrote():
+        return get_db_connection(pooled=pooled)
+
+    with _replica_lock:
+        start = _replica_cursor
+        _replica_cursor = (_replica_cursor + 1) % len(REPLICA_CONFIGS)
+
+    for offset in range(len(REPLICA_CONFIGS)):
+        index = (start + offset) % len(REPLICA_CONFIGS)
+        conn = _connect(REPLICA_CONFIGS[index], pooled)
+        if not conn:
+            continue
+        if _replica_is_fresh(index, conn):
+            return conn
+        log.info(f"Replica {index} is lagging. Trying the next one.")
+        conn.close()
+
+    return get_db_connection(pooled=pooled)
 
 if __name__ == "__main__":
     # 1. Attempt to connect
@@ -70,3 +391,12 @@ if __name__ == "__main__":
     else:
         print("\nFailed to connect. Cannot proceed with application logic.")
 
+    # 4. Check read routing (uses a replica when REPLICA_CONFIGS is set)
+    read_conn = get_read_connection()
+    if read_conn:
+        cursor = read_conn.cursor()
+        cursor.execute("SELECT @@hostname, @@port")
+        print(f"Read queries are served by: {cursor.fetchone()}")
+        cursor.close()
+        read_conn.close()
+
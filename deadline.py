@@ -0,0 +1,31 @@
+# deadline.py
+"""
+Per-call time budget shared across the steps of one operation.
+
+    budget = Deadline(8)
+    fetch(timeout=budget.remaining())
+    if budget.expired(): ...
+"""
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised by Deadline.check() when the budget is used up."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, step: str = ""):
+        """Raises DeadlineExceeded if no time is left before starting a step."""
+        if self.expired():
+            raise DeadlineExceeded(f"{self.seconds}s budget exceeded before {step or 'next step'}")
@@ -0,0 +1,306 @@
+# group_commit.py
+"""
+Group-commit circulation writer for busy self-check stations.
+
+checkout_book()/return_book() pay one commit (one fsync) per scan. A
+CirculationWriter collects scans from many threads for up to
+GROUP_COMMIT_WINDOW_MS and applies them together in one transaction:
+
+    writer = CirculationWriter()
+    writer.checkout(isbn, patron_id)       # blocks until its batch commits
+    writer.return_book(isbn, patron_id)
+    writer.close()
+
+Inside a batch the Book rows are locked once (in ISBN order) and each
+request is checked in arrival order against the running copy count, so a
+request is refused exactly when it would have been as a separate commit.
+New loans go in with one multi-row INSERT, returns close their loans with
+one UPDATE, and each ISBN's copy count is adjusted once by its net change.
+Every request still gets its own True/False.
+
+If a batch fails (e.g. an unknown patron trips a foreign key), it is rolled
+back and its requests are replayed one by one through loan_logic, so one
+bad scan never fails its neighbours.
+"""
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import mysql.connector
+from db_connector import current_branch, get_db_connection, mark_write, use_branch
+from loan_logic import (
+    BOOK_NOT_FOUND, FINE_RATE_PER_DAY, LOAN_PERIOD_DAYS, NO_ACTIVE_LOAN, OUT_OF_STOCK,
+    checkout_book, return_book,
+)
+from app_logging import get_logger, elapsed_ms
+
+log = get_logger(__name__)
+
+# How long the first request of a batch waits for others to join
+GROUP_COMMIT_WINDOW_MS = 5
+
+# Upper bound on requests per transaction (keeps lock hold times short)
+GROUP_COMMIT_MAX_BATCH = 200
+
+CHECKOUT = "checkout"
+RETURN = "return"
+
+CirculationRequest = namedtuple("CirculationRequest", ["action", "isbn", "patron_id", "result"])
+
+LOCK_BOOKS_SQL = """
+SELECT isbn, available_copies FROM Book
+WHERE isbn IN ({placeholders})
+ORDER BY isbn
+FOR UPDATE
+"""
+
+LOCK_OPEN_LOANS_SQL = """
+SELECT loan_id, isbn, patron_id, due_date FROM Loan
+WHERE (isbn, patron_id) IN ({pairs}) AND return_date IS NULL
+ORDER BY loan_id
+FOR UPDATE
+"""
+
+INSERT_LOANS_SQL = """
+INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+VALUES {rows}
+"""
+
+CLOSE_LOANS_SQL = """
+UPDATE Loan SET return_date = %s WHERE loan_id IN ({placeholders})
+"""
+
+INSERT_FINES_SQL = """
+INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date)
+VALUES {rows}
+"""
+
+ADJUST_AVAILABLE_SQL = """
+UPDATE Book SET available_copies = available_copies + CASE isbn {cases} END
+WHERE isbn IN ({placeholders})
+"""
+
+
+def _placeholders(count: int) -> str:
+    return ", ".join(["%s"] * count)
+
+
+class CirculationWriter:
+    """
+    Single writer thread that group-commits checkouts and returns.
+    Connections go to branch_id (default: the creating thread's branch).
+    """
+
+    def __init__(self, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = GROUP_COMMIT_MAX_BATCH, branch_id=None):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.branch_id = branch_id or current_branch()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def submit(self, action: str, isbn: str, patron_id: int) -> Future:
+        """Queues a checkout or return; the future resolves to True/False once its batch commits."""
+        if action not in (CHECKOUT, RETURN):
+            raise ValueError(f"unknown action {action!r}")
+        request = CirculationRequest(action, isbn, patron_id, Future())
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("CirculationWriter is closed")
+            self._queue.put(request)
+        return request.result
+
+    def checkout(self, isbn: str, patron_id: int) -> bool:
+        """Same result as loan_logic.checkout_book, committed with the rest of its batch."""
+        return self._wait(self.submit(CHECKOUT, isbn, patron_id))
+
+    def return_book(self, isbn: str, patron_id: int) -> bool:
+        """Same result as loan_logic.return_book, committed with the rest of its batch."""
+        return self._wait(self.submit(RETURN, isbn, patron_id))
+
+    def close(self):
+        """Applies everything already queued, then stops the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    @staticmethod
+    def _wait(result: Future) -> bool:
+        try:
+            success = result.result()
+        except Exception as err:
+            log.error("Group commit request failed", extra={'error': err})
+            return False
+        if success:
+            # The commit happened on the writer thread; route this caller's reads to the primary
+            mark_write()
+        return success
+
+    def _run(self):
+        carry = []
+        stopping = False
+        while carry or not stopping:
+            batch = carry
+            if not batch:
+                first = self._queue.get()
+                if first is None:
+                    break
+                batch = [first]
+
+            deadline = time.monotonic() + self.window
+            while not stopping and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                else:
+                    batch.append(request)
+
+            try:
+                carry = self._apply(batch)
+            except Exception as err:
+                # Fail this batch's callers (False, like any failed checkout/return)
+                # but keep the writer alive for everyone else
+                log.error("Group commit crashed; failing its pending requests",
+                          extra={'count': len(batch), 'error': err})
+                for request in batch:
+                    if not request.result.done():
+                        request.result.set_result(False)
+                carry = []
+
+    def _apply(self, batch) -> list:
+        """
+        Applies one batch in one transaction and resolves its futures.
+        Returns the requests deferred to the next batch: returns of a loan
+        opened earlier in the same batch, which has no loan_id yet.
+        """
+        started = time.perf_counter()
+        conn = get_db_connection(self.branch_id)
+        if not conn:
+            for request in batch:
+                request.result.set_result(False)
+            return []
+
+        cursor = conn.cursor()
+        today = datetime.now().date()
+        outcomes, deferred = [], []
+
+        try:
+            conn.start_transaction()
+
+            isbns = sorted({request.isbn for request in batch})
+            cursor.execute(LOCK_BOOKS_SQL.format(placeholders=_placeholders(len(isbns))), isbns)
+            available = dict(cursor.fetchall())
+
+            open_loans = {}
+            pairs = sorted({(r.isbn, r.patron_id) for r in batch if r.action == RETURN})
+            if pairs:
+                cursor.execute(
+                    LOCK_OPEN_LOANS_SQL.format(pairs=", ".join(["(%s, %s)"] * len(pairs))),
+                    [value for pair in pairs for value in pair]
+                )
+                for loan_id, isbn, patron_id, due_date in cursor.fetchall():
+                    open_loans.setdefault((isbn, patron_id), []).append((loan_id, due_date))
+
+            new_loans, closed_loans, fines = [], [], []
+            net_change = Counter()
+            opened_here = set()
+
+            for request in batch:
+                key = (request.isbn, request.patron_id)
+                reason = None
+                if request.action == CHECKOUT:
+                    if request.isbn not in available:
+                        reason = BOOK_NOT_FOUND
+                    elif available[request.isbn] <= 0:
+                        reason = OUT_OF_STOCK
+                    else:
+                        available[request.isbn] -= 1
+                        net_change[request.isbn] -= 1
+                        new_loans.append((request.isbn, request.patron_id, today,
+                                          today + timedelta(days=LOAN_PERIOD_DAYS)))
+                        opened_here.add(key)
+                elif open_loans.get(key):
+                    loan_id, due_date = open_loans[key].pop(0)
+                    closed_loans.append(loan_id)
+                    available[request.isbn] += 1
+                    net_change[request.isbn] += 1
+                    days_late = (today - due_date).days
+                    if days_late > 0:
+                        fines.append((loan_id, days_late * FINE_RATE_PER_DAY, today))
+                elif key in opened_here:
+                    deferred.append(request)
+                    continue
+                else:
+                    reason = NO_ACTIVE_LOAN
+                outcomes.append((request, reason))
+
+            if new_loans:
+                cursor.execute(INSERT_LOANS_SQL.format(rows=", ".join(["(%s, %s, %s, %s, NULL)"] * len(new_loans))),
+                               [value for row in new_loans for value in row])
+            if closed_loans:
+                cursor.execute(CLOSE_LOANS_SQL.format(placeholders=_placeholders(len(closed_loans))),
+                               [today, *closed_loans])
+            if fines:
+                cursor.execute(INSERT_FINES_SQL.format(rows=", ".join(["(%s, %s, %s, NULL)"] * len(fines))),
+                               [value for row in fines for value in row])
+
+            changes = [(isbn, delta) for isbn, delta in sorted(net_change.items()) if delta]
+            if changes:
+                cursor.execute(
+                    ADJUST_AVAILABLE_SQL.format(cases=" ".join(["WHEN %s THEN %s"] * len(changes)),
+                                                placeholders=_placeholders(len(changes))),
+                    [value for change in changes for value in change] + [isbn for isbn, _ in changes]
+                )
+
+            conn.commit()
+
+        except mysql.connector.Error as err:
+            log.warning("Group commit failed; replaying its requests one by one",
+                        extra={'count': len(batch), 'error': err})
+            conn.rollback()
+            outcomes = None
+
+        finally:
+            cursor.close()
+            conn.close()
+
+        if outcomes is None:
+            self._apply_individually(batch)
+            return []
+
+        for request, reason in outcomes:
+            if reason:
+                log.info(f"{request.action.capitalize()} failed: {reason}",
+                         extra={'isbn': request.isbn, 'patron_id': request.patron_id})
+            request.result.set_result(reason is None)
+        log.info(f"Group commit applied {len(outcomes)} requests",
+                 extra={'count': len(outcomes), 'duration_ms': elapsed_ms(started)})
+        return deferred
+
+    def _apply_individually(self, batch):
+        with use_branch(self.branch_id):
+            for request in batch:
+                apply = checkout_book if request.action == CHECKOUT else return_book
+                request.result.set_result(apply(request.isbn, request.patron_id))
@@ -0,0 +1,221 @@
+# inventory_audit.py
+"""
+Inventory consistency auditor.
+
+Checks available_copies == total_copies - open loans for every book and
+writes a repair script for the ones that drifted (a partially failed
+transaction, a hand edit, ...). Nothing is changed by the audit itself.
+
+Books are read in keyset chunks of AUDIT_CHUNK_BOOKS. Each chunk is two
+plain SELECTs in one read-only consistent snapshot, so no rows are locked
+and a checkout running at the same time is never reported as drift. Open
+loans are counted through idx_loan_open_isbn (migration 11), which only
+touches open loans, not the whole loan history.
+
+Incremental mode rechecks only ISBNs with a loan opened or closed since
+the last run. Direct edits of Book are not seen by it; run a full audit
+regularly as well.
+
+    python inventory_audit.py                  # full audit
+    python inventory_audit.py --incremental    # ISBNs touched since the last run
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import mysql.connector
+from db_connector import get_read_connection
+from app_logging import get_logger, elapsed_ms
+
+log = get_logger(__name__)
+
+AUDIT_STATE_FILE = "inventory_audit_state.json"
+AUDIT_CHUNK_BOOKS = 5000
+
+NEXT_BOOKS_SQL = """
+SELECT isbn, total_copies, available_copies
+FROM Book
+WHERE isbn > %s
+ORDER BY isbn
+LIMIT %s
+"""
+
+OPEN_LOANS_RANGE_SQL = """
+SELECT isbn, COUNT(*)
+FROM Loan
+WHERE return_date IS NULL AND isbn BETWEEN %s AND %s
+GROUP BY isbn
+"""
+
+LAST_LOAN_ID_SQL = "SELECT IFNULL(MAX(loan_id), 0) FROM Loan"
+
+# Kiosk scans carry their (earlier) scan date, so the time they were synced
+# comes from Kiosk_Applied
+TOUCHED_ISBNS_SQL = """
+SELECT isbn FROM Loan WHERE loan_id > %s
+UNION
+SELECT isbn FROM Loan WHERE return_date >= %s
+UNION
+SELECT isbn FROM Kiosk_Applied WHERE applied_at >= %s AND isbn IS NOT NULL
+"""
+
+REPAIR_SQL = (
+    "UPDATE Book SET available_copies = total_copies - "
+    "(SELECT COUNT(*) FROM Loan WHERE Loan.isbn = Book.isbn AND Loan.return_date IS NULL) "
+    "WHERE isbn = '{isbn}';"
+)
+
+
+def load_state(path: str = AUDIT_STATE_FILE) -> dict:
+    """Returns the last audit watermark, or None if no audit has run yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state: dict, path: str = AUDIT_STATE_FILE):
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def _find_drift(books, open_counts) -> list:
+    drift = []
+    for isbn, total, available in books:
+        open_loans = open_counts.get(isbn, 0)
+        if available != total - open_loans:
+            drift.append({
+                'isbn': isbn,
+                'total_copies': total,
+                'available_copies': available,
+                'open_loans': open_loans,
+                'expected': total - open_loans,
+            })
+    return drift
+
+
+def _audit_books(cursor, books) -> list:
+    """Counts open loans for a sorted list of book rows and returns the drifted ones."""
+    cursor.execute(OPEN_LOANS_RANGE_SQL, (books[0][0], books[-1][0]))
+    return _find_drift(books, dict(cursor.fetchall()))
+
+
+def _audit_all(conn, cursor, chunk_size):
+    last_isbn = ""
+    while True:
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            cursor.execute(NEXT_BOOKS_SQL, (last_isbn, chunk_size))
+            books = cursor.fetchall()
+            if not books:
+                return
+            yield len(books), _audit_books(cursor, books)
+        finally:
+            conn.rollback()
+        last_isbn = books[-1][0]
+
+
+def _audit_isbns(conn, cursor, isbns, chunk_size):
+    for start in range(0, len(isbns), chunk_size):
+        chunk = isbns[start:start + chunk_size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            cursor.execute(
+                f"SELECT isbn, total_copies, available_copies FROM Book WHERE isbn IN ({placeholders}) ORDER BY isbn",
+                chunk
+            )
+            books = cursor.fetchall()
+            if books:
+                yield len(books), _audit_books(cursor, books)
+        finally:
+            conn.rollback()
+
+
+def write_repair_script(drift: list, path: str) -> str:
+    """
+    Writes one UPDATE per drifted book. Each UPDATE recomputes the count
+    when it runs, so the script stays correct if loans change meanwhile.
+    Books with more open loans than copies are left commented out for review.
+    """
+    with open(path, "w") as f:
+        f.write(f"-- Inventory repair generated {datetime.now():%Y-%m-%d %H:%M:%S} by inventory_audit.py\n")
+        f.write(f"-- {len(drift)} book(s) drifted.\n")
+        f.write("START TRANSACTION;\n")
+        for row in drift:
+            f.write(f"-- {row['isbn']}: available {row['available_copies']}, expected {row['expected']} "
+                    f"(total {row['total_copies']}, open loans {row['open_loans']})\n")
+            statement = REPAIR_SQL.format(isbn=row['isbn'].replace("'", "''"))
+            if row['expected'] < 0:
+                f.write("-- REVIEW: more open loans than copies; check total_copies first\n")
+                statement = "-- " + statement
+            f.write(statement + "\n")
+        f.write("COMMIT;\n")
+    return path
+
+
+def audit_inventory(incremental: bool = False, chunk_size: int = AUDIT_CHUNK_BOOKS,
+                    state_path: str = AUDIT_STATE_FILE, repair_path: str = None):
+    """
+    Audits all books, or only those touched since the last run when
+    incremental is True (falls back to a full audit on the first run).
+    Writes a repair script when drift is found.
+
+    Returns:
+        (drifted rows, repair script path or None), or (None, None) on a database error.
+    """
+    started = time.perf_counter()
+    state = load_state(state_path) if incremental else None
+
+    conn = get_read_connection()
+    if not conn:
+        return None, None
+
+    cursor = conn.cursor()
+    drift, checked = [], 0
+
+    try:
+        # Watermark taken before the audit, so loans made during it are rechecked next time
+        run_started = datetime.now()
+        cursor.execute(LAST_LOAN_ID_SQL)
+        last_loan_id = cursor.fetchone()[0]
+        conn.rollback()
+
+        if state:
+            cursor.execute(TOUCHED_ISBNS_SQL, (state['last_loan_id'], state['audited_on'], state['audited_on']))
+            isbns = sorted(row[0] for row in cursor.fetchall())
+            conn.rollback()
+            passes = _audit_isbns(conn, cursor, isbns, chunk_size)
+        else:
+            passes = _audit_all(conn, cursor, chunk_size)
+
+        for count, chunk_drift in passes:
+            checked += count
+            drift.extend(chunk_drift)
+
+        save_state({'last_loan_id': last_loan_id, 'audited_on': run_started.date().isoformat()}, state_path)
+
+    except mysql.connector.Error as err:
+        log.error("Database error during inventory audit", extra={'count': checked, 'error': err})
+        return None, None
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    script = None
+    if drift:
+        script = write_repair_script(drift, repair_path or f"inventory_repair_{run_started:%Y%m%d%H%M%S}.sql")
+        log.warning(f"{len(drift)} of {checked} books drifted; repair script written to {script}",
+                    extra={'count': len(drift), 'duration_ms': elapsed_ms(started)})
+    else:
+        log.info(f"Inventory consistent: {checked} books checked", extra={'count': checked, 'duration_ms': elapsed_ms(started)})
+    return drift, script
+
+
+if __name__ == "__main__":
+    drifted, _ = audit_inventory(incremental="--incremental" in sys.argv)
+    sys.exit(1 if drifted is None else 0)
@@ -0,0 +1,368 @@
+# kiosk.py
+"""
+Offline-first self-check kiosk.
+
+Scans never wait on the central database. kiosk_checkout()/kiosk_return()
+answer from a local availability snapshot and append the scan to a durable
+SQLite journal on the kiosk. sync_journal() replays pending scans upstream
+in batches, one transaction per KIOSK_SYNC_BATCH scans, using the same
+steps as loan_logic (so due dates and fines use the scan date, not the
+sync date).
+
+Exactly-once: every replayed entry is recorded in Kiosk_Applied (migration
+10) inside the same upstream transaction, so a crash between the upstream
+commit and the local status update never applies a scan twice. The outcome
+(applied or conflict, with the reason) and the loan it touched are recorded
+there too, so a re-sync after such a crash still reports the conflict, and
+incremental consumers (analytics_export, inventory_audit) can find scans
+synced after their last run even though they carry the earlier scan date.
+Entries are
+keyed on the kiosk and a random id stored in the journal when it is
+created, because entry ids restart at 1 when the journal file is replaced.
+
+Conflicts: a checkout whose copies ran out upstream (another desk took the
+last one while the kiosk was offline), or a return with no open loan, is
+marked 'conflict' with the reason and left for staff (list_conflicts()).
+Nothing is written upstream for a conflicting scan.
+
+    python kiosk.py checkout <isbn> <patron_id>
+    python kiosk.py return <isbn> <patron_id>
+    python kiosk.py --sync          # replay pending scans, then refresh the snapshot
+    python kiosk.py --conflicts     # scans that need staff attention
+"""
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+import mysql.connector
+from db_connector import get_db_connection, get_read_connection, mark_write
+from loan_logic import _apply_checkout, _apply_return
+from app_logging import get_logger, elapsed_ms
+
+log = get_logger(__name__)
+
+KIOSK_ID = os.environ.get("OPENSHELF_KIOSK_ID", socket.gethostname())
+KIOSK_JOURNAL_PATH = os.environ.get("OPENSHELF_KIOSK_JOURNAL", "kiosk_journal.db")
+
+# Scans replayed per upstream transaction
+KIOSK_SYNC_BATCH = 50
+
+# Background sync period when start_background_sync() is used
+KIOSK_SYNC_INTERVAL_SECONDS = 30
+
+CHECKOUT = "checkout"
+RETURN = "return"
+
+PENDING = "pending"
+APPLIED = "applied"
+CONFLICT = "conflict"
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Journal (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    isbn TEXT NOT NULL,
+    patron_id INTEGER NOT NULL,
+    scanned_on DATE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    detail TEXT,
+    synced_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_journal_status ON Journal (status, entry_id);
+CREATE TABLE IF NOT EXISTS Journal_Meta (
+    journal_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Availability (
+    isbn TEXT PRIMARY KEY,
+    title TEXT,
+    available_copies INTEGER NOT NULL,
+    refreshed_at DATETIME NOT NULL
+);
+"""
+
+# Snapshot count adjusted for scans not yet replayed upstream
+LOCAL_AVAILABLE_SQL = """
+SELECT A.available_copies
+       - (SELECT COUNT(*) FROM Journal J WHERE J.isbn = A.isbn AND J.status = 'pending' AND J.action = 'checkout')
+       + (SELECT COUNT(*) FROM Journal J WHERE J.isbn = A.isbn AND J.status = 'pending' AND J.action = 'return')
+FROM Availability A
+WHERE A.isbn = ?
+"""
+
+SNAPSHOT_SQL = "SELECT isbn, title, available_copies FROM Book"
+
+MARK_APPLIED_SQL = """
+INSERT IGNORE INTO Kiosk_Applied (kiosk_id, entry_id, applied_at, isbn)
+VALUES (%s, %s, NOW(), %s)
+"""
+
+RECORD_OUTCOME_SQL = """
+UPDATE Kiosk_Applied SET status = %s, detail = %s, loan_id = %s
+WHERE kiosk_id = %s AND entry_id = %s
+"""
+
+APPLIED_OUTCOME_SQL = "SELECT status, detail FROM Kiosk_Applied WHERE kiosk_id = %s AND entry_id = %s"
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _journal():
+    """Opens the local journal, creating it on first use. Durable on commit (synchronous=FULL)."""
+    global _schema_ready
+    conn = sqlite3.connect(KIOSK_JOURNAL_PATH, timeout=5, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("PRAGMA synchronous=FULL")
+    with _schema_lock:
+        if not _schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(JOURNAL_SCHEMA)
+            if conn.execute("SELECT 1 FROM Journal_Meta").fetchone() is None:
+                # A journal written before journal ids existed keeps the bare kiosk id,
+                # so its entries already recorded upstream still match
+                legacy = conn.execute("SELECT 1 FROM Journal LIMIT 1").fetchone() is not None
+                conn.execute("INSERT INTO Journal_Meta (journal_id) VALUES (?)",
+                             ("" if legacy else uuid.uuid4().hex[:12],))
+                conn.commit()
+            _schema_ready = True
+    return conn
+
+
+def _applied_key(journal) -> str:
+    """Kiosk_Applied.kiosk_id for this journal's entries (fits VARCHAR(64))."""
+    journal_id = journal.execute("SELECT journal_id FROM Journal_Meta").fetchone()[0]
+    return f"{KIOSK_ID[:51]}:{journal_id}" if journal_id else KIOSK_ID
+
+
+def _record_scan(action: str, isbn: str, patron_id: int) -> bool:
+    conn = _journal()
+    try:
+        # BEGIN IMMEDIATE so two scans of the last copy cannot both pass the check
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(LOCAL_AVAILABLE_SQL, (isbn,)).fetchone()
+        if row is None:
+            log.info(f"Kiosk {action} refused: book not in local snapshot", extra={'isbn': isbn, 'patron_id': patron_id})
+            conn.rollback()
+            return False
+        if action == CHECKOUT and row[0] <= 0:
+            log.info("Kiosk checkout refused: no copies available locally", extra={'isbn': isbn, 'patron_id': patron_id})
+            conn.rollback()
+            return False
+
+        conn.execute(
+            "INSERT INTO Journal (action, isbn, patron_id, scanned_on) VALUES (?, ?, ?, ?)",
+            (action, isbn, patron_id, date.today().isoformat())
+        )
+        conn.commit()
+        log.info(f"Kiosk {action} recorded", extra={'isbn': isbn, 'patron_id': patron_id})
+        return True
+
+    except sqlite3.Error as err:
+        log.error("Kiosk journal error", extra={'isbn': isbn, 'patron_id': patron_id, 'error': err})
+        conn.rollback()
+        return False
+
+    finally:
+        conn.close()
+
+
+def kiosk_checkout(isbn: str, patron_id: int) -> bool:
+    """Records a checkout locally if the snapshot shows a free copy. Never contacts the central database."""
+    return _record_scan(CHECKOUT, isbn, patron_id)
+
+
+def kiosk_return(isbn: str, patron_id: int) -> bool:
+    """Records a return locally. Never contacts the central database."""
+    return _record_scan(RETURN, isbn, patron_id)
+
+
+def _replay_batch(entries, applied_key: str) -> list:
+    """
+    Applies one batch upstream in a single transaction, recording each entry
+    in Kiosk_Applied under applied_key.
+    Returns [(entry_id, status, detail)], or None if the batch was not applied.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cursor = conn.cursor()
+    results = None
+
+    try:
+        conn.start_transaction()
+        results = []
+        for entry_id, action, isbn, patron_id, scanned_on in entries:
+            cursor.execute(MARK_APPLIED_SQL, (applied_key, entry_id, isbn))
+            if cursor.rowcount == 0:
+                # Replayed before, but the local journal was not updated (crash)
+                cursor.execute(APPLIED_OUTCOME_SQL, (applied_key, entry_id))
+                status, detail = cursor.fetchone()
+                results.append((entry_id, status, detail if status == CONFLICT else "already applied"))
+                continue
+
+            # A failing statement (e.g. unknown patron) must not leave the copy count changed
+            cursor.execute("SAVEPOINT kiosk_entry")
+            loan_id = None
+            try:
+                if action == CHECKOUT:
+                    _, reason = _apply_checkout(cursor, isbn, patron_id, scanned_on)
+                    if not reason:
+                        loan_id = cursor.lastrowid
+                else:
+                    loan_id, _, reason = _apply_return(cursor, isbn, patron_id, scanned_on)
+            except mysql.connector.IntegrityError as err:
+                cursor.execute("ROLLBACK TO SAVEPOINT kiosk_entry")
+                reason = str(err)
+            status = CONFLICT if reason else APPLIED
+            cursor.execute(RECORD_OUTCOME_SQL, (status, reason[:255] if reason else None, loan_id,
+                                                applied_key, entry_id))
+            results.append((entry_id, status, reason))
+
+        conn.commit()
+        mark_write()
+
+    except mysql.connector.Error as err:
+        log.error("Database error replaying kiosk journal", extra={'count': len(entries), 'error': err})
+        conn.rollback()
+        results = None
+
+    finally:
+        cursor.close()
+        conn.close()
+        return results
+
+
+def sync_journal(batch_size: int = KIOSK_SYNC_BATCH) -> dict:
+    """
+    Replays pending scans upstream in batches, oldest first. Stops at the
+    first batch that cannot be applied (e.g. database unreachable); those
+    scans stay pending for the next run.
+
+    Returns:
+        {'applied': n, 'conflicts': n, 'pending': n}
+    """
+    started = time.perf_counter()
+    journal = _journal()
+    counts = {APPLIED: 0, 'conflicts': 0, PENDING: 0}
+
+    try:
+        applied_key = _applied_key(journal)
+        pending = journal.execute(
+            "SELECT entry_id, action, isbn, patron_id, scanned_on FROM Journal WHERE status = 'pending' ORDER BY entry_id"
+        ).fetchall()
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            results = _replay_batch(batch, applied_key)
+            if results is None:
+                counts[PENDING] = len(pending) - start
+                break
+
+            journal.executemany(
+                "UPDATE Journal SET status = ?, detail = ?, synced_at = ? WHERE entry_id = ?",
+                [(status, detail, datetime.now(), entry_id) for entry_id, status, detail in results]
+            )
+            journal.commit()
+            scans = {entry[0]: entry for entry in batch}
+            for entry_id, status, detail in results:
+                if status == CONFLICT:
+                    counts['conflicts'] += 1
+                    _, action, isbn, patron_id, _ = scans[entry_id]
+                    log.warning(f"Kiosk {action} #{entry_id} conflicts upstream: {detail}",
+                                extra={'isbn': isbn, 'patron_id': patron_id})
+                else:
+                    counts[APPLIED] += 1
+
+    finally:
+        journal.close()
+
+    log.info(f"Kiosk journal sync: {counts[APPLIED]} applied, {counts['conflicts']} conflicts, {counts[PENDING]} pending",
+             extra={'duration_ms': elapsed_ms(started)})
+    return counts
+
+
+def refresh_snapshot() -> bool:
+    """Replaces the local availability snapshot with the current upstream counts."""
+    conn = get_read_connection()
+    if not conn:
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SNAPSHOT_SQL)
+        books = cursor.fetchall()
+    except mysql.connector.Error as err:
+        log.error("Database error refreshing kiosk snapshot", extra={'error': err})
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+    journal = _journal()
+    try:
+        refreshed_at = datetime.now()
+        journal.execute("BEGIN IMMEDIATE")
+        journal.execute("DELETE FROM Availability")
+        journal.executemany(
+            "INSERT INTO Availability (isbn, title, available_copies, refreshed_at) VALUES (?, ?, ?, ?)",
+            [(isbn, title, available, refreshed_at) for isbn, title, available in books]
+        )
+        journal.commit()
+        log.info("Kiosk snapshot refreshed", extra={'count': len(books)})
+        return True
+    except sqlite3.Error as err:
+        log.error("Kiosk journal error refreshing snapshot", extra={'error': err})
+        journal.rollback()
+        return False
+    finally:
+        journal.close()
+
+
+def list_conflicts() -> list:
+    """Scans that could not be applied upstream, newest first, for staff follow-up."""
+    journal = _journal()
+    journal.row_factory = sqlite3.Row
+    try:
+        rows = journal.execute(
+            "SELECT entry_id, action, isbn, patron_id, scanned_on, detail, synced_at "
+            "FROM Journal WHERE status = 'conflict' ORDER BY entry_id DESC"
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        journal.close()
+
+
+def start_background_sync(interval: float = KIOSK_SYNC_INTERVAL_SECONDS) -> threading.Event:
+    """
+    Runs sync_journal() and refresh_snapshot() every interval seconds on a
+    daemon thread. Set the returned event to stop it.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            sync_journal()
+            refresh_snapshot()
+
+    threading.Thread(target=loop, name="kiosk-sync", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    if "--sync" in sys.argv:
+        result = sync_journal()
+        refresh_snapshot()
+        sys.exit(0 if result[PENDING] == 0 else 1)
+    elif "--conflicts" in sys.argv:
+        for conflict in list_conflicts():
+            print(conflict)
+    elif len(sys.argv) == 4 and sys.argv[1] in (CHECKOUT, RETURN):
+        scan = kiosk_checkout if sys.argv[1] == CHECKOUT else kiosk_return
+        sys.exit(0 if scan(sys.argv[2], int(sys.argv[3])) else 1)
+    else:
+        print(__doc__)
@@ -0,0 +1,104 @@
+# loan_archive.py
+"""
+Moves closed loans older than a horizon (and their paid fines) out of the
+hot Loan/Fine tables into Loan_Archive/Fine_Archive, in small batches so
+the online tables are never locked for long.
+
+Loans with an unpaid fine stay in Loan so V_OUTSTANDING_FINES is unchanged.
+Reports that need the full history use V_LOAN_HISTORY_ALL or
+V_PATRON_HISTORY_ALL (created by schema_migrations.py, version 8).
+
+    python loan_archive.py [horizon_days]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+from db_connector import get_db_connection
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Closed loans returned more than this many days ago are archived
+ARCHIVE_HORIZON_DAYS = 365
+
+# Loans moved per transaction; keeps row locks and undo small
+ARCHIVE_BATCH_SIZE = 1000
+
+# Pause between batches so replicas and checkout traffic keep up
+ARCHIVE_BATCH_PAUSE_SECONDS = 0.05
+
+# Keyset walk over closed loans, skipping any with an unpaid fine
+NEXT_BATCH_SQL = """
+SELECT L.loan_id FROM Loan L
+WHERE L.loan_id > %s
+  AND L.return_date IS NOT NULL AND L.return_date < %s
+  AND NOT EXISTS (
+      SELECT 1 FROM Fine F WHERE F.loan_id = L.loan_id AND F.payment_date IS NULL
+  )
+ORDER BY L.loan_id
+LIMIT %s
+"""
+
+
+def _archive_batch(cursor, loan_ids) -> int:
+    """Copies one batch into the archive tables and deletes it from the hot ones."""
+    placeholders = ", ".join(["%s"] * len(loan_ids))
+    cursor.execute(f"INSERT INTO Loan_Archive SELECT * FROM Loan WHERE loan_id IN ({placeholders})", loan_ids)
+    moved = cursor.rowcount
+    cursor.execute(f"INSERT INTO Fine_Archive SELECT * FROM Fine WHERE loan_id IN ({placeholders})", loan_ids)
+    cursor.execute(f"DELETE FROM Fine WHERE loan_id IN ({placeholders})", loan_ids)
+    cursor.execute(f"DELETE FROM Loan WHERE loan_id IN ({placeholders})", loan_ids)
+    return moved
+
+
+def archive_closed_loans(horizon_days: int = ARCHIVE_HORIZON_DAYS,
+                         batch_size: int = ARCHIVE_BATCH_SIZE,
+                         max_batches: int = None) -> int:
+    """
+    Archives closed loans returned before today - horizon_days.
+    Each batch is its own transaction; a failed batch is rolled back and
+    the run stops. Returns the number of loans archived.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return 0
+
+    cursor = conn.cursor()
+    cutoff = datetime.now().date() - timedelta(days=horizon_days)
+    last_id = 0
+    total = 0
+    batches = 0
+
+    try:
+        while max_batches is None or batches < max_batches:
+            conn.start_transaction()
+            cursor.execute(NEXT_BATCH_SQL, (last_id, cutoff, batch_size))
+            loan_ids = [row[0] for row in cursor.fetchall()]
+            if not loan_ids:
+                conn.rollback()
+                break
+
+            total += _archive_batch(cursor, loan_ids)
+            conn.commit()
+
+            last_id = loan_ids[-1]
+            batches += 1
+            time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+
+        log.info(f"Archived loans returned before {cutoff} in {batches} batches", extra={'count': total})
+
+    except mysql.connector.Error as err:
+        log.error("Database error during loan archival", extra={'count': total, 'error': err})
+        conn.rollback()
+
+    finally:
+        cursor.close()
+        conn.close()
+        return total
+
+
+if __name__ == "__main__":
+    horizon = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_HORIZON_DAYS
+    archive_closed_loans(horizon)
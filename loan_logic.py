@@ -1,16 +1,164 @@
 # loan_logic.py
 from datetime import datetime, timedelta
+import time
 import mysql.connector
-from db_connector import get_db_connection
+from db_connector import get_db_connection, get_read_connection, mark_write
+from unit_of_work import UnitOfWork, session_for
+import procedures
+from procedures import call_procedure, procedures_enabled
+from row_types import ActiveLoan, make_rows
+from app_logging import get_logger, elapsed_ms
+
+log = get_logger(__name__)
 
 # Define the standard loan period (e.g., 14 days)
 LOAN_PERIOD_DAYS = 14 
 
-def checkout_book(isbn: str, patron_id: int) -> bool:
+# --- SQL Statements ---
+
+CHECK_BOOK_SQL = """
+SELECT available_copies, total_copies FROM Book WHERE isbn = %s FOR UPDATE
+"""
+
+SET_AVAILABLE_SQL = """
+UPDATE Book SET available_copies = %s WHERE isbn = %s
+"""
+
+INSERT_LOAN_SQL = """
+INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+VALUES (%s, %s, %s, %s, NULL)
+"""
+
+FIND_ACTIVE_LOAN_SQL = """
+SELECT loan_id, due_date FROM Loan 
+WHERE isbn = %s AND patron_id = %s AND return_date IS NULL 
+LIMIT 1 FOR UPDATE
+"""
+
+INSERT_FINE_SQL = """
+INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date)
+VALUES (%s, %s, %s, NULL)
+"""
+
+CLOSE_LOAN_SQL = """
+UPDATE Loan SET return_date = %s WHERE loan_id = %s
+"""
+
+INCREMENT_AVAILABLE_SQL = """
+UPDATE Book SET available_copies = available_copies + 1 WHERE isbn = %s
+"""
+
+ACTIVE_LOANS_SQL = """
+SELECT L.isbn, B.title
+FROM Loan L
+JOIN Book B ON L.isbn = B.isbn
+WHERE L.patron_id = %s AND L.return_date IS NULL
+"""
+
+
+# Reasons returned by the _apply_* helpers when a step cannot be done
+BOOK_NOT_FOUND = "book not found"
+OUT_OF_STOCK = "out of stock"
+NO_ACTIVE_LOAN = "no active loan"
+
+FINE_RATE_PER_DAY = 0.25 # Define the fine rate
+
+
+def _run_steps(cursor, steps):
     """
-    Handles the process of lending a book to a patron. 
-    Requires a transactional update to both Book and Loan tables.
+    Runs a *_steps generator on a cursor: executes each (sql, params) it
+    yields and sends back the first row of a SELECT, or the lastrowid of
+    any other statement. Returns the generator's result. async_logic.py drives the same
+    generators on aiomysql cursors.
     """
+    row = None
+    try:
+        while True:
+            sql, params = steps.send(row)
+            cursor.execute(sql, params)
+            row = cursor.fetchone() if cursor.description else cursor.lastrowid
+    except StopIteration as done:
+        return done.value
+
+
+def _checkout_steps(isbn: str, patron_id: int, checkout_date):
+    """Statements and decisions of _apply_checkout, see _run_steps."""
+    # 1. Verify Book Availability (SELECT FOR UPDATE locks the row)
+    # This prevents two users from checking out the last copy simultaneously.
+    book_data = yield CHECK_BOOK_SQL, (isbn,)
+
+    if not book_data:
+        return None, BOOK_NOT_FOUND
+
+    available, total = book_data
+    
+    if available <= 0:
+        return None, OUT_OF_STOCK
+
+    # 2. Decrement available_copies
+    new_available = available - 1
+    yield SET_AVAILABLE_SQL, (new_available, isbn)
+    
+    # 3. Create the Loan Record
+    due_date = checkout_date + timedelta(days=LOAN_PERIOD_DAYS)
+    yield INSERT_LOAN_SQL, (isbn, patron_id, checkout_date, due_date)
+    return due_date, None
+
+
+def _return_steps(isbn: str, patron_id: int, return_date):
+    """Statements and decisions of _apply_return, see _run_steps."""
+    # 1. Find the active loan and its due_date (return_date IS NULL)
+    loan_record = yield FIND_ACTIVE_LOAN_SQL, (isbn, patron_id)
+    
+    if not loan_record:
+        return None, 0, NO_ACTIVE_LOAN
+    
+    loan_id, due_date = loan_record
+    
+    # --- FINE CALCULATION LOGIC ---
+    days_late = (return_date - due_date).days
+    fine_amount = 0
+    
+    if days_late > 0:
+        fine_amount = days_late * FINE_RATE_PER_DAY
+        # 2. Insert Fine Record
+        yield INSERT_FINE_SQL, (loan_id, fine_amount, return_date)
+
+    # 3. Update the Loan record with the return date (Always happens)
+    yield CLOSE_LOAN_SQL, (return_date, loan_id)
+
+    # 4. Increment available_copies in the Book table (Always happens)
+    yield INCREMENT_AVAILABLE_SQL, (isbn,)
+    return loan_id, fine_amount, None
+
+
+def _apply_checkout(cursor, isbn: str, patron_id: int, checkout_date):
+    """
+    Checkout steps on an open transaction. Nothing is written when the
+    checkout is refused. Returns (due_date, None) or (None, reason).
+    cursor.lastrowid is the new loan_id afterwards.
+    """
+    return _run_steps(cursor, _checkout_steps(isbn, patron_id, checkout_date))
+
+
+def _apply_return(cursor, isbn: str, patron_id: int, return_date):
+    """
+    Return steps on an open transaction, including the overdue fine.
+    Returns (loan_id, fine_amount, None) or (None, 0, reason).
+    """
+    return _run_steps(cursor, _return_steps(isbn, patron_id, return_date))
+
+
+# Procedure status codes mapped to the reasons of the client path
+PROCEDURE_REASONS = {
+    procedures.BOOK_NOT_FOUND: BOOK_NOT_FOUND,
+    procedures.OUT_OF_STOCK: OUT_OF_STOCK,
+    procedures.NO_ACTIVE_LOAN: NO_ACTIVE_LOAN,
+}
+
+
+def _checkout_by_procedure(isbn: str, patron_id: int, started: float) -> bool:
+    """checkout_book as a single sp_checkout_book call (see procedures.py)."""
     conn = get_db_connection()
     if not conn:
         return False
@@ -19,54 +167,19 @@ def checkout_book(isbn: str, patron_id: int) -> bool:
     success = False
 
     try:
-        # Start the transaction
-        conn.start_transaction() 
-        
-        # 1. Verify Book Availability (SELECT FOR UPDATE locks the row)
-        # This prevents two users from checking out the last copy simultaneously.
-        check_book_sql = """
-        SELECT available_copies, total_copies FROM Book WHERE isbn = %s FOR UPDATE
-        """
-        cursor.execute(check_book_sql, (isbn,))
-        book_data = cursor.fetchone()
-
-        if not book_data:
-            print(f"FAILURE: Book with ISBN {isbn} not found.")
-            conn.rollback()
-            return False
-
-        available, total = book_data
-        
-        if available <= 0:
-            print(f"FAILURE: Book {isbn} is currently out of stock (0 copies available).")
-            conn.rollback()
-            return False
-
-        # 2. Decrement available_copies
-        new_available = available - 1
-        update_book_sql = """
-        UPDATE Book SET available_copies = %s WHERE isbn = %s
-        """
-        cursor.execute(update_book_sql, (new_available, isbn))
-        
-        # 3. Create the Loan Record
-        checkout_date = datetime.now().date()
-        due_date = checkout_date + timedelta(days=LOAN_PERIOD_DAYS)
-        
-        insert_loan_sql = """
-        INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
-        VALUES (%s, %s, %s, %s, NULL)
-        """
-        cursor.execute(insert_loan_sql, (isbn, patron_id, checkout_date, due_date))
-
-        # 4. Commit the Transaction
-        conn.commit()
-        print(f"SUCCESS: Book {isbn} checked out by Patron {patron_id}. Due: {due_date}")
-        success = True
+        status, due_date = call_procedure(cursor, "sp_checkout_book",
+                                          (isbn, patron_id, datetime.now().date(), LOAN_PERIOD_DAYS))
+        if status != procedures.OK:
+            log.info(f"Checkout failed: {PROCEDURE_REASONS[status]}", extra={'isbn': isbn, 'patron_id': patron_id})
+        else:
+            mark_write()
+            log.info(f"Book checked out, due {due_date}",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'duration_ms': elapsed_ms(started)})
+            success = True
 
     except mysql.connector.Error as err:
-        print(f"Database error during checkout: {err}")
-        conn.rollback() # Rollback everything if any step fails
+        log.error("Database error during checkout",
+                  extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
         success = False
 
     finally:
@@ -75,112 +188,163 @@ def checkout_book(isbn: str, patron_id: int) -> bool:
         return success
 
 
-FINE_RATE_PER_DAY = 0.25 # Define the fine rate
-
-def return_book(isbn: str, patron_id: int) -> bool:
-    """
-    Handles the book return process, including fine calculation and recording.
-    """
+def _return_by_procedure(isbn: str, patron_id: int, return_date, started: float) -> bool:
+    """return_book as a single sp_return_book call (see procedures.py)."""
     conn = get_db_connection()
     if not conn:
         return False
 
     cursor = conn.cursor()
     success = False
-    return_date = datetime.now().date()
-    
+
     try:
-        conn.start_transaction() 
-
-        # 1. Find the active loan and its due_date (return_date IS NULL)
-        find_loan_sql = """
-        SELECT loan_id, due_date FROM Loan 
-        WHERE isbn = %s AND patron_id = %s AND return_date IS NULL 
-        LIMIT 1 FOR UPDATE
-        """
-        cursor.execute(find_loan_sql, (isbn, patron_id))
-        loan_record = cursor.fetchone()
-        
-        if not loan_record:
-            print(f"FAILURE: No active loan found for ISBN {isbn} by Patron {patron_id}.")
-            conn.rollback()
-            return False
-        
-        loan_id, due_date = loan_record
-        
-        # --- FINE CALCULATION LOGIC ---
-        days_late = (return_date - due_date).days
-        
-        if days_late > 0:
-            fine_amount = days_late * FINE_RATE_PER_DAY
-            print(f"NOTICE: Book is {days_late} days overdue. Fine of ${fine_amount:.2f} recorded.")
-            
-            # 2. Insert Fine Record
-            fine_sql = """
-            INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date)
-            VALUES (%s, %s, %s, NULL)
-            """
-            cursor.execute(fine_sql, (loan_id, fine_amount, return_date))
-
-        # 3. Update the Loan record with the return date (Always happens)
-        update_loan_sql = """
-        UPDATE Loan SET return_date = %s WHERE loan_id = %s
-        """
-        cursor.execute(update_loan_sql, (return_date, loan_id))
-
-        # 4. Increment available_copies in the Book table (Always happens)
-        update_book_sql = """
-        UPDATE Book SET available_copies = available_copies + 1 WHERE isbn = %s
-        """
-        cursor.execute(update_book_sql, (isbn,))
-
-        # 5. Commit the Transaction
-        conn.commit()
-        print(f"SUCCESS: Book {isbn} returned by Patron {patron_id}.")
-        success = True
+        status, loan_id, fine_amount = call_procedure(cursor, "sp_return_book",
+                                                      (isbn, patron_id, return_date, FINE_RATE_PER_DAY))
+        if status != procedures.OK:
+            log.info(f"Return failed: {PROCEDURE_REASONS[status]}", extra={'isbn': isbn, 'patron_id': patron_id})
+        else:
+            mark_write()
+            if fine_amount:
+                log.info(f"Book is overdue. Fine of ${fine_amount:.2f} recorded.",
+                         extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id})
+            log.info("Book returned",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id, 'duration_ms': elapsed_ms(started)})
+            success = True
 
     except mysql.connector.Error as err:
-        print(f"Database error during return process: {err}")
-        conn.rollback()
+        log.error("Database error during return process",
+                  extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
         success = False
 
     finally:
         cursor.close()
         conn.close()
         return success
+
+
+def checkout_book(isbn: str, patron_id: int, uow: UnitOfWork = None) -> bool:
+    """
+    Handles the process of lending a book to a patron. 
+    Requires a transactional update to both Book and Loan tables.
+    Pass uow to run on a shared connection/transaction (see unit_of_work.py).
+    Runs as a stored procedure when OPENSHELF_ENGINE=procedure (see procedures.py).
+    """
+    started = time.perf_counter()
+    if procedures_enabled(uow):
+        return _checkout_by_procedure(isbn, patron_id, started)
+
+    with session_for(uow) as work:
+        if not work.conn:
+            return False
+
+        cursor = work.conn.cursor()
+        success = False
+
+        try:
+            # Start the transaction
+            work.begin()
+            
+            due_date, reason = _apply_checkout(cursor, isbn, patron_id, datetime.now().date())
+            if reason:
+                log.info(f"Checkout failed: {reason}", extra={'isbn': isbn, 'patron_id': patron_id})
+                work.rollback()
+                return False
+
+            # 4. Commit the Transaction
+            work.commit()
+            log.info(f"Book checked out, due {due_date}",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'duration_ms': elapsed_ms(started)})
+            success = True
+
+        except mysql.connector.Error as err:
+            log.error("Database error during checkout",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            work.rollback() # Rollback everything if any step fails
+            success = False
+
+        finally:
+            cursor.close()
+            return success
+
+
+def return_book(isbn: str, patron_id: int, uow: UnitOfWork = None) -> bool:
+    """
+    Handles the book return process, including fine calculation and recording.
+    Pass uow to run on a shared connection/transaction (see unit_of_work.py).
+    Runs as a stored procedure when OPENSHELF_ENGINE=procedure (see procedures.py).
+    """
+    started = time.perf_counter()
+    return_date = datetime.now().date()
+    if procedures_enabled(uow):
+        return _return_by_procedure(isbn, patron_id, return_date, started)
+
+    with session_for(uow) as work:
+        if not work.conn:
+            return False
+
+        cursor = work.conn.cursor()
+        success = False
+        
+        try:
+            work.begin()
+
+            loan_id, fine_amount, reason = _apply_return(cursor, isbn, patron_id, return_date)
+            if reason:
+                log.info(f"Return failed: {reason}", extra={'isbn': isbn, 'patron_id': patron_id})
+                work.rollback()
+                return False
+
+            if fine_amount:
+                log.info(f"Book is overdue. Fine of ${fine_amount:.2f} recorded.",
+                         extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id})
+
+            # 5. Commit the Transaction
+            work.commit()
+            log.info("Book returned",
+                     extra={'isbn': isbn, 'patron_id': patron_id, 'loan_id': loan_id, 'duration_ms': elapsed_ms(started)})
+            success = True
+
+        except mysql.connector.Error as err:
+            log.error("Database error during return process",
+                      extra={'isbn': isbn, 'patron_id': patron_id, 'error': err, 'duration_ms': elapsed_ms(started)})
+            work.rollback()
+            success = False
+
+        finally:
+            cursor.close()
+            return success
     
 
 
-def get_patron_active_loans(patron_id: int):
+def get_patron_active_loans(patron_id: int, read_your_writes: bool = False, uow: UnitOfWork = None,
+                            as_dict: bool = False):
     """
     Retrieves the ISBN and title for all books currently checked out by a patron.
+    Served from a read replica unless read_your_writes is True or a uow is given.
     
     Returns:
-        A list of dictionaries [{'isbn': ..., 'title': ...}] or an empty list.
+        A list of ActiveLoan (isbn, title) rows, dictionaries with the same
+        keys when as_dict is True, or an empty list.
     """
-    conn = get_db_connection()
+    conn = uow.conn if uow else get_read_connection(read_your_writes)
     if not conn:
         return []
 
-    # Use dictionary=True for easy access to column names (isbn, title)
-    cursor = conn.cursor(dictionary=True) 
+    cursor = conn.cursor()
     loans = []
     
     try:
         # We join Loan and Book to get the title
-        query = """
-        SELECT L.isbn, B.title
-        FROM Loan L
-        JOIN Book B ON L.isbn = B.isbn
-        WHERE L.patron_id = %s AND L.return_date IS NULL
-        """
-        cursor.execute(query, (patron_id,))
-        loans = cursor.fetchall()
+        cursor.execute(ACTIVE_LOANS_SQL, (patron_id,))
+        loans = make_rows(ActiveLoan, cursor.fetchall(), as_dict)
 
     except mysql.connector.Error as err:
-        print(f"Database error fetching active loans: {err}")
+        log.error("Database error fetching active loans", extra={'patron_id': patron_id, 'error': err})
 
     finally:
         cursor.close()
-        conn.close()
+        if uow:
+            uow.release_snapshot()
+        else:
+            conn.close()
         return loans
@@ -4,24 +4,32 @@ import sys
 from sync_logic import search_and_sync_book_by_isbn
 from loan_logic import checkout_book, return_book
 # Assuming you implement view_report in this file or a separate report_logic.py
-from db_connector import get_db_connection 
+from db_connector import get_read_connection
+from profiler import PROFILING_ENABLED, profile_run, profile_section, slowest_sections, format_summary
 import mysql.connector
 
 # --- Function to implement the report logic using your Views ---
-def view_report(view_name: str):
-    """Retrieves and prints data from a specified SQL View."""
-    conn = get_db_connection()
+def view_report(view_name: str, patron_id: int = None):
+    """
+    Retrieves and prints data from a specified SQL View (read replica),
+    limited to one patron when patron_id is given.
+    """
+    conn = get_read_connection()
     if not conn:
         return
 
     cursor = conn.cursor()
     
     try:
-        # Use a parameterized query for safety, even if just calling a VIEW name
+        # view_name comes from the menu, never from input(); patron_id is a bound parameter
         query = f"SELECT * FROM {view_name}"
-        cursor.execute(query)
-        
-        results = cursor.fetchall()
+        params = ()
+        if patron_id is not None:
+            query += " WHERE patron_id = %s"
+            params = (patron_id,)
+        with profile_section("query"):
+            cursor.execute(query, params)
+            results = cursor.fetchall()
         if not results:
             print(f"--- REPORT: {view_name} ---")
             print("No data found for this report.")
@@ -45,6 +53,22 @@ def view_report(view_name: str):
         cursor.close()
         conn.close()
 
+def run_action(label: str, func, *args):
+    """
+    Runs one menu action, profiled when OPENSHELF_PROFILE=1 (input prompts are
+    excluded), and prints the outcome of actions that return True/False. The
+    reasons are logged; log records are diagnostics and may show up later, or
+    not at all at a higher OPENSHELF_LOG_LEVEL.
+    """
+    with profile_run(label):
+        result = func(*args)
+    if isinstance(result, bool):
+        print(f"{label.capitalize()} {'succeeded' if result else 'failed (see the log for the reason)'}.")
+    if PROFILING_ENABLED:
+        print("\n--- PROFILE: {} ---".format(label))
+        print(format_summary(slowest_sections()))
+    return result
+
 # --- Main Application Menu ---
 
 def print_main_menu():
@@ -67,20 +91,24 @@ def handle_reports_menu():
         print("B. View Overdue Books (V_OVERDUE_BOOKS)")
         print("C. View Popular Books (V_POPULAR_BOOKS)")
         print("D. View Patron History (V_PATRON_HISTORY)")
+        print("E. View Full Patron History incl. Archive (V_PATRON_HISTORY_ALL)")
         print("Z. Back to Main Menu")
         
         choice = input("Enter report choice: ").upper()
         
         if choice == 'A':
-            view_report("V_CURRENT_LOANS")
+            run_action("report V_CURRENT_LOANS", view_report, "V_CURRENT_LOANS")
         elif choice == 'B':
-            view_report("V_OVERDUE_BOOKS")
+            run_action("report V_OVERDUE_BOOKS", view_report, "V_OVERDUE_BOOKS")
         elif choice == 'C':
-            view_report("V_POPULAR_BOOKS")
-        elif choice == 'D':
-            # Note: Patron History usually requires an ID input
+            run_action("report V_POPULAR_BOOKS", view_report, "V_POPULAR_BOOKS")
+        elif choice in ('D', 'E'):
+            view_name = "V_PATRON_HISTORY" if choice == 'D' else "V_PATRON_HISTORY_ALL"
             patron_id = input("Enter Patron ID for history: ")
-            view_report(f"V_PATRON_HISTORY WHERE patron_id = {patron_id}")
+            try:
+                run_action(f"report {view_name}", view_report, view_name, int(patron_id))
+            except ValueError:
+                print("Invalid Patron ID. Must be a number.")
         elif choice == 'Z':
             break
         else:
@@ -95,14 +123,14 @@ def main():
         if choice == '1':
             # Add Book
             isbn = input("Enter ISBN to sync: ")
-            search_and_sync_book_by_isbn(isbn.strip())
+            run_action("sync", search_and_sync_book_by_isbn, isbn.strip())
             
         elif choice == '2':
             # Checkout Book
             isbn = input("Enter ISBN to checkout: ")
             patron_id = input("Enter Patron ID: ")
             try:
-                checkout_book(isbn.strip(), int(patron_id))
+                run_action("checkout", checkout_book, isbn.strip(), int(patron_id))
             except ValueError:
                 print("Invalid Patron ID. Must be a number.")
 
@@ -111,7 +139,7 @@ def main():
             isbn = input("Enter ISBN to return: ")
             patron_id = input("Enter Patron ID: ")
             try:
-                return_book(isbn.strip(), int(patron_id))
+                run_action("return", return_book, isbn.strip(), int(patron_id))
             except ValueError:
                 print("Invalid Patron ID. Must be a number.")
                 
@@ -127,5 +155,36 @@ def main():
         else:
             print("Invalid choice. Please enter a number between 1 and 5.")
 
+def batch_main(argv: list):
+    """`python main.py batch FILE`: runs an operation stream instead of the menu (see batch_runner.py)."""
+    import argparse
+    from batch_runner import BATCH_WORKERS, read_operations, run_batch, format_batch_summary
+
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Run a JSONL/CSV stream of operations.")
+    parser.add_argument("input", help="operations file, or - for stdin")
+    parser.add_argument("--format", choices=("jsonl", "csv"),
+                        help="input format (default: from the file extension, jsonl for stdin)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="concurrent operations")
+    parser.add_argument("--output", default="-", help="results file, or - for stdout (default)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    source = sys.stdin if args.input == "-" else open(args.input, newline="")
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        stats = run_batch(read_operations(source, fmt), output, args.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(format_batch_summary(stats), file=sys.stderr)
+    sys.exit(1 if stats['failed'] else 0)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
     main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# parallel_reads.py
+"""
+Fan-out helper for pages that need several independent reads.
+
+Each task runs on a shared worker pool with its own pooled read connection,
+so a page costs roughly its slowest query instead of the sum of all of
+them:
+
+    results = fetch_concurrently({
+        'issued': scalar("SELECT COUNT(*) FROM Loan WHERE return_date IS NULL"),
+        'overdue': frame("SELECT * FROM V_OVERDUE_BOOKS LIMIT 5"),
+    })
+
+A task that fails, or is still running when the overall timeout expires,
+yields None; the others are returned as usual. Only read-only queries
+belong here: every task gets a different connection and transaction.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import mysql.connector
+
+from db_connector import READ_POOL_SIZE, current_branch, get_read_connection, recently_wrote
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Overall budget for one fan-out; late results are dropped, not waited for
+PARALLEL_READ_TIMEOUT_SECONDS = 5
+
+# Shared so an abandoned (timed-out) query never blocks the caller on shutdown
+_executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="parallel-read")
+
+
+def scalar(sql: str, params: tuple = ()):
+    """Task returning the first column of the first row."""
+    def run(cursor):
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        return row[0] if row else None
+    return run
+
+
+def rows(sql: str, params: tuple = ()):
+    """Task returning all rows as dictionaries."""
+    def run(cursor):
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return run
+
+
+def frame(sql: str, params: tuple = ()):
+    """Task returning the result as a pandas DataFrame (empty, with columns, when there are no rows)."""
+    import pandas as pd
+
+    def run(cursor):
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    return run
+
+
+def _run_task(label, task, read_your_writes, branch_id):
+    conn = get_read_connection(read_your_writes, branch_id=branch_id, pooled=True)
+    if not conn:
+        return None
+
+    cursor = conn.cursor()
+    result = None
+
+    try:
+        result = task(cursor)
+
+    except mysql.connector.Error as err:
+        log.error(f"Database error in parallel read '{label}'", extra={'error': err})
+        result = None
+
+    finally:
+        cursor.close()
+        conn.close()
+        return result
+
+
+def fetch_concurrently(tasks: dict, timeout: float = PARALLEL_READ_TIMEOUT_SECONDS) -> dict:
+    """
+    Runs {label: task} concurrently and returns {label: result}.
+    Routing follows the calling thread: its branch, and read-your-writes
+    if it committed recently.
+    """
+    read_your_writes = recently_wrote()
+    branch_id = current_branch()
+    futures = {
+        label: _executor.submit(_run_task, label, task, read_your_writes, branch_id)
+        for label, task in tasks.items()
+    }
+    done, not_done = wait(futures.values(), timeout=timeout)
+    if not_done:
+        late = [label for label, future in futures.items() if future in not_done]
+        log.warning(f"Parallel reads timed out after {timeout}s: {', '.join(late)}", extra={'count': len(late)})
+
+    return {label: future.result() if future in done else None for label, future in futures.items()}
@@ -1,93 +1,144 @@
 # patron_logic.py
 import mysql.connector
-from db_connector import get_db_connection
+from db_connector import get_db_connection, get_read_connection, mark_write
+from unit_of_work import UnitOfWork, session_for
+import procedures
+from procedures import call_procedure, procedures_enabled
+from row_types import PatronInfo
+from app_logging import get_logger
 
-def register_patron(first_name: str, last_name: str, email: str) -> bool:
-    """
-    Inserts a new patron record into the Patron table.
-    """
+log = get_logger(__name__)
+
+# --- SQL Statements ---
+
+EMAIL_EXISTS_SQL = "SELECT patron_id FROM Patron WHERE email = %s"
+
+INSERT_PATRON_SQL = """
+INSERT INTO Patron (first_name, last_name, email)
+VALUES (%s, %s, %s)
+"""
+
+FIND_PATRON_SQL = "SELECT patron_id, first_name, last_name FROM Patron WHERE email = %s"
+
+COUNT_ACTIVE_LOANS_SQL = "SELECT COUNT(loan_id) as active_loans FROM Loan WHERE patron_id = %s AND return_date IS NULL"
+
+
+def _register_by_procedure(first_name: str, last_name: str, email: str) -> bool:
+    """register_patron as a single sp_register_patron call (see procedures.py)."""
     conn = get_db_connection()
     if not conn:
         return False
 
     cursor = conn.cursor()
     success = False
-    
-    try:
-        # Check if email already exists (assuming UNIQUE constraint on email)
-        check_sql = "SELECT patron_id FROM Patron WHERE email = %s"
-        cursor.execute(check_sql, (email,))
-        if cursor.fetchone():
-            print(f"ERROR: Patron with email {email} already exists.")
-            return False
 
-        # Insert new patron
-        insert_sql = """
-        INSERT INTO Patron (first_name, last_name, email)
-        VALUES (%s, %s, %s)
-        """
-        cursor.execute(insert_sql, (first_name, last_name, email))
-        
-        # Commit the transaction
-        conn.commit()
-        new_id = cursor.lastrowid
-        print(f"SUCCESS: New Patron registered with ID: {new_id}")
-        success = True
+    try:
+        status, new_id = call_procedure(cursor, "sp_register_patron", (first_name, last_name, email))
+        if status == procedures.EMAIL_EXISTS:
+            log.info("Registration failed: email already exists", extra={'email': email})
+        else:
+            mark_write()
+            log.info("New patron registered", extra={'patron_id': new_id})
+            success = True
 
     except mysql.connector.Error as err:
-        print(f"Database error during patron registration: {err}")
-        conn.rollback()
+        log.error("Database error during patron registration", extra={'email': email, 'error': err})
         success = False
 
     finally:
         cursor.close()
         conn.close()
         return success
+
+
+def register_patron(first_name: str, last_name: str, email: str, uow: UnitOfWork = None) -> bool:
+    """
+    Inserts a new patron record into the Patron table.
+    Pass uow to run on a shared connection/transaction (see unit_of_work.py).
+    Runs as a stored procedure when OPENSHELF_ENGINE=procedure (see procedures.py).
+    """
+    if procedures_enabled(uow):
+        return _register_by_procedure(first_name, last_name, email)
+
+    with session_for(uow) as work:
+        if not work.conn:
+            return False
+
+        cursor = work.conn.cursor()
+        success = False
+        
+        try:
+            work.begin()
+
+            # Check if email already exists (assuming UNIQUE constraint on email)
+            cursor.execute(EMAIL_EXISTS_SQL, (email,))
+            if cursor.fetchone():
+                log.info("Registration failed: email already exists", extra={'email': email})
+                work.rollback()
+                return False
+
+            # Insert new patron
+            cursor.execute(INSERT_PATRON_SQL, (first_name, last_name, email))
+            
+            # Commit the transaction
+            work.commit()
+            new_id = cursor.lastrowid
+            log.info("New patron registered", extra={'patron_id': new_id})
+            success = True
+
+        except mysql.connector.Error as err:
+            log.error("Database error during patron registration", extra={'email': email, 'error': err})
+            work.rollback()
+            success = False
+
+        finally:
+            cursor.close()
+            return success
     
 
-def find_patron_by_email(email: str):
+def find_patron_by_email(email: str, read_your_writes: bool = False, uow: UnitOfWork = None, as_dict: bool = False):
     """
     Looks up a patron by email and returns their ID, name, and current loan count.
+    Served from a read replica unless read_your_writes is True or a uow is given.
     
     Returns:
-        A tuple (patron_id, first_name, last_name, loan_count) or None if not found.
+        A PatronInfo (patron_id, first_name, last_name, active_loans), a dict
+        with the same keys when as_dict is True, or None if not found.
     """
-    conn = get_db_connection()
+    conn = uow.conn if uow else get_read_connection(read_your_writes)
     if not conn:
         return None
 
-    cursor = conn.cursor(dictionary=True) # Use dictionary=True for easier column access
+    cursor = conn.cursor()
     patron_data = None
     
     try:
         # Step 1: Find the Patron ID and Name
-        patron_sql = "SELECT patron_id, first_name, last_name FROM Patron WHERE email = %s"
-        cursor.execute(patron_sql, (email,))
+        cursor.execute(FIND_PATRON_SQL, (email,))
         patron_info = cursor.fetchone()
         
         if not patron_info:
             return None # Patron not found
             
-        patron_id = patron_info['patron_id']
+        patron_id, first_name, last_name = patron_info
         
         # Step 2: Count their active loans
-        loan_sql = "SELECT COUNT(loan_id) as active_loans FROM Loan WHERE patron_id = %s AND return_date IS NULL"
-        cursor.execute(loan_sql, (patron_id,))
-        loan_count = cursor.fetchone()['active_loans']
+        cursor.execute(COUNT_ACTIVE_LOANS_SQL, (patron_id,))
+        loan_count = cursor.fetchone()[0]
         
         # Step 3: Combine and return all data
-        patron_data = {
-            'patron_id': patron_id,
-            'first_name': patron_info['first_name'],
-            'last_name': patron_info['last_name'],
-            'active_loans': loan_count
-        }
+        patron_data = PatronInfo(patron_id, first_name, last_name, loan_count)
+        if as_dict:
+            patron_data = patron_data._asdict()
 
     except mysql.connector.Error as err:
-        print(f"Database error during patron lookup: {err}")
+        log.error("Database error during patron lookup", extra={'email': email, 'error': err})
         patron_data = None
 
     finally:
         cursor.close()
-        conn.close()
+        if uow:
+            uow.release_snapshot()
+        else:
+            conn.close()
         return patron_data
@@ -0,0 +1,46 @@
+# procedures.py
+"""
+Server-side transaction engine.
+
+checkout_book, return_book and register_patron normally run their
+transaction from the client, one round trip per statement (return_book:
+START TRANSACTION, locking SELECT, optional Fine INSERT, Loan UPDATE, Book
+UPDATE, COMMIT). With OPENSHELF_ENGINE=procedure they call stored
+procedures instead (schema_migrations.py, version 12) that run the same
+steps, including their own COMMIT, on the server and answer with one row
+(status, result...).
+
+Status codes mirror the reasons of the client path. register_patron's
+procedure relies on the unique email index instead of a check-then-insert,
+so two desks registering the same email at once cannot both succeed.
+
+The client path is still used when a UnitOfWork is passed (a procedure's
+COMMIT would end the shared transaction) and on the SQLite backend, which
+has no stored procedures.
+"""
+import os
+
+import db_connector
+
+# "client" (default) or "procedure"
+ENGINE = os.environ.get("OPENSHELF_ENGINE", "client")
+
+# Status codes returned in the first column of every procedure's result row
+OK = 0
+BOOK_NOT_FOUND = 1
+OUT_OF_STOCK = 2
+NO_ACTIVE_LOAN = 3
+EMAIL_EXISTS = 4
+
+
+def procedures_enabled(uow=None) -> bool:
+    """True when this call should go through a stored procedure."""
+    return ENGINE == "procedure" and uow is None and db_connector.DB_BACKEND == "mysql"
+
+
+def call_procedure(cursor, name: str, args: tuple):
+    """Calls a procedure and returns its result row (status first)."""
+    cursor.callproc(name, args)
+    for result in cursor.stored_results():
+        return result.fetchone()
+    return None
@@ -0,0 +1,185 @@
+# profiler.py
+"""
+Opt-in profiling for Streamlit reruns and CLI menu actions.
+
+Enable with the environment variable OPENSHELF_PROFILE=1. When disabled,
+profiled() returns functions unchanged and the section/run helpers do
+nothing, so there is no overhead in normal use.
+
+Each run (one Streamlit rerun or one main.py menu action) records:
+    - wall time, CPU time and tracemalloc peak for every section
+    - a cProfile dump:       profiles/<time>-<label>.prof    (snakeviz, flameprof)
+    - folded section stacks: profiles/<time>-<label>.folded  (flamegraph.pl, speedscope)
+
+Peaks of nested sections are measured from each section's own start, so an
+outer section's peak does not include allocations freed inside it.
+"""
+import cProfile
+import functools
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILING_ENABLED = os.environ.get("OPENSHELF_PROFILE", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("OPENSHELF_PROFILE_DIR", "profiles")
+
+_state = threading.local()
+
+
+def _current_run():
+    return getattr(_state, "run", None)
+
+
+def start_run(label: str):
+    """Begins a profiled run. An unfinished previous run on this thread is discarded."""
+    if not PROFILING_ENABLED:
+        return
+    previous = _current_run()
+    if previous:
+        previous['profile'].disable()
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    profile = cProfile.Profile()
+    _state.run = {
+        'label': label,
+        'started': time.perf_counter(),
+        'started_cpu': time.process_time(),
+        'sections': [],
+        'stack': [label],
+        'open': [],
+        'profile': profile,
+    }
+    profile.enable()
+
+
+def end_run():
+    """Finishes the current run, writes its trace files and returns the section list."""
+    run = _current_run()
+    if not run:
+        return []
+    run['profile'].disable()
+    _state.run = None
+    while run['open']:
+        _state.run = run
+        end_section()
+        _state.run = None
+
+    wall_ms = (time.perf_counter() - run['started']) * 1000
+    cpu_ms = (time.process_time() - run['started_cpu']) * 1000
+    top_level = [s for s in run['sections'] if s['depth'] == 1]
+    run['sections'].append({
+        'name': "(rendering/other)",
+        'path': f"{run['label']};(rendering/other)",
+        'depth': 1,
+        'wall_ms': max(0.0, wall_ms - sum(s['wall_ms'] for s in top_level)),
+        'cpu_ms': max(0.0, cpu_ms - sum(s['cpu_ms'] for s in top_level)),
+        'peak_kb': None,
+    })
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{re.sub(r'[^A-Za-z0-9]+', '_', run['label']).strip('_')}"
+    base = os.path.join(PROFILE_DIR, stem)
+    run['profile'].dump_stats(base + ".prof")
+
+    # Folded stacks carry self time, so nested sections are not counted twice
+    with open(base + ".folded", "w") as f:
+        for section in run['sections']:
+            children_ms = sum(c['wall_ms'] for c in run['sections']
+                              if c['depth'] == section['depth'] + 1 and c['path'].startswith(section['path'] + ";"))
+            self_us = int(max(0.0, section['wall_ms'] - children_ms) * 1000)
+            f.write(f"{section['path']} {self_us}\n")
+
+    _state.last_sections = run['sections']
+    return run['sections']
+
+
+@contextmanager
+def profile_run(label: str):
+    """Context manager form of start_run/end_run, used by main.py menu actions."""
+    start_run(label)
+    try:
+        yield
+    finally:
+        end_run()
+
+
+def begin_section(name: str):
+    """Opens a section in the current run; pair with end_section(). For code that cannot be indented."""
+    run = _current_run()
+    if not run:
+        return
+    run['stack'].append(name)
+    run['open'].append({
+        'name': name,
+        'path': ";".join(run['stack']),
+        'depth': len(run['stack']) - 1,
+        'start_mem': tracemalloc.get_traced_memory()[0],
+        'start_wall': time.perf_counter(),
+        'start_cpu': time.process_time(),
+    })
+    tracemalloc.reset_peak()
+
+
+def end_section():
+    """Closes the innermost open section of the current run."""
+    run = _current_run()
+    if not run or not run['open']:
+        return
+    opened = run['open'].pop()
+    run['sections'].append({
+        'name': opened['name'],
+        'path': opened['path'],
+        'depth': opened['depth'],
+        'wall_ms': (time.perf_counter() - opened['start_wall']) * 1000,
+        'cpu_ms': (time.process_time() - opened['start_cpu']) * 1000,
+        'peak_kb': max(0, tracemalloc.get_traced_memory()[1] - opened['start_mem']) / 1024,
+    })
+    run['stack'].pop()
+
+
+@contextmanager
+def profile_section(name: str):
+    """Times a block inside the current run. No-op when profiling is off or no run is active."""
+    begin_section(name)
+    try:
+        yield
+    finally:
+        end_section()
+
+
+def profiled(func=None, *, name: str = None):
+    """Decorator that records each call as a section. Returns func unchanged when disabled."""
+    if func is None:
+        return functools.partial(profiled, name=name)
+    if not PROFILING_ENABLED:
+        return func
+
+    section_name = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_section(section_name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def slowest_sections(limit: int = 10, sections=None) -> list:
+    """Sections of the given (or this thread's last finished) run, slowest first."""
+    if sections is None:
+        sections = getattr(_state, "last_sections", [])
+    return sorted(sections, key=lambda s: s['wall_ms'], reverse=True)[:limit]
+
+
+def format_summary(sections) -> str:
+    """Plain-text table of sections, for the CLI."""
+    lines = [f"{'section':<40} {'wall ms':>9} {'cpu ms':>9} {'peak KB':>9}"]
+    for s in sections:
+        cpu = "-" if s['cpu_ms'] is None else f"{s['cpu_ms']:.1f}"
+        peak = "-" if s['peak_kb'] is None else f"{s['peak_kb']:.0f}"
+        lines.append(f"{'  ' * (s['depth'] - 1) + s['name']:<40} {s['wall_ms']:>9.1f} {cpu:>9} {peak:>9}")
+    return "\n".join(lines)
@@ -0,0 +1,345 @@
+# query_plan_check.py
+"""
+Query-plan regression check. Runs EXPLAIN on every statement used by
+loan_logic, patron_logic, sync_logic and the report views against a seeded
+local database, and fails when a full table scan or a filesort shows up on
+a large table.
+
+    python query_plan_check.py --create --seed   # first run: copy the schema, load synthetic data
+    python query_plan_check.py                   # migrate + EXPLAIN, exit 1 on regressions
+
+The check runs against PLAN_CHECK_DB_CONFIG, a scratch copy of the schema,
+never against the production database. --create makes that database on the
+same server and copies the tables, views and Schema_Version rows of
+DB_CONFIG's database (no data, no stored procedures: EXPLAIN needs neither).
+"""
+import random
+import sys
+from datetime import date, timedelta
+
+import mysql.connector
+from db_connector import DB_CONFIG
+
+import loan_logic
+import patron_logic
+import sync_logic
+from schema_migrations import apply_migrations
+
+PLAN_CHECK_DB_CONFIG = {**DB_CONFIG, "database": "library_plan_check_db"}
+
+# Plans touching fewer estimated rows than this are never flagged
+LARGE_TABLE_ROWS = 10000
+
+# Synthetic data volume used by --seed
+SEED_BOOKS = 50000
+SEED_PATRONS = 50000
+SEED_LOANS = 500000
+SEED_BATCH_ROWS = 5000
+
+# Sample parameters; they match the rows created by --seed
+SAMPLE_ISBN = "9990000000001"
+SAMPLE_PATRON_ID = 1
+SAMPLE_EMAIL = "seed1@example.invalid"
+SAMPLE_DATE = date(2024, 1, 1)
+
+# Modules whose *_SQL constants are all EXPLAINed
+LOGIC_MODULES = (loan_logic, patron_logic, sync_logic)
+
+# Sample parameters for every *_SQL constant of LOGIC_MODULES. A constant
+# missing here (or an entry whose constant is gone) fails the check.
+SAMPLE_PARAMS = {
+    "loan_logic.CHECK_BOOK_SQL": (SAMPLE_ISBN,),
+    "loan_logic.SET_AVAILABLE_SQL": (1, SAMPLE_ISBN),
+    "loan_logic.INSERT_LOAN_SQL": (SAMPLE_ISBN, SAMPLE_PATRON_ID, SAMPLE_DATE, SAMPLE_DATE),
+    "loan_logic.FIND_ACTIVE_LOAN_SQL": (SAMPLE_ISBN, SAMPLE_PATRON_ID),
+    "loan_logic.INSERT_FINE_SQL": (1, 0.25, SAMPLE_DATE),
+    "loan_logic.CLOSE_LOAN_SQL": (SAMPLE_DATE, 1),
+    "loan_logic.INCREMENT_AVAILABLE_SQL": (SAMPLE_ISBN,),
+    "loan_logic.ACTIVE_LOANS_SQL": (SAMPLE_PATRON_ID,),
+    "patron_logic.EMAIL_EXISTS_SQL": (SAMPLE_EMAIL,),
+    "patron_logic.INSERT_PATRON_SQL": ("Plan", "Check", "plan@example.invalid"),
+    "patron_logic.FIND_PATRON_SQL": (SAMPLE_EMAIL,),
+    "patron_logic.COUNT_ACTIVE_LOANS_SQL": (SAMPLE_PATRON_ID,),
+    "sync_logic.BOOK_EXISTS_SQL": (SAMPLE_ISBN,),
+    "sync_logic.CACHE_LOOKUP_SQL": (SAMPLE_ISBN,),
+    "sync_logic.CACHE_UPSERT_SQL": (SAMPLE_ISBN, "{}"),
+    "sync_logic.INSERT_BOOK_SQL": ("9980000000000", "Plan", "Check", 2024),
+    "sync_logic.FIND_AUTHOR_SQL": ("Seed Author 1",),
+    "sync_logic.INSERT_AUTHOR_SQL": ("Plan Check",),
+    "sync_logic.LINK_AUTHOR_SQL": (SAMPLE_ISBN, 1),
+    "sync_logic.ADD_COPIES_SQL": (1, 1, SAMPLE_ISBN),
+    "sync_logic.SEARCH_AVAILABLE_SQL": ("%seed%", "%seed%", sync_logic.SEARCH_RESULT_LIMIT),
+}
+
+# Session statements that read no table; EXPLAIN does not apply to them
+NO_PLAN = {"sync_logic.LOCK_WAIT_TIMEOUT_SQL", "sync_logic.SET_LOCK_WAIT_TIMEOUT_SQL"}
+
+# (label, sql, params): dashboard metrics and report views as queried by app1.py / main.py
+REPORT_STATEMENTS = [
+    ("metrics.issued", "SELECT COUNT(loan_id) FROM Loan WHERE return_date IS NULL", ()),
+    ("metrics.overdue", "SELECT COUNT(*) FROM V_OVERDUE_BOOKS", ()),
+    ("V_CURRENT_LOANS", "SELECT * FROM V_CURRENT_LOANS ORDER BY checkout_date DESC LIMIT 5", ()),
+    ("V_OVERDUE_BOOKS", "SELECT * FROM V_OVERDUE_BOOKS LIMIT 5", ()),
+    ("V_POPULAR_BOOKS", "SELECT * FROM V_POPULAR_BOOKS", ()),
+    ("V_OUTSTANDING_FINES", "SELECT * FROM V_OUTSTANDING_FINES", ()),
+    ("V_PATRON_HISTORY", "SELECT * FROM V_PATRON_HISTORY WHERE patron_id = %s", (SAMPLE_PATRON_ID,)),
+    ("V_PATRON_HISTORY_ALL", "SELECT * FROM V_PATRON_HISTORY_ALL WHERE patron_id = %s", (SAMPLE_PATRON_ID,)),
+]
+
+
+def collect_statements():
+    """
+    Returns (statements, problems): (label, sql, params) for every *_SQL
+    constant of LOGIC_MODULES followed by REPORT_STATEMENTS, and a message
+    for each constant without SAMPLE_PARAMS and each stale SAMPLE_PARAMS entry.
+    """
+    statements, problems = [], []
+    labels = set()
+    for module in LOGIC_MODULES:
+        for name, sql in vars(module).items():
+            if not name.endswith("_SQL") or not isinstance(sql, str):
+                continue
+            label = f"{module.__name__}.{name}"
+            labels.add(label)
+            if label in NO_PLAN:
+                continue
+            if label not in SAMPLE_PARAMS:
+                problems.append(f"{label}: no sample params in SAMPLE_PARAMS")
+                continue
+            statements.append((label, sql, SAMPLE_PARAMS[label]))
+
+    for label in sorted(SAMPLE_PARAMS.keys() - labels):
+        problems.append(f"{label}: listed in SAMPLE_PARAMS but no such constant")
+    return statements + REPORT_STATEMENTS, problems
+
+
+# Statements whose scans are inherent to what they compute. Keep this short.
+KNOWN_SCANS = {
+    # Leading-wildcard LIKE cannot use a B-tree index; LIMIT 20 bounds the cost.
+    "sync_logic.SEARCH_AVAILABLE_SQL",
+    # Counts every loan per book, then sorts by the count; long-range popularity
+    # reports should use analytics_queries.popular_books() instead.
+    "V_POPULAR_BOOKS",
+}
+
+
+# Tables and views of a database, used to copy the schema for --create
+SCHEMA_TABLES_SQL = """
+SELECT TABLE_NAME FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+"""
+
+SCHEMA_VIEWS_SQL = "SELECT TABLE_NAME, VIEW_DEFINITION FROM information_schema.VIEWS WHERE TABLE_SCHEMA = %s"
+
+
+def _connect():
+    try:
+        return mysql.connector.connect(**PLAN_CHECK_DB_CONFIG)
+    except mysql.connector.Error as err:
+        print(f"ERROR: Cannot connect to plan-check database: {err} (run with --create first)")
+        return None
+
+
+def find_plan_problems(plan_rows) -> list:
+    """Returns human-readable problems found in EXPLAIN output rows."""
+    problems = []
+    for row in plan_rows:
+        rows = row.get('rows') or 0
+        if rows < LARGE_TABLE_ROWS:
+            continue
+        extra = row.get('Extra') or ""
+        if row.get('type') == 'ALL':
+            problems.append(f"full scan of {row.get('table')} (~{rows} rows)")
+        if "Using filesort" in extra:
+            problems.append(f"filesort on {row.get('table')} (~{rows} rows)")
+    return problems
+
+
+def check_query_plans(conn) -> bool:
+    """EXPLAINs every statement from collect_statements(). Returns False on any regression."""
+    statements, unchecked = collect_statements()
+    for problem in unchecked:
+        print(f"FAIL    {problem}")
+    failures = len(unchecked)
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        for label, sql, params in statements:
+            cursor.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+            problems = find_plan_problems(cursor.fetchall())
+
+            if not problems:
+                print(f"OK      {label}")
+            elif label in KNOWN_SCANS:
+                print(f"ALLOWED {label}: {'; '.join(problems)}")
+            else:
+                print(f"FAIL    {label}: {'; '.join(problems)}")
+                failures += 1
+    finally:
+        cursor.close()
+
+    print(f"\n{len(statements)} statements checked, {failures} regression(s).")
+    return failures == 0
+
+
+def create_plan_check_db() -> bool:
+    """
+    Creates the plan-check database and copies DB_CONFIG's schema into it.
+    Does nothing when the plan-check database already has tables.
+    """
+    source, target = DB_CONFIG["database"], PLAN_CHECK_DB_CONFIG["database"]
+    if source == target:
+        print("ERROR: The plan-check database must not be the production database.")
+        return False
+
+    server_config = {key: value for key, value in PLAN_CHECK_DB_CONFIG.items() if key != "database"}
+    try:
+        conn = mysql.connector.connect(**server_config)
+    except mysql.connector.Error as err:
+        print(f"ERROR: Cannot connect to the database server: {err}")
+        return False
+
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{target}`")
+        cursor.execute(SCHEMA_TABLES_SQL, (target,))
+        if cursor.fetchall():
+            print(f"{target} already has tables; nothing to create.")
+            return True
+
+        cursor.execute(SCHEMA_TABLES_SQL, (source,))
+        tables = [name for (name,) in cursor.fetchall()]
+        if not tables:
+            print(f"ERROR: {source} has no tables to copy.")
+            return False
+
+        cursor.execute(f"USE `{target}`")
+        # Tables reference each other; create them in any order
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in tables:
+            cursor.execute(f"SHOW CREATE TABLE `{source}`.`{table}`")
+            cursor.execute(cursor.fetchone()[1])
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        if "Schema_Version" in tables:
+            # The copied tables already have the migrated indexes and columns
+            cursor.execute(f"INSERT INTO Schema_Version SELECT * FROM `{source}`.Schema_Version")
+
+        # View definitions name the source database; views may use other views
+        cursor.execute(SCHEMA_VIEWS_SQL, (source,))
+        pending = {name: definition.replace(f"`{source}`.", "") for name, definition in cursor.fetchall()}
+        while pending:
+            waiting = len(pending)
+            for name, definition in list(pending.items()):
+                try:
+                    cursor.execute(f"CREATE VIEW `{name}` AS {definition}")
+                    del pending[name]
+                except mysql.connector.Error as err:
+                    last_error = err
+            if len(pending) == waiting:
+                # No view could be created this round, so retrying will not help
+                raise last_error
+        conn.commit()
+        print(f"SUCCESS: Copied {len(tables)} tables from {source} into {target}.")
+        return True
+
+    except mysql.connector.Error as err:
+        print(f"Database error while creating {target}: {err}")
+        return False
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _insert_batches(cursor, sql, rows):
+    for start in range(0, len(rows), SEED_BATCH_ROWS):
+        cursor.executemany(sql, rows[start:start + SEED_BATCH_ROWS])
+
+
+def seed_plan_check_data(conn):
+    """
+    Fills the plan-check database with synthetic rows so the optimizer sees
+    realistic table sizes. Refuses to run against DB_CONFIG's database.
+    """
+    if PLAN_CHECK_DB_CONFIG["database"] == DB_CONFIG["database"]:
+        print("ERROR: Refusing to seed the production database.")
+        return False
+
+    rng = random.Random(42)
+    today = date.today()
+    cursor = conn.cursor()
+
+    try:
+        books = [(str(9990000000000 + i), f"Seed Title {i}", 2000 + i % 25, "Seed Press", 3, 3)
+                 for i in range(1, SEED_BOOKS + 1)]
+        _insert_batches(cursor, """
+            INSERT INTO Book (isbn, title, publication_year, publisher, total_copies, available_copies)
+            VALUES (%s, %s, %s, %s, %s, %s)""", books)
+
+        patrons = [("Seed", f"Patron{i}", f"seed{i}@example.invalid") for i in range(1, SEED_PATRONS + 1)]
+        _insert_batches(cursor, "INSERT INTO Patron (first_name, last_name, email) VALUES (%s, %s, %s)", patrons)
+
+        authors = [(f"Seed Author {i}",) for i in range(1, SEED_BOOKS // 4 + 1)]
+        _insert_batches(cursor, "INSERT INTO Author (author_name) VALUES (%s)", authors)
+
+        links = [(isbn, 1 + i % len(authors)) for i, (isbn, *_) in enumerate(books)]
+        _insert_batches(cursor, "INSERT INTO Book_Author (isbn, author_id) VALUES (%s, %s)", links)
+
+        cache = [(isbn, "{}") for isbn, *_ in books[::10]]
+        _insert_batches(cursor, "INSERT INTO Api_Cache (isbn, api_response, cached_at) VALUES (%s, %s, NOW())", cache)
+
+        # ~95% of loans are closed history, like a long-running library
+        loans = []
+        for _ in range(SEED_LOANS):
+            checkout = today - timedelta(days=rng.randint(0, 5 * 365))
+            due = checkout + timedelta(days=14)
+            returned = None
+            if rng.random() < 0.95:
+                returned = checkout + timedelta(days=rng.randint(1, 30))
+            loans.append((books[rng.randrange(len(books))][0], rng.randint(1, SEED_PATRONS),
+                          checkout, due, returned))
+        _insert_batches(cursor, """
+            INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+            VALUES (%s, %s, %s, %s, %s)""", loans)
+
+        cursor.execute("""
+            INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date)
+            SELECT loan_id, DATEDIFF(return_date, due_date) * 0.25, return_date,
+                   IF(loan_id % 3 = 0, NULL, return_date)
+            FROM Loan WHERE return_date > due_date""")
+
+        conn.commit()
+        for table in ("Book", "Patron", "Author", "Book_Author", "Api_Cache", "Loan", "Fine"):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+
+        print(f"SUCCESS: Seeded {len(books)} books, {len(patrons)} patrons, {len(loans)} loans.")
+        return True
+
+    except mysql.connector.Error as err:
+        print(f"Database error while seeding: {err}")
+        conn.rollback()
+        return False
+
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    if "--create" in sys.argv and not create_plan_check_db():
+        sys.exit(1)
+
+    plan_conn = _connect()
+    if not plan_conn:
+        sys.exit(1)
+
+    try:
+        if "--seed" in sys.argv and not seed_plan_check_data(plan_conn):
+            sys.exit(1)
+        ok = apply_migrations(plan_conn) and check_query_plans(plan_conn)
+    finally:
+        plan_conn.close()
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,46 @@
+# row_types.py
+"""
+Compact row types returned by the hot read functions.
+
+Rows are namedtuples built straight from the cursor's tuples, so a result
+costs one small tuple per row instead of a dict per row (dictionary=True),
+and fields are read as attributes:
+
+    for book in search_available_books("dune"):
+        print(book.isbn, book.title)
+
+Functions returning these accept as_dict=True for callers still using
+row['isbn']; the dicts have the same keys as the fields.
+"""
+from collections import namedtuple
+
+
+class PatronInfo(namedtuple("PatronInfo", ["patron_id", "first_name", "last_name", "active_loans"])):
+    """find_patron_by_email result."""
+    __slots__ = ()
+
+
+class ActiveLoan(namedtuple("ActiveLoan", ["isbn", "title"])):
+    """get_patron_active_loans row."""
+    __slots__ = ()
+
+    @property
+    def label(self) -> str:
+        return f"{self.title} (ISBN: {self.isbn})"
+
+
+class AvailableBook(namedtuple("AvailableBook", ["isbn", "title", "available_copies"])):
+    """search_available_books row."""
+    __slots__ = ()
+
+    @property
+    def label(self) -> str:
+        return f"{self.title} (ISBN: {self.isbn}) | Copies: {self.available_copies}"
+
+
+def make_rows(row_type, rows, as_dict: bool = False) -> list:
+    """Wraps cursor tuples (in field order) in row_type, or in dicts when as_dict is True."""
+    if as_dict:
+        fields = row_type._fields
+        return [dict(zip(fields, row)) for row in rows]
+    return list(map(row_type._make, rows))
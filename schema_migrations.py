@@ -0,0 +1,290 @@
+# schema_migrations.py
+"""
+Versioned schema migrations. Each migration runs once and is recorded in
+the Schema_Version table, so running this module repeatedly is safe.
+
+    python schema_migrations.py            # apply pending migrations
+    python schema_migrations.py --status   # list applied/pending versions
+"""
+import sys
+from collections import namedtuple
+
+import mysql.connector
+from db_connector import get_db_connection
+
+# A secondary index. Skipped when an existing index already starts with the
+# same columns (e.g. the PRIMARY KEY on Api_Cache.isbn), because MySQL has
+# no CREATE INDEX IF NOT EXISTS.
+IndexSpec = namedtuple("IndexSpec", ["table", "name", "columns", "unique"])
+
+# (version, description, steps). Steps are IndexSpec or raw SQL strings.
+# Never edit a migration that has shipped; add a new version instead.
+MIGRATIONS = [
+    (1, "Covering index for a patron's open loans (COUNT and active loan list)", [
+        IndexSpec("Loan", "idx_loan_patron_open", ("patron_id", "return_date", "isbn"), False),
+    ]),
+    (2, "Covering index for return_book's open-loan lookup", [
+        IndexSpec("Loan", "idx_loan_isbn_patron_open", ("isbn", "patron_id", "return_date", "due_date"), False),
+    ]),
+    (3, "Open-loan indexes for V_CURRENT_LOANS ordering and V_OVERDUE_BOOKS", [
+        IndexSpec("Loan", "idx_loan_open_checkout", ("return_date", "checkout_date"), False),
+        IndexSpec("Loan", "idx_loan_open_due", ("return_date", "due_date"), False),
+    ]),
+    (4, "Unique patron email lookup", [
+        IndexSpec("Patron", "uq_patron_email", ("email",), True),
+    ]),
+    (5, "Author lookup by name during ISBN sync", [
+        IndexSpec("Author", "idx_author_name", ("author_name",), False),
+    ]),
+    (6, "API cache lookup by ISBN", [
+        IndexSpec("Api_Cache", "idx_api_cache_isbn", ("isbn",), True),
+    ]),
+    (7, "Unpaid fines for V_OUTSTANDING_FINES", [
+        IndexSpec("Fine", "idx_fine_unpaid", ("payment_date", "loan_id"), False),
+    ]),
+    (8, "Archive tables for closed loans and history views across both", [
+        "CREATE TABLE IF NOT EXISTS Loan_Archive LIKE Loan",
+        "CREATE TABLE IF NOT EXISTS Fine_Archive LIKE Fine",
+        """
+        CREATE OR REPLACE VIEW V_LOAN_HISTORY_ALL AS
+        SELECT loan_id, isbn, patron_id, checkout_date, due_date, return_date FROM Loan
+        UNION ALL
+        SELECT loan_id, isbn, patron_id, checkout_date, due_date, return_date FROM Loan_Archive
+        """,
+        """
+        CREATE OR REPLACE VIEW V_PATRON_HISTORY_ALL AS
+        SELECT H.patron_id, P.first_name, P.last_name, H.loan_id, H.isbn, B.title,
+               H.checkout_date, H.due_date, H.return_date
+        FROM V_LOAN_HISTORY_ALL H
+        JOIN Patron P ON P.patron_id = H.patron_id
+        JOIN Book B ON B.isbn = H.isbn
+        """,
+    ]),
+    (9, "Top co-borrowed neighbours per book (filled by co_borrowing.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS Book_Neighbour (
+            isbn VARCHAR(13) NOT NULL,
+            neighbour_rank TINYINT UNSIGNED NOT NULL,
+            neighbour_isbn VARCHAR(13) NOT NULL,
+            co_borrowers INT NOT NULL,
+            score DOUBLE NOT NULL,
+            PRIMARY KEY (isbn, neighbour_rank)
+        )
+        """,
+    ]),
+    (10, "Kiosk journal entries already replayed (exactly-once sync, see kiosk.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS Kiosk_Applied (
+            kiosk_id VARCHAR(64) NOT NULL,
+            entry_id BIGINT NOT NULL,
+            applied_at DATETIME NOT NULL,
+            PRIMARY KEY (kiosk_id, entry_id)
+        )
+        """,
+    ]),
+    (11, "Open loans per ISBN for the inventory audit", [
+        IndexSpec("Loan", "idx_loan_open_isbn", ("return_date", "isbn"), False),
+    ]),
+    (12, "Stored procedures for checkout, return and registration (see procedures.py)", [
+        "DROP PROCEDURE IF EXISTS sp_checkout_book",
+        """
+        CREATE PROCEDURE sp_checkout_book(IN p_isbn VARCHAR(13), IN p_patron_id INT,
+                                          IN p_checkout_date DATE, IN p_loan_days INT)
+        BEGIN
+            DECLARE v_available INT DEFAULT NULL;
+            DECLARE EXIT HANDLER FOR SQLEXCEPTION
+            BEGIN
+                ROLLBACK;
+                RESIGNAL;
+            END;
+
+            START TRANSACTION;
+            SELECT available_copies INTO v_available FROM Book WHERE isbn = p_isbn FOR UPDATE;
+            IF v_available IS NULL THEN
+                ROLLBACK;
+                SELECT 1 AS status, NULL AS due_date;
+            ELSEIF v_available <= 0 THEN
+                ROLLBACK;
+                SELECT 2 AS status, NULL AS due_date;
+            ELSE
+                UPDATE Book SET available_copies = available_copies - 1 WHERE isbn = p_isbn;
+                INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+                VALUES (p_isbn, p_patron_id, p_checkout_date, p_checkout_date + INTERVAL p_loan_days DAY, NULL);
+                COMMIT;
+                SELECT 0 AS status, p_checkout_date + INTERVAL p_loan_days DAY AS due_date;
+            END IF;
+        END
+        """,
+        "DROP PROCEDURE IF EXISTS sp_return_book",
+        """
+        CREATE PROCEDURE sp_return_book(IN p_isbn VARCHAR(13), IN p_patron_id INT,
+                                        IN p_return_date DATE, IN p_fine_rate DECIMAL(5,2))
+        BEGIN
+            DECLARE v_loan_id INT DEFAULT NULL;
+            DECLARE v_due_date DATE;
+            DECLARE v_fine DECIMAL(5,2) DEFAULT 0;
+            DECLARE EXIT HANDLER FOR SQLEXCEPTION
+            BEGIN
+                ROLLBACK;
+                RESIGNAL;
+            END;
+
+            START TRANSACTION;
+            SELECT loan_id, due_date INTO v_loan_id, v_due_date FROM Loan
+            WHERE isbn = p_isbn AND patron_id = p_patron_id AND return_date IS NULL
+            LIMIT 1 FOR UPDATE;
+            IF v_loan_id IS NULL THEN
+                ROLLBACK;
+                SELECT 3 AS status, NULL AS loan_id, 0 AS fine_amount;
+            ELSE
+                IF p_return_date > v_due_date THEN
+                    SET v_fine = DATEDIFF(p_return_date, v_due_date) * p_fine_rate;
+                    INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date)
+                    VALUES (v_loan_id, v_fine, p_return_date, NULL);
+                END IF;
+                UPDATE Loan SET return_date = p_return_date WHERE loan_id = v_loan_id;
+                UPDATE Book SET available_copies = available_copies + 1 WHERE isbn = p_isbn;
+                COMMIT;
+                SELECT 0 AS status, v_loan_id AS loan_id, v_fine AS fine_amount;
+            END IF;
+        END
+        """,
+        "DROP PROCEDURE IF EXISTS sp_register_patron",
+        """
+        CREATE PROCEDURE sp_register_patron(IN p_first_name VARCHAR(50), IN p_last_name VARCHAR(50),
+                                            IN p_email VARCHAR(100))
+        BEGIN
+            -- Duplicate email on uq_patron_email (migration 4): no check-then-insert race
+            DECLARE EXIT HANDLER FOR 1062
+            BEGIN
+                ROLLBACK;
+                SELECT 4 AS status, NULL AS patron_id;
+            END;
+            DECLARE EXIT HANDLER FOR SQLEXCEPTION
+            BEGIN
+                ROLLBACK;
+                RESIGNAL;
+            END;
+
+            START TRANSACTION;
+            INSERT INTO Patron (first_name, last_name, email) VALUES (p_first_name, p_last_name, p_email);
+            COMMIT;
+            SELECT 0 AS status, LAST_INSERT_ID() AS patron_id;
+        END
+        """,
+    ]),
+    (13, "Kiosk replay outcome and touched loan, for staff review and incremental consumers", [
+        """
+        ALTER TABLE Kiosk_Applied
+            ADD COLUMN isbn VARCHAR(13) NULL,
+            ADD COLUMN loan_id BIGINT NULL,
+            ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT 'applied',
+            ADD COLUMN detail VARCHAR(255) NULL
+        """,
+        IndexSpec("Kiosk_Applied", "idx_kiosk_applied_at", ("applied_at", "loan_id", "isbn"), False),
+    ]),
+]
+
+SCHEMA_VERSION_SQL = """
+CREATE TABLE IF NOT EXISTS Schema_Version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+INDEX_COLUMNS_SQL = """
+SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index) AS cols
+FROM information_schema.STATISTICS
+WHERE table_schema = DATABASE() AND table_name = %s
+GROUP BY index_name
+"""
+
+
+def _index_exists(cursor, spec: IndexSpec) -> bool:
+    """True if the named index exists or another index already leads with the same columns."""
+    cursor.execute(INDEX_COLUMNS_SQL, (spec.table,))
+    wanted = list(spec.columns)
+    for index_name, cols in cursor.fetchall():
+        existing = cols.split(",")
+        if index_name == spec.name or existing[:len(wanted)] == wanted:
+            return True
+    return False
+
+
+def _apply_step(cursor, step):
+    if isinstance(step, IndexSpec):
+        if _index_exists(cursor, step):
+            print(f"  - {step.table}({', '.join(step.columns)}) already indexed, skipping.")
+            return
+        kind = "UNIQUE INDEX" if step.unique else "INDEX"
+        cursor.execute(
+            f"CREATE {kind} {step.name} ON {step.table} ({', '.join(step.columns)})"
+        )
+        print(f"  + Created {step.name} on {step.table}({', '.join(step.columns)})")
+    else:
+        cursor.execute(step)
+
+
+def get_applied_versions(conn) -> set:
+    """Returns the set of migration versions recorded in Schema_Version."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCHEMA_VERSION_SQL)
+        cursor.execute("SELECT version FROM Schema_Version")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def apply_migrations(conn) -> bool:
+    """
+    Applies all pending migrations in version order. DDL commits implicitly
+    in MySQL, so each migration is recorded right after its steps succeed;
+    a failed migration is reported and later ones are not attempted.
+    """
+    applied = get_applied_versions(conn)
+    cursor = conn.cursor()
+
+    try:
+        for version, description, steps in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"Applying migration {version}: {description}")
+            for step in steps:
+                _apply_step(cursor, step)
+            cursor.execute(
+                "INSERT INTO Schema_Version (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+        print("SUCCESS: Schema is up to date.")
+        return True
+
+    except mysql.connector.Error as err:
+        print(f"Database error during migration: {err}")
+        conn.rollback()
+        return False
+
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    db_conn = get_db_connection()
+    if not db_conn:
+        sys.exit(1)
+
+    try:
+        if "--status" in sys.argv:
+            done = get_applied_versions(db_conn)
+            for version, description, _ in MIGRATIONS:
+                state = "applied" if version in done else "pending"
+                print(f"{version:>3}  {state:<8} {description}")
+            ok = True
+        else:
+            ok = apply_migrations(db_conn)
+    finally:
+        db_conn.close()
+
+    sys.exit(0 if ok else 1)
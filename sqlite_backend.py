@@ -0,0 +1,359 @@
+# sqlite_backend.py
+"""
+Embedded SQLite backend for single-desk and test deployments.
+
+Enable with OPENSHELF_DB_BACKEND=sqlite (file: OPENSHELF_SQLITE_PATH,
+default openshelf.db; see db_connector.py). db_connector then hands out
+SQLiteConnection objects, which behave like mysql.connector connections as
+far as the logic modules are concerned:
+
+    - MySQL SQL is translated once per statement: %s placeholders,
+      SELECT ... FOR UPDATE, INSERT IGNORE, ON DUPLICATE KEY UPDATE,
+      NOW()/CURDATE(); SET SESSION statements and SELECT @@ session
+      variable reads are ignored (the read returns no row)
+    - start_transaction() takes the write lock up front (BEGIN IMMEDIATE),
+      which serialises writers the way FOR UPDATE row locks do
+    - sqlite3 errors are re-raised as mysql.connector errors, so existing
+      except-blocks (including IntegrityError) keep working
+    - DATE/DATETIME columns come back as date/datetime objects
+
+The schema, indexes and views are created on first use. The database runs
+in WAL mode so report reads do not block the desk's writes.
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# How long a writer waits for another writer's lock before failing
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Columns added to existing tables after their first release: (table, column, definition).
+# CREATE TABLE IF NOT EXISTS does not add them to databases created earlier.
+SQLITE_ADDED_COLUMNS = [
+    ("Kiosk_Applied", "isbn", "VARCHAR(13)"),
+    ("Kiosk_Applied", "loan_id", "BIGINT"),
+    ("Kiosk_Applied", "status", "VARCHAR(16) NOT NULL DEFAULT 'applied'"),
+    ("Kiosk_Applied", "detail", "VARCHAR(255)"),
+]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Book (
+    isbn VARCHAR(13) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    publication_year INTEGER,
+    publisher VARCHAR(100),
+    total_copies INTEGER NOT NULL DEFAULT 0,
+    available_copies INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS Author (
+    author_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_name VARCHAR(150) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_author_name ON Author (author_name);
+CREATE TABLE IF NOT EXISTS Book_Author (
+    isbn VARCHAR(13) NOT NULL REFERENCES Book (isbn),
+    author_id INTEGER NOT NULL REFERENCES Author (author_id),
+    PRIMARY KEY (isbn, author_id)
+);
+CREATE TABLE IF NOT EXISTS Patron (
+    patron_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS Loan (
+    loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isbn VARCHAR(13) NOT NULL REFERENCES Book (isbn),
+    patron_id INTEGER NOT NULL REFERENCES Patron (patron_id),
+    checkout_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    return_date DATE
+);
+CREATE INDEX IF NOT EXISTS idx_loan_patron_open ON Loan (patron_id, return_date, isbn);
+CREATE INDEX IF NOT EXISTS idx_loan_isbn_patron_open ON Loan (isbn, patron_id, return_date, due_date);
+CREATE INDEX IF NOT EXISTS idx_loan_open_checkout ON Loan (return_date, checkout_date);
+CREATE INDEX IF NOT EXISTS idx_loan_open_due ON Loan (return_date, due_date);
+CREATE INDEX IF NOT EXISTS idx_loan_open_isbn ON Loan (return_date, isbn);
+CREATE TABLE IF NOT EXISTS Fine (
+    fine_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    loan_id INTEGER NOT NULL REFERENCES Loan (loan_id),
+    fine_amount DECIMAL(5,2) NOT NULL,
+    fine_date DATE NOT NULL,
+    payment_date DATE
+);
+CREATE INDEX IF NOT EXISTS idx_fine_unpaid ON Fine (payment_date, loan_id);
+CREATE TABLE IF NOT EXISTS Api_Cache (
+    isbn VARCHAR(13) PRIMARY KEY,
+    api_response JSON NOT NULL,
+    cached_at DATETIME NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Loan_Archive (
+    loan_id INTEGER PRIMARY KEY,
+    isbn VARCHAR(13) NOT NULL,
+    patron_id INTEGER NOT NULL,
+    checkout_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    return_date DATE
+);
+CREATE TABLE IF NOT EXISTS Fine_Archive (
+    fine_id INTEGER PRIMARY KEY,
+    loan_id INTEGER NOT NULL,
+    fine_amount DECIMAL(5,2) NOT NULL,
+    fine_date DATE NOT NULL,
+    payment_date DATE
+);
+CREATE TABLE IF NOT EXISTS Book_Neighbour (
+    isbn VARCHAR(13) NOT NULL,
+    neighbour_rank INTEGER NOT NULL,
+    neighbour_isbn VARCHAR(13) NOT NULL,
+    co_borrowers INTEGER NOT NULL,
+    score DOUBLE NOT NULL,
+    PRIMARY KEY (isbn, neighbour_rank)
+);
+CREATE TABLE IF NOT EXISTS Kiosk_Applied (
+    kiosk_id VARCHAR(64) NOT NULL,
+    entry_id BIGINT NOT NULL,
+    applied_at DATETIME NOT NULL,
+    isbn VARCHAR(13),
+    loan_id BIGINT,
+    status VARCHAR(16) NOT NULL DEFAULT 'applied',
+    detail VARCHAR(255),
+    PRIMARY KEY (kiosk_id, entry_id)
+);
+
+CREATE VIEW IF NOT EXISTS V_CURRENT_LOANS AS
+SELECT L.loan_id, L.isbn, B.title, L.patron_id, P.first_name, P.last_name,
+       L.checkout_date, L.due_date
+FROM Loan L
+JOIN Book B ON B.isbn = L.isbn
+JOIN Patron P ON P.patron_id = L.patron_id
+WHERE L.return_date IS NULL;
+
+CREATE VIEW IF NOT EXISTS V_OVERDUE_BOOKS AS
+SELECT L.loan_id, L.isbn, B.title, L.patron_id, P.first_name, P.last_name, L.due_date,
+       CAST(julianday('now', 'localtime', 'start of day') - julianday(L.due_date) AS INTEGER) AS days_overdue
+FROM Loan L
+JOIN Book B ON B.isbn = L.isbn
+JOIN Patron P ON P.patron_id = L.patron_id
+WHERE L.return_date IS NULL AND L.due_date < date('now', 'localtime')
+ORDER BY days_overdue DESC;
+
+CREATE VIEW IF NOT EXISTS V_POPULAR_BOOKS AS
+SELECT B.isbn, B.title, COUNT(L.loan_id) AS borrow_count
+FROM Book B
+JOIN Loan L ON L.isbn = B.isbn
+GROUP BY B.isbn, B.title
+ORDER BY borrow_count DESC;
+
+CREATE VIEW IF NOT EXISTS V_PATRON_HISTORY AS
+SELECT L.patron_id, P.first_name, P.last_name, L.loan_id, L.isbn, B.title,
+       L.checkout_date, L.due_date, L.return_date
+FROM Loan L
+JOIN Patron P ON P.patron_id = L.patron_id
+JOIN Book B ON B.isbn = L.isbn;
+
+CREATE VIEW IF NOT EXISTS V_OUTSTANDING_FINES AS
+SELECT F.fine_id, F.loan_id, L.patron_id, P.first_name, P.last_name, L.isbn, B.title,
+       F.fine_amount, F.fine_date
+FROM Fine F
+JOIN Loan L ON L.loan_id = F.loan_id
+JOIN Patron P ON P.patron_id = L.patron_id
+JOIN Book B ON B.isbn = L.isbn
+WHERE F.payment_date IS NULL;
+
+CREATE VIEW IF NOT EXISTS V_LOAN_HISTORY_ALL AS
+SELECT loan_id, isbn, patron_id, checkout_date, due_date, return_date FROM Loan
+UNION ALL
+SELECT loan_id, isbn, patron_id, checkout_date, due_date, return_date FROM Loan_Archive;
+
+CREATE VIEW IF NOT EXISTS V_PATRON_HISTORY_ALL AS
+SELECT H.patron_id, P.first_name, P.last_name, H.loan_id, H.isbn, B.title,
+       H.checkout_date, H.due_date, H.return_date
+FROM V_LOAN_HISTORY_ALL H
+JOIN Patron P ON P.patron_id = H.patron_id
+JOIN Book B ON B.isbn = H.isbn;
+"""
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+
+_initialised = set()
+_init_lock = threading.Lock()
+
+
+@lru_cache(maxsize=256)
+def translate_sql(sql: str):
+    """Rewrites one MySQL statement for SQLite. Returns None for statements that have no SQLite equivalent."""
+    text = sql.strip().rstrip(";")
+    if re.match(r"SET\s+SESSION\b|SELECT\s+@@", text, re.IGNORECASE):
+        return None
+
+    text = text.replace("%s", "?")
+    text = re.sub(r"\s+FOR\s+UPDATE\b", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", text, flags=re.IGNORECASE)
+    text = re.sub(r"\bNOW\(\)", "datetime('now', 'localtime')", text, flags=re.IGNORECASE)
+    text = re.sub(r"\bCURDATE\(\)", "date('now', 'localtime')", text, flags=re.IGNORECASE)
+
+    match = re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", text, re.IGNORECASE)
+    if match:
+        updates = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", text[match.end():], flags=re.IGNORECASE)
+        text = text[:match.start()] + "ON CONFLICT DO UPDATE SET" + updates
+    return text
+
+
+@contextmanager
+def _mysql_errors():
+    """Re-raises sqlite3 errors as the mysql.connector error the logic modules catch."""
+    try:
+        yield
+    except sqlite3.IntegrityError as err:
+        raise mysql.connector.IntegrityError(msg=str(err)) from err
+    except sqlite3.OperationalError as err:
+        raise mysql.connector.OperationalError(msg=str(err)) from err
+    except sqlite3.ProgrammingError as err:
+        raise mysql.connector.ProgrammingError(msg=str(err)) from err
+    except sqlite3.Error as err:
+        raise mysql.connector.DatabaseError(msg=str(err)) from err
+
+
+class SQLiteCursor:
+    """The subset of the mysql.connector cursor API used by this project."""
+
+    def __init__(self, raw_cursor, dictionary: bool = False):
+        self._cursor = raw_cursor
+        self._dictionary = dictionary
+        self._skipped = False
+
+    @property
+    def rowcount(self):
+        return 0 if self._skipped else self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return None if self._skipped else self._cursor.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def execute(self, sql, params=()):
+        text = translate_sql(sql)
+        self._skipped = text is None
+        if self._skipped:
+            return
+        with _mysql_errors():
+            self._cursor.execute(text, tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        text = translate_sql(sql)
+        self._skipped = text is None
+        if self._skipped:
+            return
+        with _mysql_errors():
+            self._cursor.executemany(text, [tuple(p) for p in seq_params])
+
+    def fetchone(self):
+        if self._skipped:
+            return None
+        with _mysql_errors():
+            return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        if self._skipped:
+            return []
+        with _mysql_errors():
+            return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        if self._skipped:
+            return []
+        with _mysql_errors():
+            return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """The subset of the mysql.connector connection API used by this project."""
+
+    def __init__(self, raw_conn):
+        self._conn = raw_conn
+
+    def cursor(self, dictionary: bool = False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.in_transaction
+
+    def is_connected(self) -> bool:
+        return True
+
+    def start_transaction(self, consistent_snapshot=False, isolation_level=None, readonly=None):
+        if self._conn.in_transaction:
+            raise mysql.connector.ProgrammingError(msg="Transaction already in progress")
+        with _mysql_errors():
+            # Read-only transactions take no write lock; WAL gives them a snapshot
+            self._conn.execute("BEGIN" if readonly else "BEGIN IMMEDIATE")
+
+    def commit(self):
+        with _mysql_errors():
+            self._conn.commit()
+
+    def rollback(self):
+        with _mysql_errors():
+            self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def init_sqlite_db(path: str):
+    """Creates the schema and switches the file to WAL mode. Runs once per path per process."""
+    with _init_lock:
+        if path in _initialised:
+            return
+        raw = sqlite3.connect(path)
+        try:
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.executescript(SQLITE_SCHEMA)
+            for table, column, definition in SQLITE_ADDED_COLUMNS:
+                if column not in {row[1] for row in raw.execute(f"PRAGMA table_info({table})")}:
+                    raw.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            raw.execute("CREATE INDEX IF NOT EXISTS idx_kiosk_applied_at ON Kiosk_Applied (applied_at, loan_id, isbn)")
+        finally:
+            raw.close()
+        _initialised.add(path)
+
+
+def connect_sqlite(path: str):
+    """
+    Opens a connection to the SQLite database, creating it if needed.
+    Returns a SQLiteConnection or None, like get_db_connection().
+    """
+    try:
+        init_sqlite_db(path)
+        raw = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        raw.execute("PRAGMA foreign_keys=ON")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        return SQLiteConnection(raw)
+    except sqlite3.Error as e:
+        log.error("SQLite connection error", extra={'error': e})
+        return None
@@ -1,163 +1,363 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import math
+import time
 import mysql.connector
-from db_connector import get_db_connection
-from api_handler import parse_google_books_data,get_book_data_from_api
+import db_connector
+from db_connector import get_read_connection, get_catalog_connection, is_sharded, current_branch
+from branches import publish_catalog_entry
+from unit_of_work import UnitOfWork, session_for
+from loan_logic import _run_steps
+from row_types import AvailableBook, make_rows
+from api_handler import parse_google_books_data, fetch_book_data, API_TIMEOUT_SECONDS, FOUND, NOT_FOUND
+from deadline import Deadline, DeadlineExceeded
+from app_logging import get_logger, elapsed_ms
 
+log = get_logger(__name__)
 
+# Overall time budget for one interactive ISBN sync
+SYNC_DEADLINE_SECONDS = 10
 
+# Cached API responses younger than this are used without calling the API
+CACHE_FRESHNESS_DAYS = 7
 
-def search_and_sync_book_by_isbn(isbn):
+# "Not found" answers are cached for this long
+NEGATIVE_CACHE_HOURS = 24
+NOT_FOUND_MARKER = "_not_found"
+
+
+
+
+# --- SQL Statements ---
+
+BOOK_EXISTS_SQL = "SELECT isbn FROM Book WHERE isbn = %s"
+
+CACHE_LOOKUP_SQL = "SELECT api_response, cached_at FROM Api_Cache WHERE isbn = %s"
+
+CACHE_UPSERT_SQL = """
+INSERT INTO Api_Cache (isbn, api_response, cached_at) 
+VALUES (%s, %s, NOW())
+ON DUPLICATE KEY UPDATE api_response = VALUES(api_response), cached_at = NOW();
+"""
+
+INSERT_BOOK_SQL = """
+INSERT INTO Book (isbn, title, publisher, publication_year, total_copies, available_copies)
+VALUES (%s, %s, %s, %s, 0, 0)
+"""
+
+FIND_AUTHOR_SQL = "SELECT author_id FROM Author WHERE author_name = %s"
+
+INSERT_AUTHOR_SQL = "INSERT INTO Author (author_name) VALUES (%s)"
+
+LINK_AUTHOR_SQL = """
+INSERT INTO Book_Author (isbn, author_id)
+VALUES (%s, %s)
+"""
+
+ADD_COPIES_SQL = """
+UPDATE Book
+SET total_copies = total_copies + %s, available_copies = available_copies + %s
+WHERE isbn = %s
+"""
+
+# The sync shortens the lock wait to its remaining budget and restores it after,
+# so a shared or pooled connection does not keep the short timeout
+LOCK_WAIT_TIMEOUT_SQL = "SELECT @@SESSION.innodb_lock_wait_timeout"
+
+SET_LOCK_WAIT_TIMEOUT_SQL = "SET SESSION innodb_lock_wait_timeout = %s"
+
+SEARCH_AVAILABLE_SQL = """
+SELECT isbn, title, available_copies
+FROM Book
+WHERE available_copies > 0 
+  AND (isbn LIKE %s OR title LIKE %s)
+LIMIT %s
+"""
+
+# Default number of search results (keeps the desk search fast)
+SEARCH_RESULT_LIMIT = 20
+
+
+def _classify_cached(isbn: str, cache_data):
     """
-    Core function to check DB, check cache, call API, and sync data into 
-    Book, Author, and Book_Author tables in a single transaction.
+    Reads a CACHE_LOOKUP_SQL row. Returns (fresh response, stale response,
+    recently not found); the responses are None when not usable.
+    """
+    if not cache_data:
+        return None, None, False
+
+    cache_json, cached_at = cache_data
+    # The JSON object from MySQL connector often needs to be loaded if it's a string
+    cached = json.loads(cache_json)
+    cache_age = datetime.now() - cached_at
+
+    if cached.get(NOT_FOUND_MARKER):
+        if cache_age < timedelta(hours=NEGATIVE_CACHE_HOURS):
+            log.info("Cache hit: ISBN was recently not found on the API", extra={'isbn': isbn})
+            return None, None, True
+        return None, None, False
+    if cache_age.days < CACHE_FRESHNESS_DAYS:
+        log.debug("Cache hit: using fresh cached API response", extra={'isbn': isbn})
+        return cached, None, False
+    log.debug("Cache found but stale, will call API", extra={'isbn': isbn})
+    return None, cached, False
+
+
+def _sync_steps(isbn: str, book_info: dict, api_response=None):
+    """
+    The write transaction of a sync, as loan_logic._run_steps steps. A
+    fresh api_response is cached in the same transaction.
     """
-    conn = get_db_connection()
+    if api_response is not None:
+        # Using INSERT ... ON DUPLICATE KEY UPDATE to handle potential race conditions
+        yield CACHE_UPSERT_SQL, (isbn, json.dumps(api_response))
+
+    yield INSERT_BOOK_SQL, (
+        isbn, 
+        book_info['title'], 
+        book_info['publisher'], 
+        book_info['publication_year']
+    )
+
+    # Handle Authors (Loop through all authors)
+    for author_name in book_info['authors']:
+        # a. Check if Author exists and get ID
+        result = yield FIND_AUTHOR_SQL, (author_name,)
+        if result:
+            author_id = result[0]
+        else:
+            # b. Author does NOT exist, insert new author (lastrowid is sent back)
+            author_id = yield INSERT_AUTHOR_SQL, (author_name,)
+
+        # c. Link Book and Author in the Junction Table
+        yield LINK_AUTHOR_SQL, (isbn, author_id)
+
+
+def _remember_not_found(isbn: str):
+    """Writes the negative-cache entry on its own short-lived catalog connection."""
+    conn = get_catalog_connection()
     if not conn:
-        return False
+        return
 
     cursor = conn.cursor()
-    book_found_in_db = False
 
     try:
-        # --- A. Check if Book already exists in the local DB (Book table) ---
-        cursor.execute("SELECT isbn FROM Book WHERE isbn = %s", (isbn,))
-        if cursor.fetchone():
-            print(f"Book with ISBN {isbn} already exists in the local DB.")
-            book_found_in_db = True
-            return True
+        cursor.execute(CACHE_UPSERT_SQL, (isbn, json.dumps({NOT_FOUND_MARKER: True})))
+        conn.commit()
 
-        # --- B. Check API Cache for a recent response ---
-        raw_api_response = None
-        
-        cursor.execute("SELECT api_response, cached_at FROM Api_Cache WHERE isbn = %s", (isbn,))
-        cache_data = cursor.fetchone()
-
-        if cache_data:
-            cache_json, cached_at = cache_data
-            
-            # Check if cache is fresh (e.g., less than 7 days old)
-            cache_freshness_days = 7
-            if (datetime.now() - cached_at).days < cache_freshness_days:
-                print("Cache hit: Using fresh cached API response.")
-                # The JSON object from MySQL connector often needs to be loaded if it's a string
-                raw_api_response = json.loads(cache_json) 
-            else:
-                print("Cache found but stale. Will call API.")
-
-        # --- C. Call API if not found or cache is stale ---
-        if not raw_api_response:
-            print("Cache miss. Calling Google Books API...")
-            raw_data_item = get_book_data_from_api(isbn) 
-            
-            if not raw_data_item:
-                print("Could not retrieve book data from API.")
+    except mysql.connector.Error as err:
+        log.warning("Could not cache the API miss", extra={'isbn': isbn, 'error': err})
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def search_and_sync_book_by_isbn(isbn, deadline_seconds: float = SYNC_DEADLINE_SECONDS, uow: UnitOfWork = None):
+    """
+    Core function to check DB, check cache, call API, and sync data into 
+    Book, Author, and Book_Author tables in a single transaction.
+
+    The whole call (cache lookup, HTTP, DB write) shares one deadline
+    budget. The API is called before the write transaction opens, so no
+    locks are held while waiting on the network. When the API is degraded,
+    a stale cached response is used if one exists.
+
+    Pass uow to run on a shared connection/transaction (see unit_of_work.py).
+    Inside an atomic unit that has already written, that transaction stays
+    open during the API call. An API miss is cached on a separate connection
+    so it survives the unit's rollback; on SQLite, where a second writer would
+    wait for the unit's write lock, it is written in (and rolled back with)
+    the unit.
+
+    With branches configured, the sync runs on the shared catalog and the
+    book is then published to every branch; a caller passing its own uow
+    (a UnitOfWork(catalog=True)) publishes after committing it.
+    """
+    started = time.perf_counter()
+    budget = Deadline(deadline_seconds)
+    with session_for(uow, catalog=True) as work:
+        if not work.conn:
+            return False
+
+        cursor = work.conn.cursor()
+        previous_lock_wait = None
+
+        try:
+            # --- A. Check if Book already exists in the local DB (Book table) ---
+            cursor.execute(BOOK_EXISTS_SQL, (isbn,))
+            if cursor.fetchone():
+                log.info("Book already exists in the local DB", extra={'isbn': isbn})
+                if is_sharded() and uow is None:
+                    # The current branch may have joined after the book was synced
+                    return publish_catalog_entry(isbn, branches=[current_branch()])
+                return True
+
+            # --- B. Check API Cache for a recent response ---
+            cursor.execute(CACHE_LOOKUP_SQL, (isbn,))
+            cache_data = cursor.fetchone()
+
+            fresh, stale_api_response, known_missing = _classify_cached(isbn, cache_data)
+            if known_missing:
                 return False
+            raw_api_response = fresh
 
-            # Cache the raw response for future use
-            raw_api_response_str = json.dumps(raw_data_item)
-            
-            # Using INSERT ... ON DUPLICATE KEY UPDATE to handle potential race conditions
-            cache_sql = """
-            INSERT INTO Api_Cache (isbn, api_response, cached_at) 
-            VALUES (%s, %s, NOW())
-            ON DUPLICATE KEY UPDATE api_response = VALUES(api_response), cached_at = NOW();
-            """
-            cursor.execute(cache_sql, (isbn, raw_api_response_str))
-            
-            # Set the response for processing
-            raw_api_response = raw_data_item
-
-
-        # --- D. Process and Sync (The Transactional Part) ---
+            # End the read snapshot so nothing is held open during the HTTP call
+            work.release_snapshot()
+
+            # --- C. Call API if not found or cache is stale ---
+            fetched_from_api = False
+            if not raw_api_response:
+                budget.check("API call")
+                log.debug("Cache miss, calling Google Books API", extra={'isbn': isbn})
+                status, raw_data_item = fetch_book_data(isbn, timeout=min(API_TIMEOUT_SECONDS, budget.remaining()))
+
+                if status == FOUND:
+                    raw_api_response = raw_data_item
+                    fetched_from_api = True
+                elif status == NOT_FOUND:
+                    # Remember the miss so repeated scans do not hit the API again
+                    if work.atomic and db_connector.DB_BACKEND == "mysql":
+                        _remember_not_found(isbn)
+                    else:
+                        work.begin()
+                        cursor.execute(CACHE_UPSERT_SQL, (isbn, json.dumps({NOT_FOUND_MARKER: True})))
+                        work.commit()
+                    log.info("Book not found on API", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+                    return False
+                elif stale_api_response:
+                    log.warning("API degraded: falling back to stale cached response", extra={'isbn': isbn})
+                    raw_api_response = stale_api_response
+                else:
+                    log.warning("Could not retrieve book data from API", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+                    return False
+
+            # --- D. Process and Sync (The Transactional Part) ---
         
-        # 1. Parse the necessary fields
-        book_info = parse_google_books_data(raw_api_response)
-        if not book_info:
-            conn.rollback()
+            # 1. Parse the necessary fields
+            book_info = parse_google_books_data(raw_api_response)
+            if not book_info:
+                return False
+
+            # Row locks may not be waited on longer than what is left of the budget
+            budget.check("DB write")
+            cursor.execute(LOCK_WAIT_TIMEOUT_SQL)
+            row = cursor.fetchone()
+            previous_lock_wait = row[0] if row else None
+            cursor.execute(SET_LOCK_WAIT_TIMEOUT_SQL, (max(1, math.ceil(budget.remaining())),))
+            work.begin()
+
+            # 2. Insert into Book, Author and Book_Author (and cache a fresh API response)
+            log.debug(f"Syncing book: {book_info['title']}", extra={'isbn': isbn})
+            _run_steps(cursor, _sync_steps(isbn, book_info, raw_api_response if fetched_from_api else None))
+
+            # 3. Commit the Transaction
+            work.commit()
+            log.info("Book and all authors synced to DB", extra={'isbn': isbn, 'duration_ms': elapsed_ms(started)})
+            if is_sharded() and uow is None:
+                return publish_catalog_entry(isbn)
+            return True
+
+        except DeadlineExceeded as err:
+            log.warning("Sync aborted", extra={'isbn': isbn, 'error': err, 'duration_ms': elapsed_ms(started)})
+            work.rollback()
             return False
 
-        # 2. Insert into Book Table
-        print(f"Syncing book: {book_info['title']}")
-        book_sql = """
-        INSERT INTO Book (isbn, title, publisher, publication_year, total_copies, available_copies)
-        VALUES (%s, %s, %s, %s, 0, 0)
-        """
-        cursor.execute(book_sql, (
-            isbn, 
-            book_info['title'], 
-            book_info['publisher'], 
-            book_info['publication_year']
-        ))
-        
-        # 3. Handle Authors (Loop through all authors)
-        for author_name in book_info['authors']:
-            # a. Check if Author exists and get ID (using a stored procedure logic)
-            author_check_sql = "SELECT author_id FROM Author WHERE author_name = %s"
-            cursor.execute(author_check_sql, (author_name,))
-            result = cursor.fetchone()
-            
-            author_id = None
-            if result:
-                # Author exists
-                author_id = result[0]
-            else:
-                # b. Author does NOT exist, insert new author
-                author_insert_sql = "INSERT INTO Author (author_name) VALUES (%s)"
-                cursor.execute(author_insert_sql, (author_name,))
-                author_id = cursor.lastrowid # Get the ID of the newly inserted row
-
-            # c. Link Book and Author in the Junction Table
-            link_sql = """
-            INSERT INTO Book_Author (isbn, author_id)
-            VALUES (%s, %s)
-            """
-            cursor.execute(link_sql, (isbn, author_id))
-
-        # 4. Commit the Transaction
-        conn.commit()
-        print(f"SUCCESS: Book {isbn} and all authors synced to DB.")
-        return True
+        except mysql.connector.IntegrityError as err:
+            work.rollback()
+            # Another desk synced the same ISBN while we were calling the API.
+            # An atomic unit is already marked failed, so there is nothing to rescue.
+            if not work.failed:
+                try:
+                    cursor.execute(BOOK_EXISTS_SQL, (isbn,))
+                    synced = cursor.fetchone()
+                except mysql.connector.Error as check_err:
+                    log.error("Database error during sync process", extra={'isbn': isbn, 'error': check_err})
+                    return False
+                if synced:
+                    log.info("Book was synced concurrently", extra={'isbn': isbn})
+                    if is_sharded() and uow is None:
+                        return publish_catalog_entry(isbn, branches=[current_branch()])
+                    return True
+            log.error("Database error during sync process", extra={'isbn': isbn, 'error': err})
+            return False
 
-    except mysql.connector.Error as err:
-        print(f"Database error during sync process: {err}")
-        # Rollback all changes if any error occurs
-        conn.rollback()
-        return False
+        except mysql.connector.Error as err:
+            log.error("Database error during sync process", extra={'isbn': isbn, 'error': err})
+            # Rollback all changes if any error occurs
+            work.rollback()
+            return False
 
-    finally:
-        cursor.close()
-        conn.close()
+        finally:
+            if previous_lock_wait is not None:
+                try:
+                    cursor.execute(SET_LOCK_WAIT_TIMEOUT_SQL, (previous_lock_wait,))
+                except mysql.connector.Error as err:
+                    log.warning("Could not restore innodb_lock_wait_timeout", extra={'isbn': isbn, 'error': err})
+            cursor.close()
 
-def search_available_books(search_term: str):
+def search_available_books(search_term: str, uow: UnitOfWork = None, limit: int = SEARCH_RESULT_LIMIT,
+                           as_dict: bool = False):
     """
     Searches books by ISBN or Title that have available copies.
+    Served from a read replica unless a uow is given.
     Returns:
-        A list of dictionaries [{'isbn': ..., 'title': ...}] or an empty list.
+        A list of AvailableBook (isbn, title, available_copies) rows,
+        dictionaries with the same keys when as_dict is True, or an empty list.
     """
-    conn = get_db_connection()
+    conn = uow.conn if uow else get_read_connection()
     if not conn:
         return []
 
-    cursor = conn.cursor(dictionary=True) 
+    cursor = conn.cursor()
     books = []
     search_pattern = f"%{search_term}%" # Pattern for LIKE search
     
     try:
-        query = """
-        SELECT isbn, title, available_copies
-        FROM Book
-        WHERE available_copies > 0 
-          AND (isbn LIKE %s OR title LIKE %s)
-        LIMIT 20 -- Limit results for speed
-        """
-        cursor.execute(query, (search_pattern, search_pattern))
-        books = cursor.fetchall()
+        cursor.execute(SEARCH_AVAILABLE_SQL, (search_pattern, search_pattern, limit))
+        books = make_rows(AvailableBook, cursor.fetchall(), as_dict)
 
     except mysql.connector.Error as err:
-        print(f"Database error fetching available books: {err}")
+        log.error("Database error fetching available books", extra={'error': err})
 
     finally:
         cursor.close()
-        conn.close()
+        if uow:
+            uow.release_snapshot()
+        else:
+            conn.close()
         return books
+
+
+def add_book_copies(isbn: str, copies: int, uow: UnitOfWork = None) -> bool:
+    """
+    Adds physical copies of a synced book to both total and available counts.
+    Pass uow to run on a shared connection/transaction (see unit_of_work.py).
+    """
+    with session_for(uow) as work:
+        if not work.conn:
+            return False
+
+        cursor = work.conn.cursor()
+        success = False
+
+        try:
+            work.begin()
+            cursor.execute(ADD_COPIES_SQL, (copies, copies, isbn))
+            if cursor.rowcount == 0:
+                log.info("Adding copies failed: book not found", extra={'isbn': isbn})
+                work.rollback()
+                return False
+
+            work.commit()
+            log.info(f"Added {copies} copies", extra={'isbn': isbn, 'count': copies})
+            success = True
+
+        except mysql.connector.Error as err:
+            log.error("Database error adding copies", extra={'isbn': isbn, 'error': err})
+            work.rollback()
+            success = False
+
+        finally:
+            cursor.close()
+            return success
@@ -0,0 +1,70 @@
+# tests/conftest.py
+"""
+Shared fixtures. Every test that touches the database runs on a fresh
+SQLite file (sqlite_backend.py), so the suite needs no MySQL server.
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connector
+import procedures
+
+
+class Library:
+    """Small helpers for arranging and inspecting rows in the test database."""
+
+    def execute(self, sql: str, params: tuple = ()):
+        conn = db_connector.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        conn = db_connector.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def add_book(self, isbn: str, copies: int = 1, title: str = None):
+        self.execute("""
+            INSERT INTO Book (isbn, title, publication_year, publisher, total_copies, available_copies)
+            VALUES (%s, %s, 2001, 'Test Press', %s, %s)""", (isbn, title or f"Title {isbn}", copies, copies))
+
+    def add_patron(self, email: str) -> int:
+        return self.execute("INSERT INTO Patron (first_name, last_name, email) VALUES ('Test', 'Patron', %s)",
+                            (email,))
+
+    def add_loan(self, isbn: str, patron_id: int, checkout_date: date = None, return_date: date = None) -> int:
+        checkout_date = checkout_date or date.today()
+        return self.execute("""
+            INSERT INTO Loan (isbn, patron_id, checkout_date, due_date, return_date)
+            VALUES (%s, %s, %s, %s, %s)""",
+            (isbn, patron_id, checkout_date, checkout_date + timedelta(days=14), return_date))
+
+    def available(self, isbn: str) -> int:
+        return self.query("SELECT available_copies FROM Book WHERE isbn = %s", (isbn,))[0][0]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """A fresh single-desk SQLite database; db_connector points at it for the test."""
+    monkeypatch.setattr(db_connector, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(db_connector, "SQLITE_PATH", str(tmp_path / "openshelf.db"))
+    monkeypatch.setattr(db_connector, "REPLICA_CONFIGS", [])
+    monkeypatch.setattr(db_connector, "BRANCH_CONFIGS", {})
+    monkeypatch.setattr(procedures, "ENGINE", "client")
+    return Library()
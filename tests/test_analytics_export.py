@@ -0,0 +1,82 @@
+# tests/test_analytics_export.py
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pyarrow.dataset as ds
+
+import analytics_export
+import analytics_queries
+
+
+def _read(export_dir, name):
+    return ds.dataset(str(export_dir / name), format="parquet", partitioning="hive").to_table().to_pandas()
+
+
+def test_export_writes_loans_fines_and_snapshots(library, tmp_path):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+    loan_id = library.add_loan("9780000000001", patron_id, date.today() - timedelta(days=20), date.today())
+    library.execute("INSERT INTO Fine (loan_id, fine_amount, fine_date) VALUES (%s, %s, %s)",
+                    (loan_id, 1.5, date.today()))
+    export_dir = tmp_path / "export"
+
+    assert analytics_export.export_circulation_data(str(export_dir))
+
+    assert list(_read(export_dir, "loan")["loan_id"]) == [loan_id]
+    # SQLite hands DECIMAL back as a float; the export stores an exact decimal
+    assert list(_read(export_dir, "fine")["fine_amount"]) == [Decimal("1.50")]
+    assert list(_read(export_dir, "book")["isbn"]) == ["9780000000001"]
+    assert list(_read(export_dir, "patron")["patron_id"]) == [patron_id]
+    assert analytics_export.load_watermark(str(export_dir))["loan_id"] == loan_id
+
+
+def test_export_includes_archived_history(library, tmp_path):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+    library.execute("""
+        INSERT INTO Loan_Archive (loan_id, isbn, patron_id, checkout_date, due_date, return_date)
+        VALUES (1, '9780000000001', %s, '2020-01-01', '2020-01-15', '2020-02-01')""", (patron_id,))
+    library.execute("""
+        INSERT INTO Fine_Archive (fine_id, loan_id, fine_amount, fine_date, payment_date)
+        VALUES (1, 1, 4.25, '2020-02-01', '2020-02-01')""")
+    export_dir = tmp_path / "export"
+
+    assert analytics_export.export_circulation_data(str(export_dir))
+
+    assert list(_read(export_dir, "loan")["loan_id"]) == [1]
+    assert list(_read(export_dir, "fine")["fine_amount"]) == [Decimal("4.25")]
+
+
+def test_returned_loan_is_re_exported_and_deduplicated(library, tmp_path):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+    loan_id = library.add_loan("9780000000001", patron_id)
+    export_dir = tmp_path / "export"
+    assert analytics_export.export_circulation_data(str(export_dir))
+
+    library.execute("UPDATE Loan SET return_date = %s WHERE loan_id = %s", (date.today(), loan_id))
+    assert analytics_export.export_circulation_data(str(export_dir))
+
+    loans = analytics_queries.load_loans(str(export_dir))
+    assert len(loans) == 1
+    assert loans.iloc[0]["return_date"].date() == date.today()
+
+
+def test_amount_outside_the_schema_fails_without_advancing_the_watermark(library, tmp_path):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+    loan_id = library.add_loan("9780000000001", patron_id)
+    # DECIMAL(5,2) holds at most 999.99; SQLite does not enforce it
+    library.execute("INSERT INTO Fine (loan_id, fine_amount, fine_date) VALUES (%s, %s, %s)",
+                    (loan_id, 12345.5, date.today()))
+    export_dir = tmp_path / "export"
+
+    assert not analytics_export.export_circulation_data(str(export_dir))
+    assert analytics_export.load_watermark(str(export_dir))["loan_id"] == 0
+
+
+def test_to_decimal_normalises_backend_values():
+    assert analytics_export._to_decimal(0.1 + 0.2, 2) == Decimal("0.30")
+    assert analytics_export._to_decimal(b"2.5", 2) == Decimal("2.50")
+    assert analytics_export._to_decimal(float("nan"), 2) is None
+    assert analytics_export._to_decimal(None, 2) is None
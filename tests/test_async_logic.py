@@ -0,0 +1,136 @@
+# tests/test_async_logic.py
+"""
+async_logic on the SQLite test database. aiomysql's pool is replaced by a
+small in-process pool over sqlite_backend connections, so the tests cover
+the shared steps, error handling and per-loop pools without a MySQL server.
+"""
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+aiomysql = pytest.importorskip("aiomysql")
+
+import async_logic
+import db_connector
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._cursor.close()
+
+    async def execute(self, sql, params=None):
+        self._cursor.execute(sql, params)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class _Connection:
+    def __init__(self):
+        self._conn = db_connector.get_db_connection()
+
+    def cursor(self):
+        return _Cursor(self._conn)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        self._conn.commit()
+
+    async def rollback(self):
+        self._conn.rollback()
+
+
+class _Pool:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+
+    async def acquire(self):
+        assert asyncio.get_running_loop() is self.loop, "pool used from another event loop"
+        return _Connection()
+
+    def release(self, conn):
+        conn._conn.close()
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.fixture
+def pools(library, monkeypatch):
+    created = []
+
+    async def create_pool(**kwargs):
+        created.append(_Pool())
+        return created[-1]
+
+    monkeypatch.setattr(aiomysql, "create_pool", create_pool)
+    monkeypatch.setattr(db_connector, "_breakers", {})
+    return created
+
+
+def test_checkout_and_overdue_return_use_the_shared_steps(library, pools):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+
+    async def scenario():
+        assert await async_logic.checkout_book("9780000000001", patron_id)
+        assert not await async_logic.checkout_book("9780000000001", patron_id)  # out of stock
+        library.execute("UPDATE Loan SET due_date = %s", (date.today() - timedelta(days=2),))
+        assert await async_logic.return_book("9780000000001", patron_id)
+        await async_logic.close_pools()
+
+    asyncio.run(scenario())
+
+    assert library.available("9780000000001") == 1
+    assert library.query("SELECT fine_amount FROM Fine") == [(0.5,)]
+
+
+def test_each_event_loop_gets_its_own_pool(library, pools):
+    library.add_book("9780000000001")
+
+    async def search():
+        return await async_logic.search_available_books("978")
+
+    assert len(asyncio.run(search())) == 1
+    assert len(asyncio.run(search())) == 1
+    assert len(pools) == 2
+
+
+def test_unreachable_server_returns_failure_values(library, monkeypatch):
+    async def create_pool(**kwargs):
+        raise aiomysql.OperationalError(2003, "Can't connect")
+
+    monkeypatch.setattr(aiomysql, "create_pool", create_pool)
+    monkeypatch.setattr(db_connector, "_breakers", {})
+    monkeypatch.setattr(async_logic, "_start_probe", lambda config, breaker: None)
+
+    async def scenario():
+        return (await async_logic.checkout_book("9780000000001", 1),
+                await async_logic.find_patron_by_email("reader@example.invalid"),
+                await async_logic.get_patron_active_loans(1),
+                await async_logic.search_and_sync_book_by_isbn("9780000000001"))
+
+    assert asyncio.run(scenario()) == (False, None, [], False)
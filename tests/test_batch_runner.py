@@ -0,0 +1,94 @@
+# tests/test_batch_runner.py
+import csv
+import io
+import json
+
+import pytest
+
+import batch_runner
+from batch_runner import read_operations, run_batch
+
+ISBN = "9780441013593"
+
+
+def results_of(output: io.StringIO) -> dict:
+    return {result['line']: result for result in map(json.loads, output.getvalue().splitlines())}
+
+
+def test_jsonl_stream_reports_bad_lines_in_place():
+    stream = io.StringIO('{"op": "sync", "isbn": "1"}\n\nnot json\n[1, 2]\n')
+    operations = list(read_operations(stream))
+
+    assert operations[0] == (1, {"op": "sync", "isbn": "1"})
+    assert operations[1][0] == 3 and operations[1][1].startswith("invalid JSON")
+    assert operations[2] == (4, "expected a JSON object")
+
+
+def test_csv_rows_drop_empty_cells():
+    stream = io.StringIO("op,isbn,patron_id\ncheckout,1,7\nsync,2,\n")
+
+    assert list(read_operations(stream, fmt="csv")) == [
+        (2, {"op": "checkout", "isbn": "1", "patron_id": "7"}),
+        (3, {"op": "sync", "isbn": "2"}),
+    ]
+
+
+def test_operations_on_one_book_run_in_file_order(library):
+    library.add_book(ISBN, copies=1)
+    first, second = library.add_patron("a@example.com"), library.add_patron("b@example.com")
+    operations = [
+        (1, {"op": "checkout", "isbn": ISBN, "patron_id": first}),
+        (2, {"op": "checkout", "isbn": ISBN, "patron_id": second}),
+        (3, {"op": "return", "isbn": ISBN, "patron_id": first}),
+        (4, {"op": "checkout", "isbn": ISBN, "patron_id": second}),
+    ]
+    output = io.StringIO()
+
+    stats = run_batch(operations, output, workers=4)
+
+    assert [results_of(output)[line]['ok'] for line in range(1, 5)] == [True, False, True, True]
+    assert (stats['total'], stats['ok'], stats['failed']) == (4, 3, 1)
+    assert stats['by_op']['checkout']['ok'] == 2
+    assert library.available(ISBN) == 0
+
+
+def test_bad_operations_fail_their_line_only(library):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    operations = [
+        (1, "invalid JSON: Expecting value"),
+        (2, {"op": "rename", "isbn": ISBN}),
+        (3, {"op": "checkout", "isbn": ISBN}),
+        (4, {"op": "checkout", "isbn": ISBN, "patron_id": "abc"}),
+        (5, {"op": "checkout", "isbn": ISBN, "patron_id": patron}),
+    ]
+    output = io.StringIO()
+
+    stats = run_batch(operations, output, workers=2)
+
+    results = results_of(output)
+    assert results[1] == {'line': 1, 'op': None, 'ok': False, 'error': "invalid JSON: Expecting value"}
+    assert results[2]['error'] == "unknown op 'rename'"
+    assert results[3]['error'] == "missing field 'patron_id'"
+    assert results[4]['error'].startswith("ValueError")
+    assert results[5]['ok']
+    assert (stats['ok'], stats['failed']) == (1, 4)
+    assert "(invalid)" in batch_runner.format_batch_summary(stats)
+
+
+def test_report_export(library, tmp_path):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    library.add_loan(ISBN, patron)
+    path = tmp_path / "history.csv"
+
+    assert batch_runner.export_report("V_PATRON_HISTORY", str(path), patron_id=patron)
+
+    with open(path, newline="") as f:
+        header, *rows = list(csv.reader(f))
+    assert "patron_id" in header
+    assert len(rows) == 1
+    with pytest.raises(ValueError):
+        batch_runner.export_report("V_PATRON_HISTORY", str(path))
+    with pytest.raises(ValueError):
+        batch_runner.export_report("Patron", str(path))
@@ -0,0 +1,86 @@
+# tests/test_circuit_breaker.py
+import mysql.connector
+import pytest
+
+import circuit_breaker
+import db_connector
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("db", failure_threshold=3, cool_off_seconds=30)
+
+    assert not breaker.record_failure("e1")
+    breaker.record_success()
+    assert not breaker.record_failure("e1")
+    assert not breaker.record_failure("e2")
+    assert breaker.state == CLOSED
+    assert breaker.record_failure("e3")
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()['last_error'] == "e3"
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1, cool_off_seconds=30)
+    breaker.record_failure()
+    clock[0] += 30
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_restarts_the_cool_off(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1, cool_off_seconds=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow_request()
+
+    # Already open, so this failure does not count as opening it
+    assert not breaker.record_failure("still down")
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 30
+
+
+def test_released_trial_allows_the_next_one(clock):
+    breaker = CircuitBreaker("api", failure_threshold=1, cool_off_seconds=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow_request()
+
+    breaker.release_trial()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_connect_fails_fast_while_the_circuit_is_open(monkeypatch):
+    attempts = []
+
+    def refuse(**options):
+        attempts.append(options)
+        raise mysql.connector.InterfaceError(msg="Can't connect", errno=2003)
+
+    monkeypatch.setattr(db_connector, "_breakers", {})
+    monkeypatch.setattr(db_connector, "_start_probe", lambda config, breaker: None)
+    monkeypatch.setattr(db_connector.mysql.connector, "connect", refuse)
+    config = {**db_connector.DB_CONFIG, "host": "db.invalid"}
+
+    for _ in range(db_connector.CIRCUIT_FAILURE_THRESHOLD + 2):
+        assert db_connector._connect(config) is None
+
+    assert len(attempts) == db_connector.CIRCUIT_FAILURE_THRESHOLD
+    assert db_connector._breaker_for(config).state == OPEN
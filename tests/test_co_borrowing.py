@@ -0,0 +1,75 @@
+# tests/test_co_borrowing.py
+import random
+
+import pytest
+
+pytest.importorskip("scipy")
+
+import co_borrowing
+
+BOOKS = [f"97800000000{n:02d}" for n in range(12)]
+
+
+@pytest.fixture
+def patrons(library):
+    for isbn in BOOKS:
+        library.add_book(isbn, copies=50)
+    return [library.add_patron(f"p{n}@example.invalid") for n in range(30)]
+
+
+def _borrow(library, patrons, count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        # Patrons favour nearby books, so there are real neighbours to find
+        start = rng.randrange(len(BOOKS) - 3)
+        library.add_loan(BOOKS[start + rng.randrange(3)], rng.choice(patrons))
+
+
+def _neighbours(library):
+    return library.query("SELECT isbn, neighbour_rank, neighbour_isbn, co_borrowers, score "
+                         "FROM Book_Neighbour ORDER BY isbn, neighbour_rank")
+
+
+def test_incremental_updates_match_a_full_rebuild(library, patrons, tmp_path):
+    state_dir = str(tmp_path / "state")
+    _borrow(library, patrons, 120, seed=1)
+    assert co_borrowing.refresh_co_borrowing(state_dir=state_dir) > 0
+    _borrow(library, patrons, 80, seed=2)
+    co_borrowing.refresh_co_borrowing(state_dir=state_dir)
+    incremental = co_borrowing.load_state(state_dir)
+    incremental_rows = _neighbours(library)
+
+    co_borrowing.refresh_co_borrowing(full=True, state_dir=str(tmp_path / "full"))
+    full = co_borrowing.load_state(str(tmp_path / "full"))
+
+    assert incremental_rows and _neighbours(library) == incremental_rows
+    order = [incremental['isbns'].index(isbn) for isbn in full['isbns']]
+    assert (incremental['co_counts'][order][:, order] != full['co_counts']).nnz == 0
+
+
+def test_rerun_without_new_loans_rewrites_nothing(library, patrons, tmp_path):
+    state_dir = str(tmp_path / "state")
+    _borrow(library, patrons, 60, seed=3)
+    co_borrowing.refresh_co_borrowing(state_dir=state_dir)
+
+    assert co_borrowing.refresh_co_borrowing(state_dir=state_dir) == 0
+
+
+def _add_loan_with_id(library, loan_id, isbn, patron_id):
+    library.execute("INSERT INTO Loan (loan_id, isbn, patron_id, checkout_date, due_date) "
+                    "VALUES (%s, %s, %s, DATE('now'), DATE('now', '+14 days'))", (loan_id, isbn, patron_id))
+
+
+def test_late_committed_loan_below_the_watermark_is_counted(library, patrons, tmp_path):
+    state_dir = str(tmp_path / "state")
+    _add_loan_with_id(library, 10, BOOKS[0], patrons[0])
+    _add_loan_with_id(library, 11, BOOKS[1], patrons[0])
+    _add_loan_with_id(library, 12, BOOKS[0], patrons[1])
+    co_borrowing.refresh_co_borrowing(state_dir=state_dir)
+    assert co_borrowing.get_co_borrowed_books(BOOKS[0]) == []
+
+    # Loan 5 took its id before loan 12 but committed after the run read 12
+    _add_loan_with_id(library, 5, BOOKS[1], patrons[1])
+    co_borrowing.refresh_co_borrowing(state_dir=state_dir)
+
+    assert [book['isbn'] for book in co_borrowing.get_co_borrowed_books(BOOKS[0])] == [BOOKS[1]]
@@ -0,0 +1,67 @@
+# tests/test_deadline.py
+import pytest
+import requests
+
+import api_handler
+import sync_logic
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from deadline import Deadline, DeadlineExceeded
+
+
+def test_deadline_counts_down_and_raises_once_spent(monkeypatch):
+    now = [50.0]
+    monkeypatch.setattr("deadline.time.monotonic", lambda: now[0])
+    budget = Deadline(2)
+
+    now[0] += 1.5
+    assert budget.remaining() == 0.5
+    budget.check("API call")
+
+    now[0] += 1
+    assert budget.remaining() == 0
+    assert budget.expired()
+    with pytest.raises(DeadlineExceeded, match="before DB write"):
+        budget.check("DB write")
+
+
+def test_sync_gives_up_when_the_budget_is_spent(library, monkeypatch):
+    calls = []
+    monkeypatch.setattr(sync_logic, "fetch_book_data", lambda *args, **kwargs: calls.append(args))
+
+    assert not sync_logic.search_and_sync_book_by_isbn("9780000000001", deadline_seconds=0)
+    assert calls == []
+
+
+def _response(status: int):
+    response = requests.Response()
+    response.status_code = status
+    response.url = "https://www.googleapis.com/books/v1/volumes"
+    return response
+
+
+@pytest.fixture
+def api_breaker(monkeypatch):
+    breaker = CircuitBreaker("google-books", failure_threshold=2, cool_off_seconds=60)
+    monkeypatch.setattr(api_handler, "api_breaker", breaker)
+    return breaker
+
+
+@pytest.mark.parametrize("outcome, state", [
+    (_response(404), CLOSED),
+    (_response(429), CLOSED),
+    (_response(503), OPEN),
+    (requests.exceptions.ConnectTimeout("slow"), OPEN),
+    (requests.exceptions.ConnectionError("refused"), OPEN),
+    (requests.exceptions.TooManyRedirects("loop"), CLOSED),
+])
+def test_only_server_side_failures_open_the_api_circuit(api_breaker, monkeypatch, outcome, state):
+    def get(*args, **kwargs):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(requests, "get", get)
+    for _ in range(api_breaker.failure_threshold):
+        assert api_handler.fetch_book_data("9780000000001") == (api_handler.API_ERROR, None)
+
+    assert api_breaker.state == state
@@ -0,0 +1,118 @@
+# tests/test_group_commit.py
+from datetime import date, timedelta
+
+import pytest
+
+import group_commit
+from group_commit import CHECKOUT, RETURN, CirculationWriter
+
+ISBN = "9780441013593"
+
+
+@pytest.fixture
+def transactions(library, monkeypatch):
+    """Counts the connections (one per batch) the writer opens."""
+    opened = []
+    connect = group_commit.get_db_connection
+
+    def counting(branch_id=None):
+        opened.append(branch_id)
+        return connect(branch_id)
+
+    monkeypatch.setattr(group_commit, "get_db_connection", counting)
+    return opened
+
+
+def run_batch(requests, window_ms=1000):
+    """Submits every request before the window closes, so they share one batch."""
+    writer = CirculationWriter(window_ms=window_ms)
+    futures = [writer.submit(action, isbn, patron_id) for action, isbn, patron_id in requests]
+    writer.close()
+    return [future.result() for future in futures]
+
+
+def test_last_copy_goes_to_the_first_request(library, transactions):
+    library.add_book(ISBN, copies=1)
+    first, second = library.add_patron("a@example.com"), library.add_patron("b@example.com")
+
+    assert run_batch([(CHECKOUT, ISBN, first), (CHECKOUT, ISBN, second)]) == [True, False]
+    assert len(transactions) == 1
+    assert library.available(ISBN) == 0
+    assert library.query("SELECT patron_id FROM Loan") == [(first,)]
+
+
+def test_copy_count_is_adjusted_by_the_net_change(library, transactions):
+    library.add_book(ISBN, copies=3)
+    patrons = [library.add_patron(f"p{i}@example.com") for i in range(3)]
+    returning = patrons[0]
+    library.execute("UPDATE Book SET available_copies = 2 WHERE isbn = %s", (ISBN,))
+    library.add_loan(ISBN, returning, checkout_date=date.today() - timedelta(days=3))
+
+    results = run_batch([(RETURN, ISBN, returning), (CHECKOUT, ISBN, patrons[1]),
+                         (CHECKOUT, ISBN, patrons[2]), (RETURN, ISBN, patrons[2] + 100)])
+
+    assert results == [True, True, True, False]
+    assert len(transactions) == 1
+    assert library.available(ISBN) == 1
+    assert library.query("SELECT COUNT(*) FROM Loan WHERE return_date IS NULL") == [(2,)]
+
+
+def test_late_return_is_fined(library, transactions):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    library.execute("UPDATE Book SET available_copies = 0 WHERE isbn = %s", (ISBN,))
+    loan_id = library.add_loan(ISBN, patron, checkout_date=date.today() - timedelta(days=20))
+
+    assert run_batch([(RETURN, ISBN, patron)]) == [True]
+    (fined_loan, amount), = library.query("SELECT loan_id, fine_amount FROM Fine")
+    assert fined_loan == loan_id
+    assert amount == pytest.approx(6 * group_commit.FINE_RATE_PER_DAY)
+
+
+def test_return_of_a_loan_opened_in_the_same_batch_is_deferred(library, transactions):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+
+    assert run_batch([(CHECKOUT, ISBN, patron), (RETURN, ISBN, patron)]) == [True, True]
+    assert len(transactions) == 2
+    assert library.available(ISBN) == 1
+    assert library.query("SELECT return_date FROM Loan") == [(date.today(),)]
+
+
+def test_failed_batch_is_replayed_one_by_one(library, transactions):
+    library.add_book(ISBN, copies=2)
+    patron = library.add_patron("a@example.com")
+
+    # The unknown patron trips the Loan foreign key and rolls the batch back
+    assert run_batch([(CHECKOUT, ISBN, patron), (CHECKOUT, ISBN, patron + 100)]) == [True, False]
+    assert library.available(ISBN) == 1
+    assert library.query("SELECT patron_id FROM Loan") == [(patron,)]
+
+
+def test_crashed_batch_fails_its_requests_and_the_writer_keeps_going(library, monkeypatch):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    apply = CirculationWriter._apply
+    crashes = []
+
+    def crash_once(self, batch):
+        if not crashes:
+            crashes.append(len(batch))
+            raise RuntimeError("writer bug")
+        return apply(self, batch)
+
+    monkeypatch.setattr(CirculationWriter, "_apply", crash_once)
+
+    with CirculationWriter(window_ms=0) as writer:
+        assert writer.checkout(ISBN, patron) is False
+        assert writer.checkout(ISBN, patron) is True
+    assert crashes == [1]
+    assert library.available(ISBN) == 0
+
+
+def test_unknown_action_is_refused(library):
+    with CirculationWriter() as writer:
+        with pytest.raises(ValueError):
+            writer.submit("renew", ISBN, 1)
+    with pytest.raises(RuntimeError):
+        writer.submit(CHECKOUT, ISBN, 1)
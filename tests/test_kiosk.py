@@ -0,0 +1,102 @@
+# tests/test_kiosk.py
+import sqlite3
+
+import pytest
+
+import kiosk
+from loan_logic import checkout_book
+
+ISBN = "9780441013593"
+
+
+@pytest.fixture
+def journal_path(library, tmp_path, monkeypatch):
+    path = str(tmp_path / "kiosk_journal.db")
+    monkeypatch.setattr(kiosk, "KIOSK_JOURNAL_PATH", path)
+    monkeypatch.setattr(kiosk, "KIOSK_ID", "kiosk-test")
+    monkeypatch.setattr(kiosk, "_schema_ready", False)
+    return path
+
+
+def simulate_crash(path: str):
+    """The upstream commit happened but the local status update was lost."""
+    journal = sqlite3.connect(path)
+    journal.execute("UPDATE Journal SET status = 'pending', detail = NULL, synced_at = NULL")
+    journal.commit()
+    journal.close()
+
+
+def test_scan_refused_without_a_free_copy_in_the_snapshot(library, journal_path):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    assert kiosk.refresh_snapshot()
+
+    assert kiosk.kiosk_checkout(ISBN, patron)
+    assert not kiosk.kiosk_checkout(ISBN, patron)
+    assert not kiosk.kiosk_checkout("9780000000000", patron)
+
+
+def test_replayed_scans_are_applied_once(library, journal_path):
+    library.add_book(ISBN, copies=2)
+    patron = library.add_patron("a@example.com")
+    assert kiosk.refresh_snapshot()
+    assert kiosk.kiosk_checkout(ISBN, patron)
+
+    assert kiosk.sync_journal() == {'applied': 1, 'conflicts': 0, 'pending': 0}
+    assert library.available(ISBN) == 1
+
+    simulate_crash(journal_path)
+    assert kiosk.sync_journal() == {'applied': 1, 'conflicts': 0, 'pending': 0}
+    assert library.available(ISBN) == 1
+    assert len(library.query("SELECT loan_id FROM Loan")) == 1
+
+
+def test_outcome_and_loan_are_recorded_upstream(library, journal_path):
+    library.add_book(ISBN, copies=1)
+    patron = library.add_patron("a@example.com")
+    assert kiosk.refresh_snapshot()
+    assert kiosk.kiosk_checkout(ISBN, patron)
+    kiosk.sync_journal()
+
+    (loan_id,), = library.query("SELECT loan_id FROM Loan")
+    (kiosk_id, *outcome), = library.query("SELECT kiosk_id, status, detail, loan_id, isbn FROM Kiosk_Applied")
+    assert kiosk_id.startswith("kiosk-test:")
+    assert outcome == ["applied", None, loan_id, ISBN]
+
+
+def test_conflict_is_still_reported_after_a_crash(library, journal_path):
+    library.add_book(ISBN, copies=1)
+    kiosk_patron = library.add_patron("a@example.com")
+    desk_patron = library.add_patron("b@example.com")
+    assert kiosk.refresh_snapshot()
+    assert kiosk.kiosk_checkout(ISBN, kiosk_patron)
+    # The desk takes the last copy while the kiosk is offline
+    assert checkout_book(ISBN, desk_patron)
+
+    assert kiosk.sync_journal() == {'applied': 0, 'conflicts': 1, 'pending': 0}
+    conflicts = kiosk.list_conflicts()
+    assert [(c['action'], c['patron_id']) for c in conflicts] == [("checkout", kiosk_patron)]
+    detail = conflicts[0]['detail']
+    assert detail
+
+    simulate_crash(journal_path)
+    assert kiosk.sync_journal() == {'applied': 0, 'conflicts': 1, 'pending': 0}
+    assert kiosk.list_conflicts()[0]['detail'] == detail
+    assert library.available(ISBN) == 0
+    assert library.query("SELECT patron_id FROM Loan") == [(desk_patron,)]
+    assert library.query("SELECT status, loan_id FROM Kiosk_Applied") == [("conflict", None)]
+
+
+def test_scans_stay_pending_while_upstream_is_unreachable(library, journal_path, monkeypatch):
+    library.add_book(ISBN, copies=2)
+    patron = library.add_patron("a@example.com")
+    assert kiosk.refresh_snapshot()
+    assert kiosk.kiosk_checkout(ISBN, patron)
+    assert kiosk.kiosk_return(ISBN, patron)
+
+    with monkeypatch.context() as offline:
+        offline.setattr(kiosk, "get_db_connection", lambda: None)
+        assert kiosk.sync_journal(batch_size=1) == {'applied': 0, 'conflicts': 0, 'pending': 2}
+
+    assert kiosk.sync_journal(batch_size=1) == {'applied': 2, 'conflicts': 0, 'pending': 0}
+    assert library.available(ISBN) == 2
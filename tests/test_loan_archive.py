@@ -0,0 +1,48 @@
+# tests/test_loan_archive.py
+from datetime import date, timedelta
+
+import pytest
+
+import loan_archive
+import main
+
+
+@pytest.fixture
+def history(library, monkeypatch):
+    monkeypatch.setattr(loan_archive, "ARCHIVE_BATCH_PAUSE_SECONDS", 0)
+    library.add_book("9780000000001", copies=3)
+    patron_id = library.add_patron("reader@example.invalid")
+    long_ago = date.today() - timedelta(days=800)
+    old_paid = library.add_loan("9780000000001", patron_id, long_ago, long_ago + timedelta(days=20))
+    library.execute("INSERT INTO Fine (loan_id, fine_amount, fine_date, payment_date) VALUES (%s, 1.5, %s, %s)",
+                    (old_paid, long_ago, long_ago))
+    old_unpaid = library.add_loan("9780000000001", patron_id, long_ago, long_ago + timedelta(days=20))
+    library.execute("INSERT INTO Fine (loan_id, fine_amount, fine_date) VALUES (%s, 1.5, %s)", (old_unpaid, long_ago))
+    recent = library.add_loan("9780000000001", patron_id, date.today() - timedelta(days=3), date.today())
+    return patron_id, old_paid, old_unpaid, recent
+
+
+def test_archives_old_closed_loans_in_batches(library, history):
+    patron_id, old_paid, old_unpaid, recent = history
+
+    assert loan_archive.archive_closed_loans(horizon_days=365, batch_size=1) == 1
+
+    assert library.query("SELECT loan_id FROM Loan ORDER BY loan_id") == [(old_unpaid,), (recent,)]
+    assert library.query("SELECT loan_id FROM Loan_Archive") == [(old_paid,)]
+    assert library.query("SELECT loan_id FROM Fine_Archive") == [(old_paid,)]
+    # The full-history view still shows every loan
+    assert len(library.query("SELECT * FROM V_PATRON_HISTORY_ALL WHERE patron_id = %s", (patron_id,))) == 3
+
+
+def test_patron_report_lists_only_that_patron(library, history, capsys):
+    patron_id = history[0]
+    other = library.add_patron("other@example.invalid")
+    library.add_loan("9780000000001", other)
+
+    main.view_report("V_PATRON_HISTORY_ALL", patron_id)
+
+    lines = capsys.readouterr().out.splitlines()
+    separator = next(i for i, line in enumerate(lines) if line and set(line) == {"-"})
+    rows = lines[separator + 1:]
+    # patron_id is the first column of the view
+    assert [row.split(" | ")[0] for row in rows] == [str(patron_id)] * 3
@@ -0,0 +1,41 @@
+# tests/test_query_plan_check.py
+import query_plan_check
+import sync_logic
+
+
+def test_every_logic_constant_has_sample_params():
+    statements, problems = query_plan_check.collect_statements()
+
+    assert problems == []
+    labels = [label for label, _, _ in statements]
+    assert "sync_logic.ADD_COPIES_SQL" in labels
+    assert "sync_logic.SET_LOCK_WAIT_TIMEOUT_SQL" not in labels
+
+
+def test_new_constant_without_sample_params_is_reported(monkeypatch):
+    monkeypatch.setattr(sync_logic, "NEW_LOOKUP_SQL", "SELECT isbn FROM Book WHERE title = %s", raising=False)
+
+    _, problems = query_plan_check.collect_statements()
+
+    assert problems == ["sync_logic.NEW_LOOKUP_SQL: no sample params in SAMPLE_PARAMS"]
+
+
+def test_stale_sample_params_are_reported(monkeypatch):
+    monkeypatch.setitem(query_plan_check.SAMPLE_PARAMS, "loan_logic.REMOVED_SQL", ())
+
+    _, problems = query_plan_check.collect_statements()
+
+    assert problems == ["loan_logic.REMOVED_SQL: listed in SAMPLE_PARAMS but no such constant"]
+
+
+def test_find_plan_problems_flags_large_scans_and_filesorts():
+    plan = [
+        {'table': 'Loan', 'type': 'ALL', 'rows': 500000, 'Extra': 'Using where; Using filesort'},
+        {'table': 'Book', 'type': 'ALL', 'rows': 20, 'Extra': None},
+        {'table': 'Patron', 'type': 'ref', 'rows': 1, 'Extra': None},
+    ]
+
+    assert query_plan_check.find_plan_problems(plan) == [
+        "full scan of Loan (~500000 rows)",
+        "filesort on Loan (~500000 rows)",
+    ]
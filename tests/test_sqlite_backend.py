@@ -0,0 +1,88 @@
+# tests/test_sqlite_backend.py
+from datetime import date
+
+import mysql.connector
+import pytest
+
+import db_connector
+import loan_logic
+import sqlite_backend
+from sqlite_backend import translate_sql
+
+
+@pytest.mark.parametrize("mysql_sql, sqlite_sql", [
+    ("SELECT available_copies FROM Book WHERE isbn = %s FOR UPDATE",
+     "SELECT available_copies FROM Book WHERE isbn = ?"),
+    ("INSERT IGNORE INTO Kiosk_Applied (kiosk_id) VALUES (%s);",
+     "INSERT OR IGNORE INTO Kiosk_Applied (kiosk_id) VALUES (?)"),
+    ("INSERT INTO Api_Cache (isbn, api_response, cached_at) VALUES (%s, %s, NOW()) "
+     "ON DUPLICATE KEY UPDATE api_response = VALUES(api_response), cached_at = NOW()",
+     "INSERT INTO Api_Cache (isbn, api_response, cached_at) VALUES (?, ?, datetime('now', 'localtime')) "
+     "ON CONFLICT DO UPDATE SET api_response = excluded.api_response, cached_at = datetime('now', 'localtime')"),
+    ("SELECT * FROM Loan WHERE due_date < CURDATE()",
+     "SELECT * FROM Loan WHERE due_date < date('now', 'localtime')"),
+])
+def test_translates_mysql_statements(mysql_sql, sqlite_sql):
+    assert translate_sql(mysql_sql) == sqlite_sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SET SESSION innodb_lock_wait_timeout = %s",
+    "select @@SESSION.innodb_lock_wait_timeout",
+])
+def test_session_statements_are_skipped(library, sql):
+    assert translate_sql(sql) is None
+
+    conn = db_connector.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(sql, (5,) if "%s" in sql else ())
+    assert cursor.fetchone() is None
+    assert cursor.description is None
+    conn.close()
+
+
+def test_dates_round_trip_and_dictionary_rows(library):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+    library.add_loan("9780000000001", patron_id, date(2024, 3, 1))
+
+    conn = db_connector.get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT checkout_date, due_date FROM Loan WHERE patron_id = %s", (patron_id,))
+    assert cursor.fetchone() == {'checkout_date': date(2024, 3, 1), 'due_date': date(2024, 3, 15)}
+    conn.close()
+
+
+def test_sqlite_errors_surface_as_mysql_connector_errors(library):
+    library.add_patron("reader@example.invalid")
+
+    with pytest.raises(mysql.connector.IntegrityError):
+        library.add_patron("reader@example.invalid")
+
+
+def test_columns_added_later_are_added_to_existing_files(tmp_path):
+    path = str(tmp_path / "old.db")
+    raw = sqlite_backend.sqlite3.connect(path)
+    raw.execute("CREATE TABLE Kiosk_Applied (kiosk_id VARCHAR(64) NOT NULL, entry_id BIGINT NOT NULL, "
+                "applied_at DATETIME NOT NULL, PRIMARY KEY (kiosk_id, entry_id))")
+    raw.close()
+
+    conn = sqlite_backend.connect_sqlite(path)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM Kiosk_Applied")
+    assert [col[0] for col in cursor.description] == [
+        "kiosk_id", "entry_id", "applied_at", "isbn", "loan_id", "status", "detail"]
+    conn.close()
+
+
+def test_checkout_and_overdue_return_run_unchanged(library):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+
+    assert loan_logic.checkout_book("9780000000001", patron_id)
+    assert not loan_logic.checkout_book("9780000000001", patron_id)
+    library.execute("UPDATE Loan SET due_date = DATE('now', '-3 days')")
+    assert loan_logic.return_book("9780000000001", patron_id)
+
+    assert library.available("9780000000001") == 1
+    assert library.query("SELECT fine_amount FROM Fine") == [(0.75,)]
@@ -0,0 +1,63 @@
+# tests/test_sync_logic.py
+import mysql.connector
+
+import api_handler
+import sync_logic
+
+BOOK = {"volumeInfo": {"title": "Dune", "authors": ["Frank Herbert"], "publishedDate": "1965-08-01"}}
+
+
+def test_sync_inserts_book_authors_and_cache(library, monkeypatch):
+    monkeypatch.setattr(sync_logic, "fetch_book_data", lambda isbn, timeout: (api_handler.FOUND, BOOK))
+
+    assert sync_logic.search_and_sync_book_by_isbn("9780441013593")
+
+    assert library.query("SELECT title, publication_year FROM Book") == [("Dune", 1965)]
+    assert library.query("SELECT author_name FROM Author") == [("Frank Herbert",)]
+    assert len(library.query("SELECT isbn FROM Api_Cache")) == 1
+
+
+def test_api_miss_is_cached(library, monkeypatch):
+    calls = []
+
+    def not_found(isbn, timeout):
+        calls.append(isbn)
+        return api_handler.NOT_FOUND, None
+
+    monkeypatch.setattr(sync_logic, "fetch_book_data", not_found)
+
+    assert not sync_logic.search_and_sync_book_by_isbn("9780000000000")
+    assert not sync_logic.search_and_sync_book_by_isbn("9780000000000")
+    assert calls == ["9780000000000"]
+
+
+def test_concurrent_sync_of_the_same_isbn_is_rescued(library, monkeypatch):
+    def synced_elsewhere(isbn, timeout):
+        # Another desk commits the book while this one waits on the API
+        library.add_book(isbn)
+        return api_handler.FOUND, BOOK
+
+    monkeypatch.setattr(sync_logic, "fetch_book_data", synced_elsewhere)
+
+    assert sync_logic.search_and_sync_book_by_isbn("9780441013593")
+
+
+def test_failed_rescue_check_returns_false(library, monkeypatch):
+    def synced_elsewhere(isbn, timeout):
+        library.add_book(isbn)
+        return api_handler.FOUND, BOOK
+
+    original_run_steps = sync_logic._run_steps
+
+    def run_steps(cursor, steps):
+        try:
+            return original_run_steps(cursor, steps)
+        finally:
+            def lost_connection(sql, params=()):
+                raise mysql.connector.OperationalError(msg="Lost connection")
+            cursor.execute = lost_connection
+
+    monkeypatch.setattr(sync_logic, "fetch_book_data", synced_elsewhere)
+    monkeypatch.setattr(sync_logic, "_run_steps", run_steps)
+
+    assert sync_logic.search_and_sync_book_by_isbn("9780441013593") is False
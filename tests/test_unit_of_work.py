@@ -0,0 +1,42 @@
+# tests/test_unit_of_work.py
+from loan_logic import checkout_book, return_book, get_patron_active_loans
+from unit_of_work import UnitOfWork
+
+
+def test_atomic_unit_rolls_back_every_call_when_one_fails(library):
+    library.add_book("9780000000001")
+    library.add_book("9780000000002", copies=0)
+    patron_id = library.add_patron("reader@example.invalid")
+
+    with UnitOfWork(atomic=True) as uow:
+        assert checkout_book("9780000000001", patron_id, uow=uow)
+        assert not checkout_book("9780000000002", patron_id, uow=uow)
+
+    assert uow.failed
+    assert library.available("9780000000001") == 1
+    assert library.query("SELECT loan_id FROM Loan") == []
+
+
+def test_atomic_unit_commits_at_the_end(library):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+
+    with UnitOfWork(atomic=True) as uow:
+        assert checkout_book("9780000000001", patron_id, uow=uow)
+        # The unit sees its own uncommitted loan
+        assert [loan.isbn for loan in get_patron_active_loans(patron_id, uow=uow)] == ["9780000000001"]
+
+    assert library.available("9780000000001") == 0
+
+
+def test_shared_connection_commits_each_call(library):
+    library.add_book("9780000000001")
+    patron_id = library.add_patron("reader@example.invalid")
+
+    with UnitOfWork() as uow:
+        assert checkout_book("9780000000001", patron_id, uow=uow)
+        assert not return_book("9780000000001", patron_id + 1, uow=uow)
+        assert return_book("9780000000001", patron_id, uow=uow)
+
+    assert library.available("9780000000001") == 1
+    assert library.query("SELECT COUNT(*) FROM Loan WHERE return_date IS NOT NULL") == [(1,)]
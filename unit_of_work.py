@@ -0,0 +1,105 @@
+# unit_of_work.py
+"""
+Unit of work: lets several logic calls share one connection and, optionally,
+one transaction.
+
+    # One connection, each call commits on its own
+    with UnitOfWork() as uow:
+        checkout_book(isbn, patron_id, uow=uow)
+        info = find_patron_by_email(email, uow=uow)
+
+    # One connection and one atomic transaction
+    with UnitOfWork(atomic=True) as uow:
+        if not (search_and_sync_book_by_isbn(isbn, uow=uow) and add_book_copies(isbn, 3, uow=uow)):
+            uow.rollback()
+
+In atomic mode the logic functions' commits are deferred to the end of the
+with-block, and any rollback (or exception) marks the whole unit as failed,
+so nothing is committed. Logic functions called without uow behave exactly
+as before: their own connection, their own transaction.
+
+With BRANCH_CONFIGS set, a unit connects to branch_id (default: the current
+branch), or to the shared catalog when catalog is True.
+"""
+from contextlib import contextmanager
+
+from db_connector import get_db_connection, get_catalog_connection, mark_write
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class UnitOfWork:
+    def __init__(self, atomic: bool = False, branch_id=None, catalog: bool = False):
+        self.atomic = atomic
+        self.branch_id = branch_id
+        self.catalog = catalog
+        self.conn = None
+        self.failed = False
+        self._in_transaction = False
+
+    def __enter__(self):
+        self.conn = get_catalog_connection() if self.catalog else get_db_connection(self.branch_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.conn:
+            return False
+        try:
+            if self.atomic and self._in_transaction:
+                if exc_type is None and not self.failed:
+                    self.conn.commit()
+                    mark_write()
+                else:
+                    self.conn.rollback()
+                    log.info("Unit of work rolled back")
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+    def begin(self):
+        """Starts a transaction for the next write. In atomic mode only the first call starts one."""
+        if self.atomic:
+            if self._in_transaction:
+                return
+            self._in_transaction = True
+        elif self.conn.in_transaction:
+            # End the implicit snapshot left by earlier reads on this connection
+            self.conn.commit()
+        if not self.conn.in_transaction:
+            self.conn.start_transaction()
+
+    def commit(self):
+        """Commits now, or defers to the end of the block in atomic mode."""
+        if self.atomic:
+            return
+        self.conn.commit()
+        mark_write()
+
+    def rollback(self):
+        """Rolls back now, or marks the whole atomic unit as failed."""
+        if self.atomic:
+            self.failed = True
+            return
+        self.conn.rollback()
+
+    def release_snapshot(self):
+        """
+        Ends a read-only implicit transaction so the next read sees fresh
+        data. A no-op inside an atomic unit that has already begun writing.
+        """
+        if self.atomic and self._in_transaction:
+            return
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+
+@contextmanager
+def session_for(uow: UnitOfWork = None, catalog: bool = False):
+    """Yields the caller's unit of work, or a private one that is closed afterwards."""
+    if uow is not None:
+        yield uow
+        return
+    with UnitOfWork(catalog=catalog) as own:
+        yield own